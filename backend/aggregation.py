@@ -0,0 +1,270 @@
+import logging
+import numpy as np
+import pandas as pd
+from collections import deque
+from datetime import date as date_type
+from concurrent.futures import ProcessPoolExecutor
+from .hexagon_grid import aggregate_hex_stats, star_ratings, grid_neighbor_influence
+
+logger = logging.getLogger(__name__)
+
+# 立方体中各统计量的存储类型
+CUBE_DTYPES = {
+    'max_level': np.float32,
+    'count': np.int32,
+    'lv1_cnt': np.int32,
+    'lv2_cnt': np.int32,
+    'lv3_cnt': np.int32,
+    'lv2_plus_lv3': np.int32,
+    'star_rating': np.int8
+}
+
+# 可跨数据块累加的原始统计量
+ADDITIVE_STATS = ['count', 'lv1_cnt', 'lv2_cnt', 'lv3_cnt']
+
+# 增量汇总时待合并的单元数低于此值时不合并
+MERGE_MIN_CELLS = 1 << 20
+
+class HexPartial:
+    """
+    可合并的稀疏部分汇总：只保存有微博的（日期, 六边形）单元
+    keys 为 日期序数 * 六边形数 + hex_id（升序、唯一），各统计量与keys一一对应
+    合并满足交换律和结合律，数据可按任意方式分块、在多个进程中分别汇总后再合并，
+    内存只与有数据的（日期, 六边形）单元数有关
+    """
+    def __init__(self, num_hexes, keys=None, stats=None, rows_seen=0, rows_inside=0):
+        self.num_hexes = num_hexes
+        self.keys = np.zeros(0, dtype=np.int64) if keys is None else keys
+        if stats is None:
+            stats = {col: np.zeros(0, dtype=np.int64) for col in ADDITIVE_STATS}
+            stats['max_level'] = np.zeros(0)
+        self.stats = stats
+        self.rows_seen = rows_seen
+        self.rows_inside = rows_inside
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_chunk(cls, df, grid):
+        """汇总一块数据（需包含经度、纬度、影响分类、日期列）"""
+        num_hexes = len(grid)
+        day_codes, dates = pd.factorize(df['日期'])
+        ordinals = np.array([date.toordinal() for date in dates], dtype=np.int64)
+
+        # 每条微博只做一次投影和分配
+        _, _, hex_ids = grid.assign_points_to_hexes(df['经度'].to_numpy(), df['纬度'].to_numpy())
+        inside = hex_ids >= 0
+        levels = df['影响分类'].to_numpy(dtype=float)[inside]
+        keys = ordinals[day_codes[inside]] * num_hexes + hex_ids[inside]
+
+        # 只对出现过的单元汇总，单元数不超过本块的微博数
+        cells, inverse = np.unique(keys, return_inverse=True)
+        stats = aggregate_hex_stats(inverse, levels, len(cells))
+        return cls(num_hexes, cells, {col: stats[col] for col in ADDITIVE_STATS + ['max_level']},
+                   rows_seen=len(df), rows_inside=int(inside.sum()))
+
+    @classmethod
+    def merge(cls, partials):
+        """合并多个部分汇总（同一网格），计数相加、最高等级取最大值"""
+        partials = list(partials)
+        num_hexes = partials[0].num_hexes
+        if any(partial.num_hexes != num_hexes for partial in partials):
+            raise ValueError("只能合并同一网格上的部分汇总")
+        rows_seen = sum(partial.rows_seen for partial in partials)
+        rows_inside = sum(partial.rows_inside for partial in partials)
+        partials = [partial for partial in partials if len(partial)]
+        if len(partials) <= 1:
+            merged = partials[0] if partials else cls(num_hexes)
+            return cls(num_hexes, merged.keys, merged.stats, rows_seen, rows_inside)
+
+        cells, inverse = np.unique(np.concatenate([partial.keys for partial in partials]), return_inverse=True)
+        stats = {}
+        for col in ADDITIVE_STATS:
+            values = np.concatenate([partial.stats[col] for partial in partials])
+            stats[col] = np.bincount(inverse, weights=values, minlength=len(cells)).astype(np.int64)
+        max_level = np.full(len(cells), -np.inf)
+        np.maximum.at(max_level, inverse, np.concatenate([partial.stats['max_level'] for partial in partials]))
+        stats['max_level'] = max_level
+        return cls(num_hexes, cells, stats, rows_seen, rows_inside)
+
+    @property
+    def dates(self):
+        """有数据的日期（升序）"""
+        return [date_type.fromordinal(int(ordinal)) for ordinal in np.unique(self.keys // self.num_hexes)]
+
+    def day_stats(self, date, grid):
+        """
+        某一天各六边形的统计量（与立方体中该天的一行一致，星级已应用邻居提升）
+        每次只展开一天，不需要完整的（日期数, 六边形数）立方体
+        """
+        low = date.toordinal() * self.num_hexes
+        start, end = np.searchsorted(self.keys, [low, low + self.num_hexes])
+        hex_ids = self.keys[start:end] - low
+
+        day = {col: np.zeros(self.num_hexes, dtype=np.int64) for col in ADDITIVE_STATS}
+        day['max_level'] = np.zeros(self.num_hexes)
+        for col in day:
+            day[col][hex_ids] = self.stats[col][start:end]
+        day['lv2_plus_lv3'] = day['lv2_cnt'] + day['lv3_cnt']
+        day['star_rating'] = grid_neighbor_influence(grid, star_ratings(day['max_level'], day['lv2_plus_lv3']))
+        return {col: day[col].astype(dtype) for col, dtype in CUBE_DTYPES.items()}
+
+class StreamingHexAggregator:
+    """
+    增量汇总器：逐块接收清洗后的微博数据，分配到六边形并累加到稀疏的（日期, 六边形）部分汇总中
+    内存只与有数据的（日期, 六边形）单元数有关，与数据总量无关
+    """
+    def __init__(self, grid):
+        self.grid = grid
+        self.partial = HexPartial(len(grid))
+        # 尚未合并的部分汇总
+        self.pending = []
+        self.pending_cells = 0
+
+    @property
+    def rows_seen(self):
+        return self.partial.rows_seen + sum(partial.rows_seen for partial in self.pending)
+
+    @property
+    def rows_inside(self):
+        return self.partial.rows_inside + sum(partial.rows_inside for partial in self.pending)
+
+    def add(self, df):
+        """累加一块数据（需包含经度、纬度、影响分类、日期列）"""
+        self.add_partial(HexPartial.from_chunk(df, self.grid))
+
+    def add_partial(self, partial):
+        """累加一个部分汇总（如其他进程汇总的数据块）"""
+        self.pending.append(partial)
+        self.pending_cells += len(partial)
+        # 待合并的单元数超过已合并的单元数时才合并，总合并代价与单元数成线性关系
+        if self.pending_cells > max(len(self.partial), MERGE_MIN_CELLS):
+            self.to_partial()
+
+    def to_partial(self):
+        """合并所有已接收的数据，返回稀疏部分汇总"""
+        if self.pending:
+            self.partial = HexPartial.merge([self.partial] + self.pending)
+            self.pending = []
+            self.pending_cells = 0
+        return self.partial
+
+    def to_cube(self):
+        """
+        生成立方体字典: 'dates' 为排序后的日期列表，其余各统计量为 (日期数, 六边形数) 数组，
+        'star_rating' 已应用邻居提升规则
+        """
+        partial = self.to_partial()
+        dates = partial.dates
+        num_hexes = len(self.grid)
+        ordinals = np.array([date.toordinal() for date in dates], dtype=np.int64)
+        cells = np.searchsorted(ordinals, partial.keys // num_hexes) * num_hexes + partial.keys % num_hexes
+
+        cube = {'dates': dates}
+        for col in ADDITIVE_STATS + ['max_level']:
+            values = np.zeros(len(dates) * num_hexes, dtype=partial.stats[col].dtype)
+            values[cells] = partial.stats[col]
+            cube[col] = values.reshape(len(dates), num_hexes)
+        cube['lv2_plus_lv3'] = cube['lv2_cnt'] + cube['lv3_cnt']
+        cube['star_rating'] = star_ratings(cube['max_level'], cube['lv2_plus_lv3'])
+        for col, dtype in CUBE_DTYPES.items():
+            cube[col] = cube[col].astype(dtype)
+
+        # 所有日期一起做邻居提升
+        cube['star_rating'] = grid_neighbor_influence(self.grid, cube['star_rating']).astype(np.int8)
+
+        logger.info(f"共 {partial.rows_seen} 条数据，其中 {partial.rows_inside} 条落在网格内，涉及 {len(dates)} 天")
+        return cube
+
+# 分块汇总时每个工作进程持有的网格（由进程池初始化函数设置）
+_worker_grid = None
+
+def _init_aggregate_worker(grid):
+    global _worker_grid
+    _worker_grid = grid
+
+def _chunk_partial(df):
+    return HexPartial.from_chunk(df, _worker_grid)
+
+def aggregate_chunks(chunks, grid, workers=1):
+    """
+    逐块汇总数据为稀疏部分汇总，数据块可来自任意大的文件或分区存储
+    workers>1时各数据块在子进程中分配和汇总，主进程按到达顺序合并；
+    同时在途的数据块不超过工作进程数的两倍，内存与数据总量无关
+    """
+    aggregator = StreamingHexAggregator(grid)
+    if workers <= 1:
+        for chunk in chunks:
+            aggregator.add(chunk)
+        return aggregator.to_partial()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_aggregate_worker, initargs=(grid,)) as executor:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(_chunk_partial, chunk))
+            if len(in_flight) >= 2 * workers:
+                aggregator.add_partial(in_flight.popleft().result())
+        while in_flight:
+            aggregator.add_partial(in_flight.popleft().result())
+    return aggregator.to_partial()
+
+def aggregate_daily_influence(df, grid):
+    """一次性将所有微博分配到六边形，并按（日期, 六边形）汇总为立方体"""
+    aggregator = StreamingHexAggregator(grid)
+    aggregator.add(df)
+    return aggregator.to_cube()
+
+def roll_up_stats(stats, parent, grid):
+    """
+    将最细层的统计量自下而上汇总到金字塔的粗层grid，不重新分配微博
+    stats: 最细层的统计量，各为 (..., 最细层六边形数) 数组（如立方体或某一天的列）
+    parent: 最细层hex_id -> 粗层hex_id
+    返回粗层的各统计量（与CUBE_DTYPES一致），星级在粗层上重新计算并应用邻居提升
+    """
+    num_hexes = len(grid)
+    lead = np.shape(stats['count'])[:-1]
+    num_days = int(np.prod(lead))
+    # 将（日期, 粗层六边形）展平，各统计量用同一组下标一次汇总
+    cell_ids = (np.arange(num_days)[:, None] * num_hexes + parent[None, :]).ravel()
+
+    rolled = {}
+    for col in ADDITIVE_STATS:
+        values = np.asarray(stats[col], dtype=np.float64).reshape(-1)
+        rolled[col] = np.bincount(cell_ids, weights=values, minlength=num_days * num_hexes).astype(np.int64)
+    # 空六边形的最高等级为0，取最大值即为父六边形的最高等级
+    max_level = np.zeros(num_days * num_hexes)
+    np.maximum.at(max_level, cell_ids, np.nan_to_num(np.asarray(stats['max_level'], dtype=np.float64).reshape(-1)))
+    rolled['max_level'] = max_level
+    rolled = {col: values.reshape(lead + (num_hexes,)) for col, values in rolled.items()}
+
+    rolled['lv2_plus_lv3'] = rolled['lv2_cnt'] + rolled['lv3_cnt']
+    rolled['star_rating'] = grid_neighbor_influence(grid, star_ratings(rolled['max_level'], rolled['lv2_plus_lv3']))
+    return {col: rolled[col].astype(dtype) for col, dtype in CUBE_DTYPES.items()}
+
+def roll_up_levels(stats, pyramid):
+    """返回金字塔各层（由细到粗）的统计量，第0层即输入的最细层统计量"""
+    levels = [{col: np.asarray(stats[col]) for col in CUBE_DTYPES}]
+    for grid, parent in zip(pyramid.grids[1:], pyramid.parents[1:]):
+        levels.append(roll_up_stats(stats, parent, grid))
+    return levels
+
+def cube_dates(cube):
+    """立方体（或稀疏部分汇总）中的日期列表"""
+    return cube.dates if isinstance(cube, HexPartial) else cube['dates']
+
+def daily_hex_gdf(grid, cube, date):
+    """
+    从立方体（或稀疏部分汇总）中取出某一天的六边形统计表（统计值与calculate_hexagon_influence的结果一致）
+    统计表不含几何列，渲染时顶点从网格数组读取
+    """
+    if isinstance(cube, HexPartial):
+        stats = cube.day_stats(date, grid)
+    else:
+        day = cube['dates'].index(date)
+        stats = {col: cube[col][day] for col in CUBE_DTYPES}
+    hex_gdf = grid.attribute_frame()
+    for col in CUBE_DTYPES:
+        hex_gdf[col] = stats[col]
+    logger.info(f"星级分布: {hex_gdf['star_rating'].value_counts().to_dict()}")
+    return hex_gdf
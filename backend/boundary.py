@@ -0,0 +1,87 @@
+import os
+import json
+import logging
+import numpy as np
+import shapely
+from functools import lru_cache
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+from .utils import create_transformer, load_geojson
+
+logger = logging.getLogger(__name__)
+
+class Boundary:
+    """
+    目标区域的边界，每个进程对同一文件和区域只解析一次，由网格构建和各地图渲染方式共用
+    对象会被多处共享，使用方不应修改其中的几何或列表
+    """
+    def __init__(self, district_rings):
+        # 每个区的边界环（GeoJSON顺序的 [lng, lat] 数组），按区名键入，保持文件中的顺序
+        self.district_rings = district_rings
+        ring_polygons = {name: [Polygon(ring) for ring in rings] for name, rings in district_rings.items()}
+        # 每个区的多边形及所有区合并后的多边形（WGS84），环按多边形处理后合并
+        self.district_polygons = {name: unary_union(polygons) for name, polygons in ring_polygons.items()}
+        self.union = unary_union([polygon for polygons in ring_polygons.values() for polygon in polygons])
+        # 投影到UTM并预处理，用于批量判断点是否在边界内
+        transformer = create_transformer('EPSG:4326', 'EPSG:32650')
+        self.union_utm = shapely.transform(
+            self.union, lambda xy: np.column_stack(transformer.transform_arrays(xy[:, 0], xy[:, 1]))
+        )
+        shapely.prepare(self.union_utm)
+        # Leaflet折线使用的 [lat, lng] 环，按区分组，并预先序列化为JSON
+        self.leaflet_rings = [
+            {'district': name, 'rings': [np.round(ring[:, ::-1], 6).tolist() for ring in rings]}
+            for name, rings in district_rings.items()
+        ]
+        self.leaflet_json = json.dumps(self.leaflet_rings, ensure_ascii=False, separators=(',', ':'))
+
+    @property
+    def districts(self):
+        return list(self.district_rings)
+
+    def contains_utm(self, x, y):
+        """批量判断UTM坐标点是否在边界内"""
+        return shapely.contains_xy(self.union_utm, x, y)
+
+@lru_cache(maxsize=16)
+def _cached_boundary(path, districts, mtime_ns):
+    """按（文件路径, 目标区域, 修改时间）缓存解析结果，文件变化后自动重新读取"""
+    geo = load_geojson(path)
+    if not geo:
+        return None
+
+    district_rings = {}
+    for feature in geo['features']:
+        name = feature['properties'].get('name', '')
+        if districts and name not in districts:
+            continue
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry['type'] == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            continue
+        rings = district_rings.setdefault(name, [])
+        rings.extend(np.asarray(ring, dtype=float)[:, :2] for polygon in polygons for ring in polygon)
+
+    if not district_rings:
+        logger.warning(f"边界文件中没有目标区域: {path}")
+        return None
+    logger.info(f"已加载边界文件: {path}（{len(district_rings)} 个区）")
+    return Boundary(district_rings)
+
+def load_boundary(boundary_file, target_districts=None):
+    """
+    加载边界文件中目标区域的边界，target_districts为空时使用文件中的所有区域
+    同一进程内重复调用直接返回缓存的对象；文件不存在或解析失败时返回None
+    """
+    if not boundary_file or not os.path.exists(boundary_file):
+        return None
+    try:
+        path = os.path.abspath(boundary_file)
+        districts = tuple(sorted(target_districts)) if target_districts else None
+        return _cached_boundary(path, districts, os.stat(path).st_mtime_ns)
+    except Exception as e:
+        logger.error(f"加载边界文件失败: {e}")
+        return None
@@ -1,45 +1,218 @@
+import os
+import json
+import hashlib
+import numpy as np
 import pandas as pd
 import logging
 
 logger = logging.getLogger(__name__)
 
-def read_weibo_excel(file_path):
-    """读取并预处理微博Excel数据"""
-    try:
-        df = pd.read_excel(file_path)
-        logger.info(f"成功读取文件，共 {len(df)} 条原始数据")
+# 源数据必需列
+REQUIRED_COLUMNS = ['经度', '纬度', '影响分类', '发布时间']
+
+# 流水线实际用到的列（预处理后）
+PIPELINE_COLUMNS = ['经度', '纬度', '影响分类', '发布时间', '日期', '小时']
+
+# 精简模式下保留的列（可通过extra_columns追加）
+LEAN_COLUMNS = ['经度', '纬度', '影响分类', '日期', '小时']
+
+# 支持流式分块读取的输入格式
+STREAMING_EXTENSIONS = ('.csv', '.jsonl')
+
+# 列式缓存格式版本，清洗逻辑变化时递增
+INGEST_CACHE_VERSION = 1
+
+def ingest_cache_paths(file_path):
+    """返回源文件对应的列式缓存文件和元数据文件路径（与源文件同目录）"""
+    return f"{file_path}.cache.parquet", f"{file_path}.cache.json"
 
-        # 确保必需列存在
-        required_cols = ['经度', '纬度', '影响分类', '发布时间']
-        for col in required_cols:
-            if col not in df.columns:
-                logger.error(f"必需列 '{col}' 不存在")
+def _file_sha256(file_path):
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def load_ingest_cache(file_path, columns=None):
+    """
+    读取列式缓存，源文件变化或缓存不可用时返回None
+    先比较文件大小和修改时间，修改时间变化时再用内容哈希确认
+    """
+    data_path, meta_path = ingest_cache_paths(file_path)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        stat = os.stat(file_path)
+        if meta.get('version') != INGEST_CACHE_VERSION or meta.get('size') != stat.st_size:
+            return None
+        if meta.get('mtime_ns') != stat.st_mtime_ns:
+            if meta.get('sha256') != _file_sha256(file_path):
                 return None
+            meta['mtime_ns'] = stat.st_mtime_ns
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        return pd.read_parquet(data_path, columns=columns)
+    except Exception as e:
+        logger.warning(f"读取数据缓存失败，将重新读取源文件: {e}")
+        return None
 
-        # 确保经纬度和影响分类是数值类型
-        df['经度'] = pd.to_numeric(df['经度'], errors='coerce')
-        df['纬度'] = pd.to_numeric(df['纬度'], errors='coerce')
-        df['影响分类'] = pd.to_numeric(df['影响分类'], errors='coerce')
+def write_ingest_cache(file_path, df):
+    """将清洗后的数据写为Parquet缓存，写入失败时仅记录警告"""
+    data_path, meta_path = ingest_cache_paths(file_path)
+    try:
+        cached = df.copy()
+        # 混合类型的文本列（如数字与字符串混排）统一存为字符串
+        for col in cached.columns:
+            if cached[col].dtype == object and col != '日期':
+                cached[col] = cached[col].astype('string')
+        cached.to_parquet(data_path, index=False)
 
-        # 转换发布时间为datetime类型
-        df['发布时间'] = pd.to_datetime(df['发布时间'], errors='coerce')
-        
-        # 清理无效数据
-        df = df.dropna(subset=['经度', '纬度', '影响分类', '发布时间'])
+        stat = os.stat(file_path)
+        meta = {
+            'version': INGEST_CACHE_VERSION,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': _file_sha256(file_path)
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        logger.info(f"数据缓存已写入: {data_path}")
+    except Exception as e:
+        logger.warning(f"写入数据缓存失败: {e}")
+
+def read_weibo_excel(file_path, columns=None, use_cache=True, rebuild_cache=False, lean=False, extra_columns=None):
+    """
+    读取并预处理微博Excel数据
+    columns: 只返回指定的列（如PIPELINE_COLUMNS），为None时返回全部列
+    use_cache: 是否使用源文件旁的列式缓存；rebuild_cache: 忽略已有缓存并重新生成
+    lean: 精简模式，只保留LEAN_COLUMNS和extra_columns，并转为紧凑类型（见compact_weibo_frame）
+    """
+    if lean:
+        columns = LEAN_COLUMNS + [col for col in (extra_columns or []) if col not in LEAN_COLUMNS]
+
+    if use_cache and not rebuild_cache:
+        df = load_ingest_cache(file_path, columns)
+        if df is not None:
+            logger.info(f"从数据缓存读取，共 {len(df)} 条有效数据")
+            return compact_weibo_frame(df, report=True) if lean else df
+
+    try:
+        df = pd.read_excel(file_path)
+        logger.info(f"成功读取文件，共 {len(df)} 条原始数据")
+
+        df = clean_weibo_frame(df)
+        if df is None:
+            return None
         logger.info(f"清理后剩余 {len(df)} 条有效数据")
         
-        # 提取日期信息
-        df['日期'] = df['发布时间'].dt.date
-        df['小时'] = df['发布时间'].dt.hour
+        if use_cache:
+            write_ingest_cache(file_path, df)
         
+        if lean:
+            return compact_weibo_frame(df[columns], report=True, memory_before=df.memory_usage(deep=True).sum())
+        if columns is not None:
+            df = df[columns]
         return df
 
     except Exception as e:
         logger.error(f"读取Excel文件失败: {e}")
         return None
 
+def clean_weibo_frame(df):
+    """校验必需列并清洗微博数据（类型转换、去除无效行、提取日期和小时），必需列缺失时返回None"""
+    # 确保必需列存在
+    for col in REQUIRED_COLUMNS:
+        if col not in df.columns:
+            logger.error(f"必需列 '{col}' 不存在")
+            return None
+
+    # 确保经纬度和影响分类是数值类型
+    df['经度'] = pd.to_numeric(df['经度'], errors='coerce')
+    df['纬度'] = pd.to_numeric(df['纬度'], errors='coerce')
+    df['影响分类'] = pd.to_numeric(df['影响分类'], errors='coerce')
+
+    # 转换发布时间为datetime类型
+    df['发布时间'] = pd.to_datetime(df['发布时间'], errors='coerce')
+    
+    # 清理无效数据
+    df = df.dropna(subset=REQUIRED_COLUMNS)
+    
+    # 提取日期信息
+    df['日期'] = df['发布时间'].dt.date
+    df['小时'] = df['发布时间'].dt.hour
+    return df
+
+def compact_weibo_frame(df, report=False, memory_before=None):
+    """
+    将清洗后的数据转为紧凑类型：float32经纬度、int8影响分类和小时，
+    日期转为有序分类（类别为日期，按int编码存储），其余列保持不变
+    report: 记录转换前后的内存占用；memory_before为转换前（如列裁剪前）的占用
+    """
+    if report and memory_before is None:
+        memory_before = df.memory_usage(deep=True).sum()
+
+    compact = {}
+    for col in df.columns:
+        values = df[col]
+        if col in ('经度', '纬度'):
+            values = values.astype(np.float32)
+        elif col == '小时':
+            values = values.astype(np.int8)
+        elif col == '影响分类':
+            # 只有整数分类才能无损存为int8
+            if (values == np.round(values)).all() and values.abs().max() <= 127:
+                values = values.astype(np.int8)
+            else:
+                values = values.astype(np.float32)
+        elif col == '日期' and not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(pd.CategoricalDtype(sorted(values.unique()), ordered=True))
+        compact[col] = values
+    df = pd.DataFrame(compact, index=df.index)
+
+    if report:
+        memory_after = df.memory_usage(deep=True).sum()
+        reduction = 1 - memory_after / memory_before if memory_before else 0
+        logger.info(f"紧凑类型内存占用: {memory_before / 1024 / 1024:.1f} MB -> "
+                    f"{memory_after / 1024 / 1024:.1f} MB（减少 {reduction:.0%}）")
+    return df
+
+def iter_weibo_chunks(file_path, chunksize=200000):
+    """
+    分块流式读取CSV/JSONL微博数据，每块按read_weibo_excel相同的规则清洗后产出
+    只保留流水线需要的列，内存占用只与块大小有关；必需列缺失时抛出ValueError
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        reader = pd.read_csv(file_path, chunksize=chunksize, encoding='utf-8-sig',
+                             usecols=lambda col: col in REQUIRED_COLUMNS)
+    elif ext == '.jsonl':
+        reader = pd.read_json(file_path, lines=True, chunksize=chunksize, dtype=False, convert_dates=False)
+    else:
+        logger.error(f"不支持流式读取的文件格式: {ext}")
+        return
+
+    with reader:
+        for chunk in reader:
+            # 缺列时不能只结束迭代，否则调用方会把截断的数据当作完整输入
+            missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"输入文件缺少必需列: {missing}")
+            chunk = clean_weibo_frame(chunk[REQUIRED_COLUMNS])
+            yield chunk[PIPELINE_COLUMNS]
+
 def filter_data_by_date(df, start_date=None, end_date=None):
     """按日期过滤数据"""
+    if isinstance(df['日期'].dtype, pd.CategoricalDtype):
+        # 分类编码的日期只比较类别，再按编码筛选
+        categories = pd.Series(df['日期'].cat.categories)
+        keep = pd.Series(True, index=categories.index)
+        if start_date:
+            keep &= categories >= pd.to_datetime(start_date).date()
+        if end_date:
+            keep &= categories <= pd.to_datetime(end_date).date()
+        return df[df['日期'].cat.codes.isin(np.flatnonzero(keep.to_numpy()))]
     if start_date:
         df = df[df['日期'] >= pd.to_datetime(start_date).date()]
     if end_date:
@@ -1,68 +1,273 @@
+import os
+import math
+import pickle
+import hashlib
 import logging
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
 from shapely.geometry import Point
-from .utils import (
-    create_pointy_top_hexagon, get_neighbors, 
-    create_transformer, load_geojson
-)
+from .utils import hexagon_vertices, create_transformer, safe_mkdir
+from .boundary import load_boundary
 
 logger = logging.getLogger(__name__)
 
+# 网格缓存格式版本，网格生成逻辑变化时递增
+GRID_CACHE_VERSION = 4
+
+# 六边形单元键（int64）的位布局：边长（米）19位 | q 22位 | r 22位，q/r加上偏移后按无符号存储
+CELL_KEY_SIZE_BITS = 19
+CELL_KEY_AXIS_BITS = 22
+CELL_KEY_AXIS_OFFSET = 1 << (CELL_KEY_AXIS_BITS - 1)
+
+class HexGrid:
+    """
+    与日期无关的六边形网格，由（边界文件, 目标区域, 边长）唯一确定，
+    构建一次后可在所有日期的统计中复用
+    网格以连续的NumPy数组保存（按hex_id顺序），GeoDataFrame只在访问hex_gdf时生成
+    """
+    def __init__(self, hex_size_meters, lattice, rows, cols, centers, vertex_offsets, cell_keys):
+        self.hex_size_meters = hex_size_meters
+        # 网格参数: min_x, min_y, num_rows, num_cols（UTM坐标系）
+        # min_x/min_y 对齐到全局网格（见snap_origin），同一物理六边形在不同边界或数据范围下行列偏移固定
+        self.lattice = lattice
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.cols = np.asarray(cols, dtype=np.int32)
+        # 中心经纬度 (N, 2) [lng, lat]
+        self.centers = np.asarray(centers, dtype=np.float64)
+        # 6个顶点相对中心的经纬度偏移 (N, 6, 2)，偏移量很小，float32即可保留亚毫米精度
+        self.vertex_offsets = np.asarray(vertex_offsets, dtype=np.float32)
+        self.cell_keys = np.asarray(cell_keys, dtype=np.int64)
+        # 行列到hex_id的稠密索引表，不在网格内的位置为-1
+        self.index_table = np.full((lattice['num_rows'], lattice['num_cols']), -1, dtype=np.int32)
+        self.index_table[self.rows, self.cols] = np.arange(len(self.rows), dtype=np.int32)
+        self._hex_gdf = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getstate__(self):
+        # GeoDataFrame可由数组重新生成，不写入缓存，也不随进程池传递
+        state = self.__dict__.copy()
+        state['_hex_gdf'] = None
+        return state
+
+    def vertices(self, hex_ids=None):
+        """六边形顶点的经纬度 (N, 6, 2) [lng, lat]，hex_ids为None时返回全部"""
+        if hex_ids is None:
+            return self.centers[:, None, :] + self.vertex_offsets
+        hex_ids = np.asarray(hex_ids, dtype=np.int64)
+        return self.centers[hex_ids, None, :] + self.vertex_offsets[hex_ids]
+
+    @property
+    def bounds(self):
+        """网格的经纬度范围 (min_lng, min_lat, max_lng, max_lat)"""
+        vertices = self.vertices()
+        return (*vertices.min(axis=(0, 1)), *vertices.max(axis=(0, 1)))
+
+    def attribute_frame(self):
+        """不含几何的六边形属性表（按hex_id顺序），每日统计在其上添加列，渲染时顶点从网格数组读取"""
+        return pd.DataFrame({
+            'hex_id': np.arange(len(self), dtype=np.int64),
+            'center_lng': self.centers[:, 0],
+            'center_lat': self.centers[:, 1],
+            'row': self.rows.astype(np.int64),
+            'col': self.cols.astype(np.int64),
+            'cell_key': self.cell_keys
+        })
+
+    @property
+    def hex_gdf(self):
+        """网格的GeoDataFrame（首次访问时由数组生成并保留）"""
+        if self._hex_gdf is None:
+            frame = self.attribute_frame()
+            frame.insert(1, 'geometry', shapely.polygons(self.vertices()))
+            self._hex_gdf = gpd.GeoDataFrame(frame, geometry='geometry', crs="EPSG:4326")
+        return self._hex_gdf
+
+    def assign_points_to_hexes(self, lng, lat):
+        """
+        用六边形网格的解析公式将经纬度点批量分配到六边形
+        返回 (row, col, hex_id) 三个数组，不在网格内的点hex_id为-1
+        """
+        transformer_to_utm = create_transformer('EPSG:4326', 'EPSG:32650')
+        x, y = transformer_to_utm.transform_arrays(lng, lat)
+        return self.assign_utm_to_hexes(x, y)
+
+    def assign_utm_to_hexes(self, x, y):
+        """将UTM坐标点批量分配到六边形，返回值与assign_points_to_hexes相同"""
+        row, col, finite = lattice_cells(x, y, self.lattice['min_x'], self.lattice['min_y'], self.hex_size_meters)
+        valid = finite & (row >= 0) & (row < self.lattice['num_rows']) & (col >= 0) & (col < self.lattice['num_cols'])
+        hex_id = np.full(len(row), -1, dtype=np.int64)
+        hex_id[valid] = self.index_table[row[valid], col[valid]]
+        return row, col, hex_id
+
+    def hex_ids_for_keys(self, keys):
+        """按单元键查找hex_id（用于跨运行的整数连接），不在本网格中的键返回-1"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        order = np.argsort(self.cell_keys)
+        pos = order[np.minimum(np.searchsorted(self.cell_keys, keys, sorter=order), len(order) - 1)]
+        return np.where(self.cell_keys[pos] == keys, pos, -1)
+
+    def centers_utm(self):
+        """按hex_id顺序返回六边形中心的UTM坐标 (x, y)，由网格参数直接计算"""
+        return lattice_centers(self.lattice['min_x'], self.lattice['min_y'], self.rows.astype(np.int64),
+                               self.cols.astype(np.int64), self.hex_size_meters)
+
+def hexagon_rings(hex_gdf, grid=None):
+    """
+    按hex_gdf的行顺序返回六边形顶点经纬度 (N, 6, 2) [lng, lat]（不含闭合点）
+    提供网格时按hex_id直接读取网格数组，否则从hex_gdf的几何中提取
+    """
+    if grid is not None:
+        return grid.vertices(hex_gdf['hex_id'].to_numpy())
+    return shapely.get_coordinates(hex_gdf.geometry.exterior.values).reshape(len(hex_gdf), -1, 2)[:, :6]
+
+def lattice_centers(min_x, min_y, rows, cols, size):
+    """网格中（行, 列）六边形中心的UTM坐标（横向间隔1.5倍边长，行距√3倍边长，奇数列下移半行）"""
+    x = min_x + cols * (size * 1.5)
+    y = min_y + rows * (size * math.sqrt(3)) + (cols % 2 == 1) * (size * math.sqrt(3) / 2)
+    return x, y
+
+def lattice_cells(x, y, min_x, min_y, size):
+    """
+    用平顶六边形网格的解析公式求UTM坐标点所在的行列
+    返回 (row, col, finite)，坐标为NaN/inf的点finite为False、行列为-1左右的无效值
+    """
+    # 投影坐标转为以网格原点为起点、边长为单位的坐标
+    px = (np.asarray(x, dtype=float) - min_x) / size
+    py = (np.asarray(y, dtype=float) - min_y) / size
+
+    # 平顶六边形的轴坐标（q对应列）
+    q = px * 2 / 3
+    r = -px / 3 + py * math.sqrt(3) / 3
+    s = -q - r
+
+    # 立方体坐标取整：修正误差最大的分量
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+
+    # 轴坐标转回行列（奇数列下移）
+    finite = np.isfinite(rq) & np.isfinite(rr)
+    col = np.where(finite, rq, -1).astype(np.int64)
+    row = np.where(finite, rr, -1).astype(np.int64) + (col - (col & 1)) // 2
+    return row, col, finite
+
+def snap_origin(min_x, min_y, size):
+    """
+    将网格原点向下对齐到全局网格：x对齐到3倍边长（两列，保持奇偶列一致），y对齐到√3倍边长（一行）
+    对齐后网格的每个行列都对应UTM坐标原点锚定的全局六边形
+    """
+    return (math.floor(min_x / (3 * size)) * (3 * size),
+            math.floor(min_y / (math.sqrt(3) * size)) * (math.sqrt(3) * size))
+
+def pack_cell_keys(size, q, r):
+    """将（边长, 全局轴坐标q, r）打包为int64单元键"""
+    q = np.asarray(q, dtype=np.int64) + CELL_KEY_AXIS_OFFSET
+    r = np.asarray(r, dtype=np.int64) + CELL_KEY_AXIS_OFFSET
+    axis_limit = 1 << CELL_KEY_AXIS_BITS
+    if not 0 < int(size) < 1 << CELL_KEY_SIZE_BITS:
+        raise ValueError(f"六边形边长超出单元键范围: {size}")
+    if q.size and (q.min() < 0 or q.max() >= axis_limit or r.min() < 0 or r.max() >= axis_limit):
+        raise ValueError("六边形轴坐标超出单元键范围")
+    return (np.int64(int(size)) << (2 * CELL_KEY_AXIS_BITS)) | (q << CELL_KEY_AXIS_BITS) | r
+
+def unpack_cell_keys(keys):
+    """pack_cell_keys的逆过程，返回 (边长, q, r) 三个数组"""
+    keys = np.asarray(keys, dtype=np.int64)
+    mask = (1 << CELL_KEY_AXIS_BITS) - 1
+    size = keys >> (2 * CELL_KEY_AXIS_BITS)
+    q = ((keys >> CELL_KEY_AXIS_BITS) & mask) - CELL_KEY_AXIS_OFFSET
+    r = (keys & mask) - CELL_KEY_AXIS_OFFSET
+    return size, q, r
+
+def lattice_cell_keys(min_x, min_y, rows, cols, size):
+    """网格中（行, 列）对应的全局单元键（原点需已由snap_origin对齐）"""
+    # 原点在全局网格中的列号（偶数）和行号
+    global_cols = np.asarray(cols, dtype=np.int64) + int(round(min_x / (1.5 * size)))
+    global_rows = np.asarray(rows, dtype=np.int64) + int(round(min_y / (math.sqrt(3) * size)))
+    q = global_cols
+    r = global_rows - (global_cols - (global_cols & 1)) // 2
+    return pack_cell_keys(size, q, r)
+
+def grid_from_cells(min_x, min_y, num_rows, num_cols, rows, cols, hex_size_meters):
+    """
+    由网格参数和选中的（行, 列）创建HexGrid
+    rows/cols 需按列优先顺序排列（与hex_id的编号顺序一致）
+    """
+    transformer_to_wgs = create_transformer('EPSG:32650', 'EPSG:4326')
+    x_offsets, y_offsets = lattice_centers(min_x, min_y, rows, cols, hex_size_meters)
+
+    # 计算六边形顶点，并一次性转换回WGS84坐标系
+    vx, vy = hexagon_vertices(x_offsets, y_offsets, hex_size_meters)
+    vlng, vlat = transformer_to_wgs.transform_arrays(vx, vy)
+    vertices = np.stack([vlng, vlat], axis=-1)
+
+    # 中心点取WGS84多边形的质心，顶点只保存相对中心的偏移
+    centroids = shapely.centroid(shapely.polygons(vertices))
+    centers = np.column_stack([shapely.get_x(centroids), shapely.get_y(centroids)])
+
+    lattice = {'min_x': min_x, 'min_y': min_y, 'num_rows': num_rows, 'num_cols': num_cols}
+    return HexGrid(hex_size_meters, lattice, rows, cols, centers, vertices - centers[:, None, :],
+                   lattice_cell_keys(min_x, min_y, rows, cols, hex_size_meters))
+
 def load_beijing_boundary(boundary_file, target_districts=None):
-    """加载北京边界并创建多边形，可指定特定区域"""
-    try:
-        geo = load_geojson(boundary_file)
-        if not geo:
-            return None
-            
-        polygons = []
-        for feature in geo['features']:
-            if target_districts:
-                district_name = feature['properties'].get('name', '')
-                if district_name not in target_districts:
-                    continue
-            
-            geometry = feature['geometry']
-            if geometry['type'] == 'Polygon':
-                for ring in geometry['coordinates']:
-                    ring_points = [(lng, lat) for lng, lat in ring]
-                    polygons.append(Polygon(ring_points))
-            elif geometry['type'] == 'MultiPolygon':
-                for polygon in geometry['coordinates']:
-                    for ring in polygon:
-                        ring_points = [(lng, lat) for lng, lat in ring]
-                        polygons.append(Polygon(ring_points))
-        
-        return unary_union(polygons)
-    
-    except Exception as e:
-        logger.error(f"加载边界文件失败: {e}")
-        return None
+    """加载北京边界合并后的多边形（WGS84），可指定特定区域"""
+    boundary = load_boundary(boundary_file, target_districts)
+    return boundary.union if boundary else None
+
+def grid_cache_key(boundary_file, target_districts, hex_size_meters):
+    """根据边界文件内容哈希和网格参数生成缓存键"""
+    hasher = hashlib.sha256()
+    with open(boundary_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(block)
+    params = f"v{GRID_CACHE_VERSION}|{hex_size_meters}|{','.join(sorted(target_districts or []))}"
+    hasher.update(params.encode('utf-8'))
+    return hasher.hexdigest()[:16]
 
-def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, target_districts=None):
+def build_hexagon_grid(hex_size_meters=500, boundary_file=None, target_districts=None, df=None, cache_dir=None):
     """
-    计算六边形网格影响力（使用投影坐标系确保正六边形）
-    hex_size_meters: 六边形边长（米）
+    创建六边形网格（使用投影坐标系确保正六边形）
+    提供边界文件时网格只依赖于边界和参数，可通过cache_dir缓存到磁盘；
+    否则使用df的数据范围创建网格
     """
     try:
-        logger.info(f"开始创建北京区域蜂窝状六边形网格（边长={hex_size_meters}米）...")
-        
         # 如果没有指定目标区域，使用默认的六个核心区
         if target_districts is None:
             target_districts = ['海淀区', '朝阳区', '东城区', '西城区', '石景山区', '丰台区']
-        
-        # 加载北京边界
-        beijing_poly = load_beijing_boundary(boundary_file, target_districts)
+
+        # 尝试从磁盘缓存加载
+        cache_file = None
+        if cache_dir and boundary_file and os.path.exists(boundary_file):
+            key = grid_cache_key(boundary_file, target_districts, hex_size_meters)
+            cache_file = os.path.join(cache_dir, f"hexgrid_{key}.pkl")
+            if os.path.exists(cache_file):
+                try:
+                    with open(cache_file, 'rb') as f:
+                        grid = pickle.load(f)
+                    logger.info(f"从缓存加载六边形网格: {cache_file}（{len(grid)} 个六边形）")
+                    return grid
+                except Exception as e:
+                    logger.warning(f"读取网格缓存失败，将重新生成: {e}")
+
+        logger.info(f"开始创建北京区域蜂窝状六边形网格（边长={hex_size_meters}米）...")
+
+        # 加载北京边界（已投影到UTM并预处理）
+        boundary = load_boundary(boundary_file, target_districts)
         
         # 定义投影坐标系
         transformer_to_utm = create_transformer('EPSG:4326', 'EPSG:32650')
-        transformer_to_wgs = create_transformer('EPSG:32650', 'EPSG:4326')
 
-        # 投影北京边界到UTM
-        if beijing_poly:
-            beijing_utm = transform(transformer_to_utm, beijing_poly)
-            min_x, min_y, max_x, max_y = beijing_utm.bounds
+        if boundary:
+            min_x, min_y, max_x, max_y = boundary.union_utm.bounds
             
             # 扩大边界范围，确保完全覆盖
             expand_margin = 5000  # 5公里
@@ -71,14 +276,14 @@ def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, tar
             max_x += expand_margin
             max_y += expand_margin
         else:
+            if df is None or len(df) == 0:
+                logger.error("未提供边界文件且没有数据，无法确定网格范围")
+                return None
+
             # 如果没有边界，使用数据范围
-            min_x, min_y, max_x, max_y = float('inf'), float('inf'), float('-inf'), float('-inf')
-            for lng, lat in zip(df['经度'], df['纬度']):
-                x, y = transformer_to_utm(lng, lat)
-                min_x = min(min_x, x)
-                min_y = min(min_y, y)
-                max_x = max(max_x, x)
-                max_y = max(max_y, y)
+            xs, ys = transformer_to_utm.transform_arrays(df['经度'], df['纬度'])
+            min_x, min_y = float(np.min(xs)), float(np.min(ys))
+            max_x, max_y = float(np.max(xs)), float(np.max(ys))
             
             # 扩大数据范围
             expand_margin = 5000  # 5公里
@@ -89,10 +294,12 @@ def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, tar
             
             logger.warning("未提供边界文件，使用数据范围创建网格")
         
+        # 原点对齐到全局网格，使同一位置的六边形在不同边界或数据范围下具有相同的单元键
+        min_x, min_y = snap_origin(min_x, min_y, hex_size_meters)
+
         # 计算六边形参数（在投影坐标系中）
         horizontal_spacing = hex_size_meters * 1.5  # 横向间隔
         vertical_spacing = hex_size_meters * math.sqrt(3)  # 行间距
-        y_shift = hex_size_meters * math.sqrt(3) / 2  # 奇数列纵向整体下移
 
         # 计算列数和行数（保证覆盖区域）
         num_cols = int((max_x - min_x) / horizontal_spacing) + 5
@@ -101,85 +308,121 @@ def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, tar
         logger.info(f"网格范围: X({min_x:.1f}-{max_x:.1f}), Y({min_y:.1f}-{max_y:.1f})")
         logger.info(f"网格尺寸: {num_cols}列 x {num_rows}行")
 
-        hexagons = []
-        hex_id = 0
-        for col in range(num_cols):
-            x_offset = min_x + col * horizontal_spacing
-            for row in range(num_rows):
-                # 奇数列纵向整体下移 y_shift
-                if col % 2 == 0:
-                    y_offset = min_y + row * vertical_spacing
-                else:
-                    y_offset = min_y + row * vertical_spacing + y_shift
-
-                # 创建六边形（以x_offset, y_offset为中心）
-                hexagon_utm = create_pointy_top_hexagon(x_offset, y_offset, hex_size_meters)
-
-                # 检查六边形中心是否在北京边界内
-                center_point = Point(x_offset, y_offset)
-                if beijing_utm is None or beijing_utm.contains(center_point):
-                    # 将六边形转换回WGS84坐标系
-                    hexagon_wgs84 = transform(transformer_to_wgs, hexagon_utm)
-
-                    # 获取中心点（在WGS84坐标系中）
-                    center = hexagon_wgs84.centroid
-
-                    hexagons.append({
-                        'hex_id': hex_id,
-                        'geometry': hexagon_wgs84,
-                        'center_lng': center.x,
-                        'center_lat': center.y,
-                        'row': row,
-                        'col': col
-                    })
-                    hex_id += 1
-        
-        logger.info(f"创建了 {len(hexagons)} 个六边形")
-        
-        # 创建六边形GeoDataFrame
-        hex_gdf = gpd.GeoDataFrame(hexagons, geometry='geometry', crs="EPSG:4326")
-        
-        # 创建微博点GeoDataFrame
-        geometry = [Point(lng, lat) for lng, lat in zip(df['经度'], df['纬度'])]
-        gdf = gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
+        # 按列优先顺序生成所有候选六边形中心（与hex_id的编号顺序一致）
+        cols, rows = np.meshgrid(np.arange(num_cols), np.arange(num_rows), indexing='ij')
+        cols = cols.ravel()
+        rows = rows.ravel()
+        x_offsets, y_offsets = lattice_centers(min_x, min_y, rows, cols, hex_size_meters)
+
+        # 检查六边形中心是否在北京边界内（使用预处理的几何一次性判断）
+        if boundary:
+            inside = boundary.contains_utm(x_offsets, y_offsets)
+            cols, rows = cols[inside], rows[inside]
+
+        # 生成六边形几何和GeoDataFrame
+        grid = grid_from_cells(min_x, min_y, num_rows, num_cols, rows, cols, hex_size_meters)
+        logger.info(f"创建了 {len(grid)} 个六边形")
+
+        # 写入磁盘缓存
+        if cache_file and safe_mkdir(cache_dir):
+            try:
+                with open(cache_file, 'wb') as f:
+                    pickle.dump(grid, f, protocol=pickle.HIGHEST_PROTOCOL)
+                logger.info(f"六边形网格已缓存到: {cache_file}")
+            except Exception as e:
+                logger.warning(f"写入网格缓存失败: {e}")
+
+        return grid
+
+    except Exception as e:
+        logger.error(f"创建六边形网格时出错: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return None
+
+class HexPyramid:
+    """
+    多分辨率六边形金字塔：第0层为最细的网格，其余各层边长依次放大
+    各层与最细层共用网格原点，最细层的每个六边形按中心点归属到各层中唯一的父六边形
+    """
+    def __init__(self, grids, factors, parents):
+        # 各层网格（由细到粗）及相对最细层的边长倍数
+        self.grids = grids
+        self.factors = factors
+        # parents[k]: 最细层hex_id -> 第k层hex_id（第0层为恒等映射）
+        self.parents = parents
+
+    def __len__(self):
+        return len(self.grids)
+
+    @property
+    def hex_sizes(self):
+        return [grid.hex_size_meters for grid in self.grids]
+
+def build_hex_pyramid(grid, factors=(2, 4, 8)):
+    """
+    以grid为最细层构建六边形金字塔，factors为各粗层相对最细层的边长倍数
+    粗层只保留包含最细层六边形中心的位置，覆盖范围与最细层一致
+    """
+    factors = sorted({int(f) for f in factors if int(f) > 1})
+    grids, parents = [grid], [np.arange(len(grid), dtype=np.int64)]
+    x, y = grid.centers_utm()
+    for factor in factors:
+        size = grid.hex_size_meters * factor
+        # 粗层原点同样对齐到全局网格；最细层中心都在原点的右上方，所属的粗层行列均为非负数
+        min_x, min_y = snap_origin(grid.lattice['min_x'], grid.lattice['min_y'], size)
+        rows, cols, _ = lattice_cells(x, y, min_x, min_y, size)
+        num_rows, num_cols = int(rows.max()) + 1, int(cols.max()) + 1
+        # 按列优先顺序编号（与最细层的hex_id顺序规则一致）
+        cells, parent = np.unique(cols * num_rows + rows, return_inverse=True)
+        coarse = grid_from_cells(min_x, min_y, num_rows, num_cols, cells % num_rows, cells // num_rows, size)
+        grids.append(coarse)
+        parents.append(parent.astype(np.int64))
+        logger.info(f"金字塔层 边长={size}米: {len(coarse)} 个六边形")
+    return HexPyramid(grids, [1] + factors, parents)
+
+def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, target_districts=None, grid=None,
+                                assign_method='lattice'):
+    """
+    计算六边形网格影响力（使用投影坐标系确保正六边形）
+    hex_size_meters: 六边形边长（米）
+    grid: 预先构建的HexGrid，为None时按参数现场创建
+    assign_method: 'lattice' 用网格解析公式分配点（默认）；
+                   'sjoin' 用空间连接分配点，仅用于校验
+    """
+    try:
+        if grid is None:
+            grid = build_hexagon_grid(hex_size_meters, boundary_file, target_districts, df=df)
+            if grid is None:
+                return None
+
+        hex_gdf = grid.hex_gdf.copy()
         
-        # 空间连接，计算每个六边形内的点
+        # 计算每个六边形内的点
         if len(hex_gdf) > 0:
-            joined = gpd.sjoin(gdf, hex_gdf, how="inner", predicate='within')
-            
-            # 计算每个六边形的统计信息
-            hex_stats = joined.groupby('hex_id').agg(
-                max_level=('影响分类', 'max'),
-                count=('影响分类', 'count'),
-                lv2_cnt=('影响分类', lambda s: (s == 2).sum()),
-                lv3_cnt=('影响分类', lambda s: (s == 3).sum())
-            ).reset_index()
-
-            # 新增"二级+三级"合计列
-            hex_stats['lv2_plus_lv3'] = hex_stats['lv2_cnt'] + hex_stats['lv3_cnt']
-                        
-            # 合并回六边形GeoDataFrame
-            hex_gdf = hex_gdf.merge(hex_stats, on='hex_id', how='left')
-            
-            # 填充空值
-            for col in ['max_level', 'count', 'lv2_cnt', 'lv3_cnt', 'lv2_plus_lv3']:
-                hex_gdf[col] = hex_gdf[col].fillna(0)
+            if assign_method == 'sjoin':
+                # 创建微博点GeoDataFrame，空间连接
+                geometry = [Point(lng, lat) for lng, lat in zip(df['经度'], df['纬度'])]
+                gdf = gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
+                joined = gpd.sjoin(gdf, hex_gdf, how="inner", predicate='within')
+                hex_ids = joined['hex_id'].to_numpy()
+                levels = joined['影响分类'].to_numpy(dtype=float)
+            else:
+                _, _, hex_ids = grid.assign_points_to_hexes(df['经度'].to_numpy(), df['纬度'].to_numpy())
+                inside = hex_ids >= 0
+                hex_ids = hex_ids[inside]
+                levels = df['影响分类'].to_numpy(dtype=float)[inside]
             
-            # 计算星级
-            def star_rating(row):
-                if pd.isna(row['lv2_plus_lv3']):
-                    return 0
-                if row['lv2_plus_lv3'] > 5:
-                    return 4
-                return min(3, int(row['max_level'] or 0))
-            
-            hex_gdf['star_rating'] = hex_gdf.apply(star_rating, axis=1)
+            # 计算每个六边形的统计信息（hex_id即六边形在网格中的位置）
+            hex_stats = aggregate_hex_stats(hex_ids, levels, len(hex_gdf))
+            for col, values in hex_stats.items():
+                hex_gdf[col] = values
             
             # 处理邻居关系
             apply_neighbor_influence(hex_gdf)
         else:
             # 如果没有数据，设置默认值
-            for col in ['max_level', 'count', 'lv2_cnt', 'lv3_cnt', 'lv2_plus_lv3', 'star_rating']:
+            for col in ['max_level', 'count', 'lv1_cnt', 'lv2_cnt', 'lv3_cnt', 'lv2_plus_lv3', 'star_rating']:
                 hex_gdf[col] = 0
         
         logger.info(f"北京区域蜂窝状六边形网格创建完成，共 {len(hex_gdf)} 个六边形区域")
@@ -193,55 +436,111 @@ def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, tar
         logger.error(traceback.format_exc())
         return None
 
+def star_ratings(max_level, lv2_plus_lv3):
+    """根据最高影响分类和二级+三级数量计算星级（邻居提升前）"""
+    max_level = np.asarray(max_level, dtype=float)
+    lv2_plus_lv3 = np.asarray(lv2_plus_lv3)
+    return np.select(
+        [lv2_plus_lv3 > 5],
+        [4],
+        default=np.minimum(3, np.trunc(max_level)).astype(np.int64)
+    ).astype(np.int64)
+
+def aggregate_hex_stats(hex_ids, levels, num_hexes):
+    """
+    按六边形汇总影响统计（向量化，不使用groupby）
+    hex_ids: 每条微博所在六边形的位置（0..num_hexes-1）
+    levels: 每条微博的影响分类
+    返回各统计列的数组，没有微博的六边形统计值为0
+    """
+    hex_ids = np.asarray(hex_ids, dtype=np.int64)
+    levels = np.asarray(levels, dtype=float)
+
+    count = np.bincount(hex_ids, minlength=num_hexes)
+    max_level = np.full(num_hexes, -np.inf)
+    np.maximum.at(max_level, hex_ids, levels)
+    max_level[count == 0] = 0
+
+    lv1_cnt = np.bincount(hex_ids[levels == 1], minlength=num_hexes)
+    lv2_cnt = np.bincount(hex_ids[levels == 2], minlength=num_hexes)
+    lv3_cnt = np.bincount(hex_ids[levels == 3], minlength=num_hexes)
+    lv2_plus_lv3 = lv2_cnt + lv3_cnt
+
+    return {
+        'max_level': max_level,
+        'count': count,
+        'lv1_cnt': lv1_cnt,
+        'lv2_cnt': lv2_cnt,
+        'lv3_cnt': lv3_cnt,
+        'lv2_plus_lv3': lv2_plus_lv3,
+        'star_rating': star_ratings(max_level, lv2_plus_lv3)
+    }
+
+# 六个邻居的（行, 列）偏移，偶数列和奇数列不同（奇数列下移半格），与utils.get_neighbors一致
+EVEN_COL_NEIGHBOR_OFFSETS = [(-1, 1), (0, 1), (1, 0), (0, -1), (-1, -1), (-1, 0)]
+ODD_COL_NEIGHBOR_OFFSETS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, 0)]
+
+def propagate_neighbor_influence(stars):
+    """
+    在稠密（行, 列）星级数组上应用邻居影响力提升规则
+    stars: 形状为 (..., num_rows, num_cols) 的整数数组，网格外的位置为-1，
+           前面的维度（如日期）各自独立处理
+    返回提升后的星级数组
+    """
+    stars = np.asarray(stars)
+    num_rows, num_cols = stars.shape[-2:]
+    pad_width = [(0, 0)] * (stars.ndim - 2) + [(1, 1), (1, 1)]
+    padded = np.pad(stars, pad_width, constant_values=-1)
+    odd_cols = np.arange(num_cols) % 2 == 1
+
+    def shifted(dr, dc):
+        return padded[..., 1 + dr:1 + dr + num_rows, 1 + dc:1 + dc + num_cols]
+
+    # 统计每个位置是否有四星/三星邻居
+    has_4_neighbor = np.zeros(stars.shape, dtype=bool)
+    has_3_neighbor = np.zeros(stars.shape, dtype=bool)
+    for even_offset, odd_offset in zip(EVEN_COL_NEIGHBOR_OFFSETS, ODD_COL_NEIGHBOR_OFFSETS):
+        neighbor = np.where(odd_cols, shifted(*odd_offset), shifted(*even_offset))
+        has_4_neighbor |= neighbor == 4
+        has_3_neighbor |= neighbor == 3
+
+    # 四级邻居规则: 0/1星提升为2星，2星提升为3星
+    # 三级邻居规则: 0星提升为1星，1星提升为2星（取各规则结果的最大值）
+    return np.select(
+        [
+            (stars == 2) & has_4_neighbor,
+            ((stars == 0) | (stars == 1)) & has_4_neighbor,
+            (stars == 1) & has_3_neighbor,
+            (stars == 0) & has_3_neighbor
+        ],
+        [3, 2, 2, 1],
+        default=stars
+    )
+
+def grid_neighbor_influence(grid, stars):
+    """
+    在网格上应用邻居影响力提升规则
+    stars: 形状为 (..., 六边形数) 的星级数组（按hex_id顺序），前面的维度（如日期）各自独立处理
+    """
+    stars = np.asarray(stars)
+    rows, cols = grid.rows, grid.cols
+    dense = np.full(stars.shape[:-1] + grid.index_table.shape, -1, dtype=np.int8)
+    dense[..., rows, cols] = stars
+    return propagate_neighbor_influence(dense)[..., rows, cols]
+
 def apply_neighbor_influence(hex_gdf):
     """应用邻居影响力提升规则"""
-    # 创建行列到hex_id的映射
-    row_col_to_id = {}
-    for idx, row in hex_gdf.iterrows():
-        row_col_to_id[(row['row'], row['col'])] = row['hex_id']
-    
-    # 创建hex_id到星级和邻居的映射
-    hex_info = {}
-    for idx, row in hex_gdf.iterrows():
-        hex_id = row['hex_id']
-        hex_info[hex_id] = {
-            'star_rating': row['star_rating'],
-            'row': row['row'],
-            'col': row['col'],
-            'neighbors': []
-        }
-    
-    # 填充邻居信息
-    for hex_id, info in hex_info.items():
-        neighbors = get_neighbors(info['row'], info['col'])
-        for nr, nc in neighbors:
-            if (nr, nc) in row_col_to_id:
-                neighbor_id = row_col_to_id[(nr, nc)]
-                info['neighbors'].append(neighbor_id)
-    
-    # 应用邻居提升规则
-    updates = {}
-    for hex_id, info in hex_info.items():
-        star = info['star_rating']
-        for neighbor_id in info['neighbors']:
-            nstar = hex_info[neighbor_id]['star_rating']
-            # 四级邻居规则
-            if star == 4:
-                if nstar == 0 or nstar == 1:
-                    if neighbor_id not in updates or updates[neighbor_id] < 2:
-                        updates[neighbor_id] = 2
-                elif nstar == 2:
-                    updates[neighbor_id] = 3
-            # 三级邻居规则
-            elif star == 3:
-                if nstar == 0:
-                    if neighbor_id not in updates or updates[neighbor_id] < 1:
-                        updates[neighbor_id] = 1
-                elif nstar == 1:
-                    if neighbor_id not in updates or updates[neighbor_id] < 2:
-                        updates[neighbor_id] = 2
-
-    # 应用更新
-    for hex_id, new_star in updates.items():
-        hex_gdf.loc[hex_gdf['hex_id'] == hex_id, 'star_rating'] = new_star
-    logger.info(f"已更新 {len(updates)} 个区域的星级（邻居提升）")
\ No newline at end of file
+    if len(hex_gdf) == 0:
+        return
+    rows = hex_gdf['row'].to_numpy()
+    cols = hex_gdf['col'].to_numpy()
+    stars = hex_gdf['star_rating'].to_numpy()
+
+    # 将星级放入稠密的（行, 列）数组，网格外为-1
+    dense = np.full((rows.max() + 1, cols.max() + 1), -1, dtype=np.int64)
+    dense[rows, cols] = stars
+    new_stars = propagate_neighbor_influence(dense)[rows, cols]
+
+    # 一次性写回
+    hex_gdf['star_rating'] = new_stars
+    logger.info(f"已更新 {int((new_stars != stars).sum())} 个区域的星级（邻居提升）")
\ No newline at end of file
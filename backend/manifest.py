@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from .hexagon_grid import grid_cache_key
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'build_manifest.json'
+
+# 输出页面生成逻辑的版本，地图内容或格式变化时递增，使所有日期重新生成
+BUILD_CODE_VERSION = 10
+
+# 决定当天地图内容的统计列
+FINGERPRINT_COLUMNS = ['count', 'max_level', 'lv1_cnt', 'lv2_cnt', 'lv3_cnt', 'star_rating']
+
+def day_fingerprint(hex_gdf):
+    """
+    计算某一天统计结果的内容指纹
+    指纹基于每个六边形的统计值，与输入数据的行顺序及读取方式（整表/流式/分区存储）无关
+    """
+    digest = hashlib.sha256()
+    digest.update(str(len(hex_gdf)).encode())
+    for col in FINGERPRINT_COLUMNS:
+        values = np.nan_to_num(hex_gdf[col].to_numpy(dtype=np.float64), nan=-1.0)
+        digest.update(col.encode())
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+def build_params(grid, config):
+    """汇总决定输出内容的网格和渲染参数，任一项变化都需要全部重建"""
+    lattice = grid.lattice
+    boundary_file = config.get('boundary_file')
+    target_districts = config.get('target_districts')
+    boundary_key = None
+    if boundary_file and os.path.exists(boundary_file):
+        boundary_key = grid_cache_key(boundary_file, target_districts, grid.hex_size_meters)
+    return {
+        'code_version': BUILD_CODE_VERSION,
+        'hex_size': grid.hex_size_meters,
+        'boundary': boundary_key,
+        'target_districts': list(target_districts or []),
+        'lattice': [float(lattice['min_x']), float(lattice['min_y']),
+                    int(lattice['num_rows']), int(lattice['num_cols']), len(grid)],
+        'amap_tiles': config.get('amap_tiles'),
+        'amap_attr': config.get('amap_attr'),
+        'hex_render': config.get('hex_render', 'geojson'),
+        'renderer': config.get('renderer', 'folium'),
+        'output_mode': config.get('output_mode', 'pages'),
+        'pyramid_factors': list(config.get('pyramid_factors') or []),
+        'index_encoding': config.get('index_encoding', 'compact')
+    }
+
+def load_manifest(output_dir, params):
+    """
+    读取输出目录中的构建清单，返回 {日期字符串: 记录}
+    清单不存在、损坏或网格/代码参数与本次运行不一致时返回空字典（全部重建）
+    """
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except Exception as e:
+        logger.warning(f"构建清单读取失败，将全部重建: {e}")
+        return {}
+
+    if manifest.get('params') != params:
+        logger.info("网格参数或代码版本已变化，将全部重建")
+        return {}
+
+    # 只保留地图文件仍然存在的日期
+    entries = {}
+    for date_str, entry in manifest.get('dates', {}).items():
+        if os.path.exists(os.path.join(output_dir, entry.get('map_file', ''))):
+            entries[date_str] = entry
+    return entries
+
+def save_manifest(output_dir, params, entries):
+    """写入构建清单（先写临时文件再替换，避免中断时留下损坏的清单）"""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {
+        'params': params,
+        'dates': {date_str: entries[date_str] for date_str in sorted(entries)}
+    }
+    try:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+        return path
+    except Exception as e:
+        logger.error(f"写入构建清单失败: {e}")
+        return None
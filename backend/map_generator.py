@@ -1,29 +1,72 @@
 import os
 import folium
 import json
+import hashlib
 import logging
+import itertools
+import numpy as np
+from contextlib import contextmanager
+from branca.element import Element
 from branca.colormap import LinearColormap
-from .utils import safe_mkdir, load_geojson
+from .utils import safe_mkdir
+from .search_index import SEARCH_INDEX_FILE
+from .boundary import load_boundary
+from .hexagon_grid import hexagon_rings
 
 logger = logging.getLogger(__name__)
 
-def create_influence_map(hex_gdf, output_path, boundary_file=None, date_str=None, amap_tiles=None):
-    """创建六边形影响力地图"""
+@contextmanager
+def stable_element_ids(seed):
+    """
+    folium/branca元素默认使用随机ID，同一输入每次生成的HTML都不同；
+    在此上下文中按种子和创建顺序生成ID，使串行和并行运行的输出逐字节一致
+    """
+    counter = itertools.count()
+    original = Element.__dict__['_generate_id']
+    Element._generate_id = classmethod(
+        lambda cls: hashlib.md5(f"{seed}:{next(counter)}".encode('utf-8')).hexdigest()
+    )
     try:
-        # 计算中心点
-        center = hex_gdf.unary_union.centroid
-        center_lat, center_lng = center.y, center.x
+        yield
+    finally:
+        Element._generate_id = original
+
+# 默认地图瓦片
+DEFAULT_AMAP_TILES = 'http://webrd02.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=1&style=7&x={x}&y={y}&z={z}'
+DEFAULT_AMAP_ATTR = '高德地图'
+
+# 六边形绘制方式: geojson（单个GeoJSON图层，共享样式和弹窗模板）或 polygons（每个六边形一个Polygon）
+HEX_RENDER_MODES = ('geojson', 'polygons')
+
+def create_influence_map(hex_gdf, output_path, boundary_file=None, date_str=None, amap_tiles=None,
+                         amap_attr=None, hex_render='geojson', grid=None):
+    """
+    创建六边形影响力地图
+    grid: hex_gdf所属的网格，提供时顶点从网格数组读取（hex_gdf可以不含几何）
+    """
+    # 以输出文件名为种子生成元素ID
+    with stable_element_ids(os.path.basename(output_path)):
+        return _build_influence_map(hex_gdf, output_path, boundary_file, date_str, amap_tiles,
+                                    amap_attr, hex_render, grid)
+
+def _build_influence_map(hex_gdf, output_path, boundary_file, date_str, amap_tiles, amap_attr, hex_render, grid):
+    """构建并保存地图（元素ID由调用方控制）"""
+    try:
+        # 计算中心点（取网格外包矩形中心，初始视野随后由fit_bounds适配，无需合并所有六边形）
+        rings = hexagon_rings(hex_gdf, grid)
+        bounds = [*rings.min(axis=(0, 1)), *rings.max(axis=(0, 1))]
+        center_lat, center_lng = (bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2
         logger.info(f"地图中心点: 纬度 {center_lat:.6f}, 经度 {center_lng:.6f}")
         
         # 计算缩放级别
-        bounds = hex_gdf.unary_union.bounds
         lat_diff = bounds[3] - bounds[1]
         zoom_start = 11 if lat_diff < 0.3 else 10 if lat_diff < 0.6 else 9
         
         # 设置默认地图瓦片
         if amap_tiles is None:
-            amap_tiles = 'http://webrd02.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=1&style=7&x={x}&y={y}&z={z}'
-            amap_attr = '高德地图'
+            amap_tiles = DEFAULT_AMAP_TILES
+        if amap_attr is None:
+            amap_attr = DEFAULT_AMAP_ATTR
         
         # 创建基础地图
         m = folium.Map(
@@ -36,8 +79,7 @@ def create_influence_map(hex_gdf, output_path, boundary_file=None, date_str=None
 
         # 自动适配所有六边形区域
         try:
-            bounds = hex_gdf.unary_union.bounds
-            fit_bounds = [[bounds[1], bounds[0]], [bounds[3], bounds[2]]]
+            fit_bounds = [[float(bounds[1]), float(bounds[0])], [float(bounds[3]), float(bounds[2])]]
             m.fit_bounds(fit_bounds)
         except Exception as e:
             logger.warning(f"fit_bounds 自动适配失败: {e}")
@@ -60,7 +102,10 @@ def create_influence_map(hex_gdf, output_path, boundary_file=None, date_str=None
         add_boundary_to_map(m, boundary_file)
         
         # 添加六边形区域
-        add_hexagons_to_map(m, hex_gdf, colormap)
+        if hex_render == 'polygons':
+            add_hexagons_to_map(m, hex_gdf, colormap, grid)
+        else:
+            add_hexagons_geojson_to_map(m, hex_gdf, colormap, grid)
         
         # 保存地图
         if not safe_mkdir(os.path.dirname(output_path)):
@@ -77,62 +122,15 @@ def create_influence_map(hex_gdf, output_path, boundary_file=None, date_str=None
         logger.error(traceback.format_exc())
         return None
 
-def create_search_html(hex_gdf, date_str):
-    """创建搜索框HTML"""
-    # 收集所有日期的hex_data
-    hex_data_dict = {}
-    output_dir = os.path.dirname(output_path) if os.path.isdir(output_path) else output_path
-    json_files = glob.glob(os.path.join(output_dir, "beijing_hexagon_honeycomb_map_*.json"))
-    
-    for jf in json_files:
-        date_part = os.path.basename(jf).replace("beijing_hexagon_honeycomb_map_", "").replace(".json", "")
-        try:
-            with open(jf, 'r', encoding='utf-8') as f:
-                hex_data_dict[date_part] = json.load(f)
-        except Exception:
-            continue
-    
-    # 当前日期数据
-    hex_data = []
-    for _, row in hex_gdf.iterrows():
-        center = row['geometry'].centroid
-        hex_data.append({
-            'lat': center.y,
-            'lng': center.x,
-            'star': int(row['star_rating']),
-            'max_level': int(row['max_level']),
-            'count': int(row['count']),
-            'row': int(row['row']),
-            'col': int(row['col'])
-        })
-    
-    if date_str:
-        hex_data_dict[date_str] = hex_data
-    
-    if not hex_data_dict:
-        hex_data_dict[date_str if date_str else '当前'] = hex_data
-    
-    # 保存当前数据为JSON
-    if date_str:
-        try:
-            json_path = os.path.join(output_dir, f"beijing_hexagon_honeycomb_map_{date_str}.json")
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(hex_data, f, ensure_ascii=False)
-        except Exception:
-            pass
-    
-    # 日期显示
-    date_display = f" - {date_str}" if date_str else ""
-    
-    # 创建日期选项
-    date_options = ''.join([f'<option value="{d}">{d}</option>' for d in sorted(hex_data_dict.keys())])
-    
+def search_panel_html(date_str=None, search_index=SEARCH_INDEX_FILE):
+    """
+    创建区域查询面板HTML
+    查询数据来自每次运行只写一次的查询索引文件，页面本身不嵌入任何日期的数据
+    """
     return f'''
     <div id="locationSearch" style="position: fixed; top: 10px; left: 10px; z-index: 1000; background: white; padding: 10px; border-radius: 5px; box-shadow: 0 0 5px rgba(0,0,0,0.3);">
         <h4 style="margin:0 0 10px 0;">区域影响查询</h4>
-        <select id="dateSelect" style="margin-bottom:5px; width: 140px;">
-            {date_options}
-        </select>
+        <select id="dateSelect" style="margin-bottom:5px; width: 140px;"></select>
         <input type="text" id="coordInput" placeholder="输入经纬度，如: 39.90, 116.40" style="width: 180px; padding: 5px; margin-right: 5px;">
         <button onclick="searchLocation()" style="padding: 5px 10px;">查询</button>
         <div id="resultPanel" style="margin-top: 10px; display: none; border-top: 1px solid #eee; padding-top: 10px;">
@@ -140,18 +138,28 @@ def create_search_html(hex_gdf, date_str):
             <div id="resultContent" style="margin-top: 5px;"></div>
         </div>
     </div>
-    <div id="gridInfo" style="position: fixed; top: 10px; right: 10px; z-index: 1000; background: white; padding: 10px; border-radius: 5px; box-shadow: 0 0 5px rgba(0,0,0,0.3); max-width: 300px;">
-        <h4 style="margin:0 0 10px 0;">网格信息{date_display}</h4>
-        <p>六边形数量: {len(hex_gdf)}</p>
-        <p>边长: 500米</p>
-        <p>排列方式: 蜂窝状错位</p>
-    </div>
+    <script src="{search_index}"></script>
     <script>
-    const hexDataDict = {json.dumps(hex_data_dict, ensure_ascii=False)};
-    let hexData = hexDataDict[Object.keys(hexDataDict)[0]];
-    document.getElementById('dateSelect').addEventListener('change', function() {{
-        const d = this.value;
-        hexData = hexDataDict[d] || [];
+    const searchIndex = window.HEX_SEARCH_INDEX || {{size: 0, hexes: {{lat: [], lng: [], row: [], col: []}}, days: {{}}}};
+    const searchDates = Object.keys(searchIndex.days).sort();
+    const dateSelect = document.getElementById('dateSelect');
+    searchDates.forEach(function(d) {{
+        const option = document.createElement('option');
+        option.value = d;
+        option.textContent = d;
+        dateSelect.appendChild(option);
+    }});
+    let searchDate = null;
+    function setSearchDate(d) {{
+        if (searchIndex.days[d]) {{
+            searchDate = d;
+            dateSelect.value = d;
+        }}
+    }}
+    setSearchDate(searchDates[0]);
+    setSearchDate({json.dumps(date_str)});
+    dateSelect.addEventListener('change', function() {{
+        searchDate = this.value;
     }});
     function haversineDistance(lat1, lng1, lat2, lng2) {{
         const R = 6371000;
@@ -163,17 +171,187 @@ def create_search_html(hex_gdf, date_str):
         const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
         return R * c;
     }}
+    // WGS84椭球的横轴墨卡托Krüger级数系数（与pyproj的EPSG:326xx一致到毫米级）
+    const tm = (function() {{
+        const a = 6378137.0, f = 1 / 298.257223563;
+        const n = f / (2 - f), n2 = n * n, n3 = n2 * n, n4 = n3 * n;
+        return {{
+            k0: 0.9996,
+            e: Math.sqrt(f * (2 - f)),
+            A: a / (1 + n) * (1 + n2 / 4 + n4 / 64),
+            alpha: [
+                n / 2 - 2 * n2 / 3 + 5 * n3 / 16 + 41 * n4 / 180,
+                13 * n2 / 48 - 3 * n3 / 5 + 557 * n4 / 1440,
+                61 * n3 / 240 - 103 * n4 / 140,
+                49561 * n4 / 161280
+            ],
+            beta: [
+                n / 2 - 2 * n2 / 3 + 37 * n3 / 96 - n4 / 360,
+                n2 / 48 + n3 / 15 - 437 * n4 / 1440,
+                17 * n3 / 480 - 37 * n4 / 840,
+                4397 * n4 / 161280
+            ],
+            delta: [
+                2 * n - 2 * n2 / 3 - 2 * n3 + 116 * n4 / 45,
+                7 * n2 / 3 - 8 * n3 / 5 - 227 * n4 / 45,
+                56 * n3 / 15 - 136 * n4 / 35,
+                4279 * n4 / 630
+            ]
+        }};
+    }})();
+    // WGS84经纬度转UTM坐标
+    function lonLatToUtm(lng, lat, zone) {{
+        const k0 = tm.k0, A = tm.A, alpha = tm.alpha, e = tm.e;
+        const phi = lat * Math.PI / 180;
+        const dLambda = (lng - (zone * 6 - 183)) * Math.PI / 180;
+        const sinPhi = Math.sin(phi);
+        const t = Math.sinh(Math.atanh(sinPhi) - e * Math.atanh(e * sinPhi));
+        const xiP = Math.atan2(t, Math.cos(dLambda));
+        const etaP = Math.atanh(Math.sin(dLambda) / Math.sqrt(1 + t * t));
+        let xi = xiP, eta = etaP;
+        for (let j = 1; j <= 4; j++) {{
+            xi += alpha[j - 1] * Math.sin(2 * j * xiP) * Math.cosh(2 * j * etaP);
+            eta += alpha[j - 1] * Math.cos(2 * j * xiP) * Math.sinh(2 * j * etaP);
+        }}
+        return [500000 + k0 * A * eta, k0 * A * xi];
+    }}
+    // UTM坐标转WGS84经纬度，返回 [lat, lng]
+    function utmToLatLon(x, y, zone) {{
+        const xi = y / (tm.k0 * tm.A), eta = (x - 500000) / (tm.k0 * tm.A);
+        let xiP = xi, etaP = eta;
+        for (let j = 1; j <= 4; j++) {{
+            xiP -= tm.beta[j - 1] * Math.sin(2 * j * xi) * Math.cosh(2 * j * eta);
+            etaP -= tm.beta[j - 1] * Math.cos(2 * j * xi) * Math.sinh(2 * j * eta);
+        }}
+        const chi = Math.asin(Math.sin(xiP) / Math.cosh(etaP));
+        let phi = chi;
+        for (let j = 1; j <= 4; j++) {{
+            phi += tm.delta[j - 1] * Math.sin(2 * j * chi);
+        }}
+        const lng = zone * 6 - 183 + Math.atan2(Math.sinh(etaP), Math.cos(xiP)) * 180 / Math.PI;
+        return [phi * 180 / Math.PI, lng];
+    }}
+    // 行列到记录序号的稠密表及记录序号到行列的反查表，首次查询时由按列压缩的行段展开
+    let cellTable = null, recordRow = null, recordCol = null;
+    function buildCellTable(lattice) {{
+        const table = new Int32Array(lattice.num_rows * lattice.num_cols).fill(-1);
+        recordRow = new Int32Array(searchIndex.size);
+        recordCol = new Int32Array(searchIndex.size);
+        searchIndex.columns.forEach(function(runs, col) {{
+            for (let k = 0; k < runs.length; k += 3) {{
+                for (let row = runs[k]; row < runs[k + 1]; row++) {{
+                    const record = runs[k + 2] + row - runs[k];
+                    table[row * lattice.num_cols + col] = record;
+                    recordRow[record] = row;
+                    recordCol[record] = col;
+                }}
+            }}
+        }});
+        return table;
+    }}
+    // 六边形中心和行列：json编码直接读取，compact编码由网格参数推算（奇数列下移半行）
+    let hexTableCache = null;
+    function hexTable() {{
+        if (searchIndex.hexes) return searchIndex.hexes;
+        if (!hexTableCache) {{
+            const lattice = searchIndex.lattice;
+            cellTable = cellTable || buildCellTable(lattice);
+            const size = lattice.hex_size;
+            const lat = new Float64Array(searchIndex.size), lng = new Float64Array(searchIndex.size);
+            for (let i = 0; i < searchIndex.size; i++) {{
+                const x = lattice.min_x + recordCol[i] * size * 1.5;
+                const y = lattice.min_y + recordRow[i] * size * Math.sqrt(3) + (recordCol[i] & 1) * size * Math.sqrt(3) / 2;
+                const p = utmToLatLon(x, y, lattice.utm_zone);
+                lat[i] = p[0];
+                lng[i] = p[1];
+            }}
+            hexTableCache = {{lat: lat, lng: lng, row: recordRow, col: recordCol}};
+        }}
+        return hexTableCache;
+    }}
+    // 每天的统计值：compact编码为稀疏变长编码，首次使用时解码
+    const dayCache = {{}};
+    function dayRecords(d) {{
+        const raw = searchIndex.days[d];
+        if (!raw || searchIndex.encoding !== 'compact') return raw;
+        if (!dayCache[d]) {{
+            const binary = atob(raw);
+            const star = new Uint8Array(searchIndex.size), maxLevel = new Uint8Array(searchIndex.size);
+            const count = new Uint32Array(searchIndex.size);
+            let pos = 0, index = -1;
+            function readVarint() {{
+                let value = 0, shift = 0, byte;
+                do {{
+                    byte = binary.charCodeAt(pos++);
+                    value += (byte & 0x7F) * Math.pow(2, shift);
+                    shift += 7;
+                }} while (byte >= 0x80);
+                return value;
+            }}
+            while (pos < binary.length) {{
+                index += readVarint() + 1;
+                const packed = binary.charCodeAt(pos++);
+                star[index] = packed & 0x0F;
+                maxLevel[index] = packed >> 4;
+                count[index] = readVarint();
+            }}
+            dayCache[d] = {{star: star, max_level: maxLevel, count: count}};
+        }}
+        return dayCache[d];
+    }}
+    // 用网格解析公式定位点所在的六边形（投影、轴坐标取整、查表），不在网格内时返回-1
+    function latticeHexIndex(lat, lng) {{
+        const lattice = searchIndex.lattice;
+        if (!lattice) return -1;
+        cellTable = cellTable || buildCellTable(lattice);
+        const p = lonLatToUtm(lng, lat, lattice.utm_zone);
+        const px = (p[0] - lattice.min_x) / lattice.hex_size;
+        const py = (p[1] - lattice.min_y) / lattice.hex_size;
+        const q = px * 2 / 3;
+        const r = -px / 3 + py * Math.sqrt(3) / 3;
+        const s = -q - r;
+        let rq = Math.round(q), rr = Math.round(r);
+        const rs = Math.round(s);
+        const dq = Math.abs(rq - q), dr = Math.abs(rr - r), ds = Math.abs(rs - s);
+        if (dq > dr && dq > ds) {{
+            rq = -rr - rs;
+        }} else if (dr > ds) {{
+            rr = -rq - rs;
+        }}
+        const col = rq;
+        const row = rr + (col - (col & 1)) / 2;
+        if (!(row >= 0 && row < lattice.num_rows && col >= 0 && col < lattice.num_cols)) return -1;
+        return cellTable[row * lattice.num_cols + col];
+    }}
     function findNearestHex(lat, lng) {{
+        const hexes = hexTable();
+        const day = dayRecords(searchDate);
         let minDist = Number.MAX_VALUE;
-        let nearestHex = null;
-        for (const hex of hexData) {{
-            const dist = haversineDistance(lat, lng, hex.lat, hex.lng);
-            if (dist < minDist) {{
-                minDist = dist;
-                nearestHex = hex;
+        let nearest = -1;
+        if (day) {{
+            nearest = latticeHexIndex(lat, lng);
+            if (nearest >= 0) {{
+                minDist = haversineDistance(lat, lng, hexes.lat[nearest], hexes.lng[nearest]);
+            }} else {{
+                // 网格外的点退回逐个比较距离，返回最近的六边形
+                for (let i = 0; i < hexes.lat.length; i++) {{
+                    const dist = haversineDistance(lat, lng, hexes.lat[i], hexes.lng[i]);
+                    if (dist < minDist) {{
+                        minDist = dist;
+                        nearest = i;
+                    }}
+                }}
             }}
         }}
-        return {{hex: nearestHex, distance: minDist}};
+        if (nearest < 0) {{
+            return {{hex: null, distance: minDist}};
+        }}
+        const hex = {{
+            lat: hexes.lat[nearest], lng: hexes.lng[nearest],
+            row: hexes.row[nearest], col: hexes.col[nearest],
+            star: day.star[nearest], max_level: day.max_level[nearest], count: day.count[nearest]
+        }};
+        return {{hex: hex, distance: minDist}};
     }}
     const starDescriptions = {{
         0: "无数据区域",
@@ -233,33 +411,31 @@ def create_search_html(hex_gdf, date_str):
     </style>
     '''
 
+def create_search_html(hex_gdf, date_str, search_index=SEARCH_INDEX_FILE):
+    """创建搜索框和网格信息HTML"""
+    # 日期显示
+    date_display = f" - {date_str}" if date_str else ""
+    
+    grid_info = f'''
+    <div id="gridInfo" style="position: fixed; top: 10px; right: 10px; z-index: 1000; background: white; padding: 10px; border-radius: 5px; box-shadow: 0 0 5px rgba(0,0,0,0.3); max-width: 300px;">
+        <h4 style="margin:0 0 10px 0;">网格信息{date_display}</h4>
+        <p>六边形数量: {len(hex_gdf)}</p>
+        <p>边长: 500米</p>
+        <p>排列方式: 蜂窝状错位</p>
+    </div>
+    '''
+    return search_panel_html(date_str, search_index) + grid_info
+
 def add_boundary_to_map(m, boundary_file, target_districts=None):
     """将边界添加到地图"""
     if target_districts is None:
         target_districts = ['海淀区', '朝阳区', '东城区', '西城区', '石景山区', '丰台区']
     
-    geo = load_geojson(boundary_file)
-    if not geo:
+    boundary = load_boundary(boundary_file, target_districts)
+    if not boundary:
         logger.warning("边界文件为空，跳过绘制")
         return
     
-    boundary_polygons = []
-    for feature in geo['features']:
-        district_name = feature['properties'].get('name', '')
-        if district_name not in target_districts:
-            continue
-            
-        geometry = feature['geometry']
-        if geometry['type'] == 'Polygon':
-            for ring in geometry['coordinates']:
-                ring_points = [[lat, lng] for lng, lat in ring]
-                boundary_polygons.append(ring_points)
-        elif geometry['type'] == 'MultiPolygon':
-            for polygon in geometry['coordinates']:
-                for ring in polygon:
-                    ring_points = [[lat, lng] for lng, lat in ring]
-                    boundary_polygons.append(ring_points)
-    
     # 区域颜色映射
     district_colors = {
         '海淀区': '#FF6B6B',
@@ -270,40 +446,41 @@ def add_boundary_to_map(m, boundary_file, target_districts=None):
         '丰台区': '#DDA0DD'
     }
     
-    # 分别绘制每个区的边界
-    for i, polygon_points in enumerate(boundary_polygons):
-        color = district_colors.get(target_districts[i], 'blue')
-        folium.PolyLine(
-            polygon_points,
-            color=color,
-            weight=3,
-            opacity=0.8,
-            fill=False,
-            tooltip=f'北京精准边界 - {target_districts[i]}'
-        ).add_to(m)
+    # 分别绘制每个区的边界（一个区可能有多个环，颜色和提示按区名确定）
+    for item in boundary.leaflet_rings:
+        district_name = item['district']
+        for ring_points in item['rings']:
+            folium.PolyLine(
+                ring_points,
+                color=district_colors.get(district_name, 'blue'),
+                weight=3,
+                opacity=0.8,
+                fill=False,
+                tooltip=f'北京精准边界 - {district_name}'
+            ).add_to(m)
 
-def add_hexagons_to_map(m, hex_gdf, colormap):
-    """添加六边形到地图"""
-    for idx, row in hex_gdf.iterrows():
+def add_hexagons_to_map(m, hex_gdf, colormap, grid=None):
+    """添加六边形到地图（顶点和中心直接读取数组，不逐行遍历GeoDataFrame）"""
+    # 六边形边界坐标 [lat, lng]
+    rings = hexagon_rings(hex_gdf, grid)[:, :, ::-1].tolist()
+    columns = zip(hex_gdf['hex_id'], hex_gdf['row'], hex_gdf['col'], hex_gdf['star_rating'], hex_gdf['count'],
+                  hex_gdf['center_lat'], hex_gdf['center_lng'])
+    for ring, (hex_id, row, col, star, count, center_lat, center_lng) in zip(rings, columns):
         try:
-            star = int(row['star_rating'])
+            star = int(star)
             color = colormap(star)
-            count = int(row['count'])
-            
-            # 获取六边形边界坐标
-            hex_boundary = list(row['geometry'].exterior.coords)
-            hex_boundary = [(y, x) for x, y in hex_boundary]
+            count = int(count)
+            hex_boundary = [tuple(point) for point in ring + ring[:1]]
             
             # 创建弹出窗口内容
-            center = row['geometry'].centroid
             popup_content = f"""
             <div style="width:250px;">
-                <h4>六边形区域 #{row['hex_id']}</h4>
+                <h4>六边形区域 #{int(hex_id)}</h4>
                 <hr>
-                <p><b>位置:</b> 行 {row['row']} 列 {row['col']}</p>
+                <p><b>位置:</b> 行 {int(row)} 列 {int(col)}</p>
                 <p><b>影响分类等级:</b> {star}星）</p>
                 <p><b>微博数量:</b> {count}</p>
-                <p><b>中心位置:</b> ({center.y:.6f}, {center.x:.6f})</p>
+                <p><b>中心位置:</b> ({center_lat:.6f}, {center_lng:.6f})</p>
             </div>
             """
             
@@ -320,5 +497,52 @@ def add_hexagons_to_map(m, hex_gdf, colormap):
             ).add_to(m)
             
         except Exception as e:
-            logger.warning(f"添加六边形 #{row['hex_id']} 时出错: {e}")
-            continue
\ No newline at end of file
+            logger.warning(f"添加六边形 #{hex_id} 时出错: {e}")
+            continue
+
+def hexagon_feature_collection(hex_gdf, precision=6, grid=None):
+    """
+    将六边形网格转换为GeoJSON FeatureCollection
+    属性只保留弹窗和样式所需的字段，坐标保留precision位小数（6位约0.1米）
+    提供网格时顶点从网格数组读取，hex_gdf只需包含属性列
+    """
+    vertices = np.round(hexagon_rings(hex_gdf, grid), precision)
+    # GeoJSON多边形需要闭合
+    rings = np.concatenate([vertices, vertices[:, :1]], axis=1).tolist()
+    centers = np.round(np.column_stack([hex_gdf['center_lat'], hex_gdf['center_lng']]), precision)
+
+    features = []
+    columns = zip(hex_gdf['hex_id'], hex_gdf['row'], hex_gdf['col'], hex_gdf['star_rating'], hex_gdf['count'])
+    for ring, (lat, lng), (hex_id, row, col, star, count) in zip(rings, centers, columns):
+        features.append({
+            'type': 'Feature',
+            'properties': {
+                'hex_id': int(hex_id),
+                'position': f"行 {int(row)} 列 {int(col)}",
+                'star': int(star),
+                'count': int(count),
+                'center': f"({lat:.6f}, {lng:.6f})"
+            },
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]}
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+def add_hexagons_geojson_to_map(m, hex_gdf, colormap, grid=None):
+    """以单个GeoJSON图层添加六边形，样式按星级共享，弹窗和提示使用同一模板"""
+    # 每个星级只计算一次颜色
+    star_styles = {
+        star: {'color': '#555555', 'weight': 1, 'fillColor': colormap(star), 'fillOpacity': 0.7}
+        for star in range(5)
+    }
+
+    folium.GeoJson(
+        hexagon_feature_collection(hex_gdf, grid=grid),
+        name='六边形区域',
+        style_function=lambda feature: star_styles[feature['properties']['star']],
+        tooltip=folium.GeoJsonTooltip(fields=['star'], aliases=['影响等级（星）:']),
+        popup=folium.GeoJsonPopup(
+            fields=['hex_id', 'position', 'star', 'count', 'center'],
+            aliases=['六边形区域 #', '位置:', '影响分类等级（星）:', '微博数量:', '中心位置:'],
+            max_width=300
+        )
+    ).add_to(m)
@@ -0,0 +1,166 @@
+import os
+import json
+import logging
+import numpy as np
+from .utils import safe_mkdir
+from .hexagon_grid import hexagon_rings
+from .map_generator import create_search_html, DEFAULT_AMAP_TILES, DEFAULT_AMAP_ATTR
+from .shared_map import LEAFLET_JS, LEAFLET_CSS, STAR_COLORS, DISTRICT_COLORS, boundary_json
+
+logger = logging.getLogger(__name__)
+
+# 每次写出的六边形数量，决定流式写入时的内存上限
+PAGE_CHUNK_SIZE = 5000
+
+# 地图渲染方式: folium（构建folium对象树后一次性渲染）或 template（按固定模板流式写入文件）
+MAP_RENDERERS = ('folium', 'template')
+
+def hex_rows(hex_gdf, precision=6, grid=None):
+    """
+    将六边形转换为页面中的紧凑行（按输入顺序逐个返回JSON字符串）
+    每行为 [hex_id, 行, 列, 星级, 数量, 中心纬度, 中心经度, 顶点纬度, 顶点经度, ...（6个顶点）]
+    提供网格时顶点从网格数组读取，hex_gdf只需包含属性列
+    """
+    # 交换为 [lat, lng]
+    rings = np.round(hexagon_rings(hex_gdf, grid)[:, :, ::-1], precision).reshape(len(hex_gdf), -1).tolist()
+    centers = np.round(np.column_stack([hex_gdf['center_lat'], hex_gdf['center_lng']]), precision).tolist()
+    ints = np.column_stack([hex_gdf['hex_id'], hex_gdf['row'], hex_gdf['col'],
+                            hex_gdf['star_rating'], hex_gdf['count']]).astype(np.int64).tolist()
+    for values, center, ring in zip(ints, centers, rings):
+        yield json.dumps(values + center + ring, separators=(',', ':'))
+
+def _page_head(center, zoom_start):
+    """页面头部：Leaflet引用和页面样式"""
+    return f'''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no"/>
+    <link rel="stylesheet" href="{LEAFLET_CSS}"/>
+    <script src="{LEAFLET_JS}"></script>
+    <style>
+        html, body {{width: 100%; height: 100%; margin: 0; padding: 0;}}
+        #map {{position: absolute; top: 0; bottom: 0; right: 0; left: 0;}}
+        .hex-legend {{background: white; padding: 6px 10px; border-radius: 5px; box-shadow: 0 0 5px rgba(0,0,0,0.3); font: 12px sans-serif;}}
+        .hex-legend .bar {{width: 400px; height: 10px; background: linear-gradient(to right, {', '.join(STAR_COLORS)});}}
+        .hex-legend .ticks {{display: flex; justify-content: space-between;}}
+    </style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+const map = L.map('map', {{center: {json.dumps(center)}, zoom: {zoom_start}}});
+</script>
+'''
+
+def _page_map_script(bounds, amap_tiles, amap_attr, boundary):
+    """底图、比例尺、图例和边界"""
+    return f'''<script>
+L.tileLayer({json.dumps(amap_tiles)}, {{attribution: {json.dumps(amap_attr, ensure_ascii=False)}, maxZoom: 18}}).addTo(map);
+L.control.scale().addTo(map);
+map.fitBounds({json.dumps(bounds)});
+
+const hexColors = {json.dumps(STAR_COLORS)};
+const legend = L.control({{position: 'topright'}});
+legend.onAdd = function() {{
+    const div = L.DomUtil.create('div', 'hex-legend');
+    div.innerHTML = '<div class="bar"></div><div class="ticks"><span>0</span><span>1</span><span>2</span><span>3</span><span>4</span></div>' +
+        '<div>影响程度（0-4星莫兰迪色系）</div>';
+    return div;
+}};
+legend.addTo(map);
+
+const districtColors = {json.dumps(DISTRICT_COLORS, ensure_ascii=False)};
+{boundary}.forEach(function(item) {{
+    item.rings.forEach(function(ring) {{
+        L.polyline(ring, {{color: districtColors[item.district] || 'blue', weight: 3, opacity: 0.8}})
+            .bindTooltip('北京精准边界 - ' + item.district).addTo(map);
+    }});
+}});
+</script>
+'''
+
+# 六边形图层：弹窗和提示在图层组上按需生成，不随每个六边形写入页面
+_HEX_LAYER_SCRIPT = '''<script>
+const hexLayer = L.featureGroup().addTo(map);
+hexData.forEach(function(h) {
+    const ring = [];
+    for (let k = 0; k < 6; k++) {
+        ring.push([h[7 + 2 * k], h[8 + 2 * k]]);
+    }
+    const polygon = L.polygon(ring, {color: '#555555', weight: 1, fillColor: hexColors[h[3]], fillOpacity: 0.7});
+    polygon.hex = h;
+    hexLayer.addLayer(polygon);
+});
+hexLayer.bindTooltip(function(layer) {
+    return '影响等级: ' + layer.hex[3] + '星';
+}, {sticky: true});
+hexLayer.bindPopup(function(layer) {
+    const h = layer.hex;
+    return '<div style="width:250px;"><h4>六边形区域 #' + h[0] + '</h4><hr>' +
+        '<p><b>位置:</b> 行 ' + h[1] + ' 列 ' + h[2] + '</p>' +
+        '<p><b>影响分类等级:</b> ' + h[3] + '星</p>' +
+        '<p><b>微博数量:</b> ' + h[4] + '</p>' +
+        '<p><b>中心位置:</b> (' + h[5].toFixed(6) + ', ' + h[6].toFixed(6) + ')</p></div>';
+}, {maxWidth: 300});
+</script>
+</body>
+</html>
+'''
+
+def write_influence_page(hex_gdf, output_path, boundary_file=None, date_str=None, amap_tiles=None,
+                         amap_attr=None, target_districts=None, chunk_size=PAGE_CHUNK_SIZE, grid=None):
+    """
+    按固定模板流式写出六边形影响力地图，不构建folium对象树
+    六边形顶点只按chunk_size分块计算并写入文件，不为整个网格构建顶点数组
+    grid: hex_gdf所属的网格，提供时顶点从网格数组读取（hex_gdf可以不含几何）
+    """
+    try:
+        if amap_tiles is None:
+            amap_tiles = DEFAULT_AMAP_TILES
+        if amap_attr is None:
+            amap_attr = DEFAULT_AMAP_ATTR
+        if target_districts is None:
+            target_districts = list(DISTRICT_COLORS)
+
+        # 中心点和缩放级别与folium渲染方式一致：范围取六边形中心的范围，再向外扩展半个六边形
+        # （按第一个六边形的顶点范围估计），不需要计算所有六边形的顶点
+        first = hexagon_rings(hex_gdf.iloc[:1], grid)[0]
+        pad_lng, pad_lat = (first.max(axis=0) - first.min(axis=0)) / 2
+        lngs = hex_gdf['center_lng'].to_numpy()
+        lats = hex_gdf['center_lat'].to_numpy()
+        bounds = [lngs.min() - pad_lng, lats.min() - pad_lat, lngs.max() + pad_lng, lats.max() + pad_lat]
+        center = [float((bounds[1] + bounds[3]) / 2), float((bounds[0] + bounds[2]) / 2)]
+        lat_diff = bounds[3] - bounds[1]
+        zoom_start = 11 if lat_diff < 0.3 else 10 if lat_diff < 0.6 else 9
+        fit_bounds = [[float(bounds[1]), float(bounds[0])], [float(bounds[3]), float(bounds[2])]]
+
+        if not safe_mkdir(os.path.dirname(output_path)):
+            output_path = os.path.join(os.getcwd(), os.path.basename(output_path))
+            logger.info(f"使用当前目录作为输出路径: {output_path}")
+
+        # 先写临时文件再替换，避免中断时留下不完整的页面
+        with open(output_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(_page_head(center, zoom_start))
+            f.write(create_search_html(hex_gdf, date_str))
+            f.write(_page_map_script(fit_bounds, amap_tiles, amap_attr,
+                                     boundary_json(boundary_file, target_districts)))
+
+            f.write('<script>\nconst hexData = [\n')
+            for start in range(0, len(hex_gdf), chunk_size):
+                chunk = hex_gdf.iloc[start:start + chunk_size]
+                if start:
+                    f.write(',\n')
+                f.write(',\n'.join(hex_rows(chunk, grid=grid)))
+            f.write('\n];\n</script>\n')
+            f.write(_HEX_LAYER_SCRIPT)
+        os.replace(output_path + '.tmp', output_path)
+
+        logger.info(f"地图已保存到: {output_path}")
+        return output_path
+
+    except Exception as e:
+        logger.error(f"生成地图时发生致命错误: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return None
@@ -0,0 +1,245 @@
+import os
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from .hexagon_grid import calculate_hexagon_influence
+from .aggregation import daily_hex_gdf
+from .map_generator import create_influence_map
+from .page_writer import write_influence_page
+from .manifest import day_fingerprint
+from .shared_map import write_day_values
+from .search_index import day_search_values
+
+logger = logging.getLogger(__name__)
+
+# 进程内共享的只读状态：grid、pyramid（多分辨率金字塔，可为None）、cube（立方体或稀疏部分汇总）或 df（逐日引擎）、
+# config、entries（上次构建清单）、full_rebuild
+# 并行时由进程池初始化函数每个工作进程设置一次，不随每个任务序列化
+_state = {}
+
+class RecordCollector(logging.Handler):
+    """收集工作进程中的日志记录，随结果返回主进程按日期顺序输出"""
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        # 提前格式化消息，避免日志参数和异常对象无法序列化
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+_collector = RecordCollector()
+
+def _init_worker(state, log_level):
+    """工作进程初始化：保存共享状态，日志改为收集后返回主进程"""
+    _state.clear()
+    _state.update(state)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_collector)
+    root.setLevel(log_level)
+
+def _process_date_collected(date):
+    """在工作进程中处理一天，返回 (结果, 该任务产生的日志记录)"""
+    _collector.records = []
+    result = process_date(date)
+    return result, _collector.records
+
+def aggregate_date(date):
+    """计算某一天的六边形统计，返回 (日期字符串, hex_gdf)，失败时hex_gdf为None"""
+    grid = _state['grid']
+    config = _state['config']
+    date_str = date.strftime("%Y-%m-%d")
+    logger.info(f"处理日期 {date_str} 的数据...")
+
+    if _state.get('cube') is not None:
+        hex_gdf = daily_hex_gdf(grid, _state['cube'], date)
+    else:
+        # 筛选当天的数据
+        df = _state['df']
+        day_df = df[df['日期'] == date]
+        logger.info(f"日期 {date_str} 有 {len(day_df)} 条数据")
+
+        # 使用六边形网格计算影响
+        hex_gdf = calculate_hexagon_influence(
+            day_df,
+            hex_size_meters=config['hex_size'],
+            boundary_file=config['boundary_file'],
+            target_districts=config['target_districts'],
+            grid=grid,
+            assign_method=config['assign_method']
+        )
+
+    if hex_gdf is None:
+        logger.error(f"日期 {date_str} 的六边形网格计算失败")
+    return date_str, hex_gdf
+
+def reused_entry(date_str, fingerprint):
+    """内容未变化时返回上次的清单记录，需要重新生成时返回None"""
+    previous = _state['entries'].get(date_str)
+    if not _state['full_rebuild'] and previous and previous.get('fingerprint') == fingerprint:
+        logger.info(f"日期 {date_str} 的数据未变化，复用已有地图")
+        return previous
+    return None
+
+def render_date(date_str, hex_gdf, fingerprint):
+    """生成某一天的地图（或共享模式下的数值数组），返回清单记录，失败时返回None"""
+    config = _state['config']
+
+    # 共享几何模式：只写当天的数值数组
+    if config.get('output_mode') == 'shared':
+        day_file = write_day_values(config['output_dir'], date_str, hex_gdf, pyramid=_state.get('pyramid'))
+        if not day_file:
+            return None
+        logger.info(f"日期 {date_str} 的数值数组已生成")
+        return {'fingerprint': fingerprint, 'map_file': day_file}
+
+    # 生成当天地图
+    map_filename = f"beijing_hexagon_honeycomb_map_{date_str}.html"
+    if config.get('renderer') == 'template':
+        map_file = write_influence_page(
+            hex_gdf,
+            os.path.join(config['output_dir'], map_filename),
+            boundary_file=config['boundary_file'],
+            date_str=date_str,
+            amap_tiles=config['amap_tiles'],
+            amap_attr=config.get('amap_attr'),
+            target_districts=config['target_districts'],
+            grid=_state['grid']
+        )
+    else:
+        map_file = create_influence_map(
+            hex_gdf,
+            os.path.join(config['output_dir'], map_filename),
+            boundary_file=config['boundary_file'],
+            date_str=date_str,
+            amap_tiles=config['amap_tiles'],
+            amap_attr=config.get('amap_attr'),
+            hex_render=config.get('hex_render', 'geojson'),
+            grid=_state['grid']
+        )
+    if not map_file:
+        return None
+
+    logger.info(f"日期 {date_str} 的地图已生成")
+    return {'fingerprint': fingerprint, 'map_file': map_filename}
+
+def process_date(date):
+    """
+    计算某一天的六边形统计并生成地图
+    返回 (日期字符串, 清单记录, 是否重新生成, 查询索引数据)；
+    内容未变化时复用上次的清单记录，失败时清单记录和查询索引数据为None
+    """
+    date_str, hex_gdf = aggregate_date(date)
+    if hex_gdf is None:
+        return date_str, None, False, None
+
+    fingerprint = day_fingerprint(hex_gdf)
+    search_values = day_search_values(hex_gdf)
+    previous = reused_entry(date_str, fingerprint)
+    if previous:
+        return date_str, previous, False, search_values
+
+    entry = render_date(date_str, hex_gdf, fingerprint)
+    if entry is None:
+        return date_str, None, False, None
+    return date_str, entry, True, search_values
+
+def _render_date_collected(date_str, stats, fingerprint):
+    """
+    在渲染进程中生成某一天的地图，返回 (清单记录, 该任务产生的日志记录)
+    只传递当天的统计列，几何使用进程初始化时传入的网格
+    """
+    _collector.records = []
+    hex_gdf = _state['grid'].attribute_frame()
+    for col, values in stats.items():
+        hex_gdf[col] = values
+    entry = render_date(date_str, hex_gdf, fingerprint)
+    return entry, _collector.records
+
+def _finish_render(item):
+    """等待排队中的渲染任务完成，输出其日志并返回 process_date 格式的结果"""
+    date_str, future, search_values = item
+    entry, records = future.result()
+    for record in records:
+        logging.getLogger(record.name).handle(record)
+    if entry is None:
+        return date_str, None, False, None
+    return date_str, entry, True, search_values
+
+def run_staged(dates, state, render_workers, render_queue=None, log_level=logging.INFO):
+    """
+    统计与渲染分为两个阶段：主进程逐日计算统计，需要重新生成的日期交给渲染进程池
+    排队中的渲染任务最多render_queue个（默认为渲染进程数的2倍），队列满时等待最早的任务完成，
+    计算后一天的统计与前几天的渲染同时进行；结果按日期顺序返回
+    """
+    _state.clear()
+    _state.update(state)
+    render_queue = render_queue or 2 * render_workers
+    # 渲染进程只需要网格、金字塔和配置
+    render_state = {'grid': state['grid'], 'pyramid': state.get('pyramid'), 'config': state['config']}
+    # 网格自带的属性列，不随统计传递（不能读取hex_gdf.columns，否则会在主进程构建全部六边形几何）
+    grid_columns = set(state['grid'].attribute_frame().columns)
+
+    logger.info(f"使用 {render_workers} 个渲染进程，渲染队列长度 {render_queue}")
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=render_workers, initializer=_init_worker,
+                             initargs=(render_state, log_level)) as executor:
+        for date in dates:
+            date_str, hex_gdf = aggregate_date(date)
+            if hex_gdf is None:
+                pending.append((date_str, None, False, None))
+            else:
+                fingerprint = day_fingerprint(hex_gdf)
+                search_values = day_search_values(hex_gdf)
+                previous = reused_entry(date_str, fingerprint)
+                if previous:
+                    pending.append((date_str, previous, False, search_values))
+                else:
+                    stats = {col: hex_gdf[col].to_numpy() for col in hex_gdf.columns
+                             if col not in grid_columns}
+                    future = executor.submit(_render_date_collected, date_str, stats, fingerprint)
+                    pending.append((date_str, future, search_values))
+
+            # 队列满时按日期顺序等待最早的任务，保持结果顺序
+            while sum(isinstance(item[1], Future) for item in pending) >= render_queue:
+                item = pending.popleft()
+                yield _finish_render(item) if isinstance(item[1], Future) else item
+            while pending and not isinstance(pending[0][1], Future):
+                yield pending.popleft()
+
+        while pending:
+            item = pending.popleft()
+            yield _finish_render(item) if isinstance(item[1], Future) else item
+
+def run_dates(dates, state, workers=1, log_level=logging.INFO, render_workers=0, render_queue=None):
+    """
+    按日期顺序逐个返回 process_date 的结果
+    workers > 1 时在进程池中并行处理，工作进程的日志按日期顺序在主进程中输出，
+    与串行运行的日志顺序和输出文件一致
+    render_workers > 0 时统计与渲染分阶段流水线执行（见run_staged），不再使用workers
+    """
+    if render_workers > 0 and dates:
+        yield from run_staged(dates, state, render_workers, render_queue, log_level)
+        return
+
+    workers = min(workers, len(dates))
+    if workers <= 1:
+        _state.clear()
+        _state.update(state)
+        for date in dates:
+            yield process_date(date)
+        return
+
+    logger.info(f"使用 {workers} 个进程并行处理 {len(dates)} 天的数据")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(state, log_level)) as executor:
+        for result, records in executor.map(_process_date_collected, dates):
+            for record in records:
+                logging.getLogger(record.name).handle(record)
+            yield result
@@ -0,0 +1,132 @@
+import os
+import re
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+from datetime import date as date_type
+from .data_loader import read_weibo_excel, iter_weibo_chunks, STREAMING_EXTENSIONS
+from .utils import safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+# 分区内存储的列（日期由分区目录名给出，不重复存储）
+STORE_COLUMNS = ['经度', '纬度', '影响分类', '发布时间', '小时']
+
+PARTITION_PATTERN = re.compile(r'^date=(\d{4}-\d{2}-\d{2})$')
+
+def partition_dir(store_dir, date):
+    """返回某一天的分区目录"""
+    return os.path.join(store_dir, f"date={date.strftime('%Y-%m-%d')}")
+
+def list_store_dates(store_dir):
+    """列出存储中所有分区的日期字符串（已排序）"""
+    if not os.path.isdir(store_dir):
+        return []
+    dates = []
+    for name in os.listdir(store_dir):
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            dates.append(match.group(1))
+    return sorted(dates)
+
+class PostStoreWriter:
+    """
+    按天分区写入微博数据，每天一个目录、可包含多个Parquet分片
+    同一次写入中第一次遇到某天时会替换该天已有的分区
+    """
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        # 本次写入涉及的日期 -> 已写入分片数
+        self.parts = {}
+        safe_mkdir(store_dir)
+
+    def write(self, df):
+        """写入一批清洗后的数据（需包含日期列）"""
+        for date, day_df in df.groupby('日期', sort=True, observed=True):
+            path = partition_dir(self.store_dir, date)
+            part = self.parts.get(date, 0)
+            if part == 0 and os.path.isdir(path):
+                shutil.rmtree(path)
+            safe_mkdir(path)
+            part_file = os.path.join(path, f"part-{part:05d}.parquet")
+            day_df[STORE_COLUMNS].to_parquet(part_file + '.tmp', index=False)
+            os.replace(part_file + '.tmp', part_file)
+            self.parts[date] = part + 1
+
+def build_post_store(input_file, store_dir, chunk_size=200000):
+    """将Excel/CSV/JSONL输入导入按天分区的存储，返回写入的日期数，失败时返回None"""
+    writer = PostStoreWriter(store_dir)
+    if os.path.splitext(input_file)[1].lower() in STREAMING_EXTENSIONS:
+        try:
+            for chunk in iter_weibo_chunks(input_file, chunk_size):
+                writer.write(chunk)
+        except ValueError as e:
+            logger.error(f"读取输入文件失败: {e}")
+            return None
+    else:
+        df = read_weibo_excel(input_file)
+        if df is None:
+            return None
+        writer.write(df)
+    logger.info(f"已导入 {len(writer.parts)} 天的数据到分区存储: {store_dir}")
+    return len(writer.parts)
+
+def store_dates_in_range(store_dir, start_date=None, end_date=None):
+    """存储中指定日期范围内的分区日期字符串（已排序）"""
+    start = pd.to_datetime(start_date).strftime('%Y-%m-%d') if start_date else None
+    end = pd.to_datetime(end_date).strftime('%Y-%m-%d') if end_date else None
+    return [d for d in list_store_dates(store_dir)
+            if (start is None or d >= start) and (end is None or d <= end)]
+
+def iter_post_store(store_dir, start_date=None, end_date=None, columns=None):
+    """
+    逐个分片读取分区存储中指定日期范围的数据，每个分片附加日期列后产出
+    用于数据量超过内存时的分块汇总，内存占用只与单个分片的大小有关
+    """
+    dates = store_dates_in_range(store_dir, start_date, end_date)
+    if not dates:
+        logger.error(f"分区存储中没有符合日期范围的数据: {store_dir}")
+        return
+
+    file_columns = [col for col in (columns or STORE_COLUMNS) if col in STORE_COLUMNS]
+    for date_str in dates:
+        path = os.path.join(store_dir, f"date={date_str}")
+        for part_file in sorted(os.listdir(path)):
+            if not part_file.endswith('.parquet'):
+                continue
+            part = pd.read_parquet(os.path.join(path, part_file), columns=file_columns)
+            part['日期'] = date_type.fromisoformat(date_str)
+            yield part[columns] if columns is not None else part
+
+def read_post_store(store_dir, start_date=None, end_date=None, columns=None):
+    """
+    读取分区存储中指定日期范围的数据，只打开范围内的分区
+    日期列为有序分类类型；存储为空或不存在时返回None
+    """
+    dates = store_dates_in_range(store_dir, start_date, end_date)
+    if not dates:
+        logger.error(f"分区存储中没有符合日期范围的数据: {store_dir}")
+        return None
+
+    file_columns = [col for col in (columns or STORE_COLUMNS) if col in STORE_COLUMNS]
+    frames = []
+    day_codes = []
+    for code, date_str in enumerate(dates):
+        path = os.path.join(store_dir, f"date={date_str}")
+        for part_file in sorted(os.listdir(path)):
+            if not part_file.endswith('.parquet'):
+                continue
+            part = pd.read_parquet(os.path.join(path, part_file), columns=file_columns)
+            frames.append(part)
+            day_codes.append(np.full(len(part), code, dtype=np.int32))
+    df = pd.concat(frames, ignore_index=True)
+    codes = np.concatenate(day_codes)
+
+    # 日期由分区名得到，直接以分类编码构造
+    categories = [date_type.fromisoformat(d) for d in dates]
+    df['日期'] = pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories, ordered=True))
+    if columns is not None:
+        df = df[columns]
+    logger.info(f"从分区存储读取 {len(dates)} 天、{len(df)} 条数据")
+    return df
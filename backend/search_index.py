@@ -0,0 +1,179 @@
+import os
+import json
+import base64
+import logging
+import numpy as np
+from .utils import safe_mkdir
+
+logger = logging.getLogger(__name__)
+
+# 每次运行只写一个查询索引，所有页面通过<script>标签引用（file://协议下fetch不可用）
+SEARCH_INDEX_FILE = 'search_index.js'
+SEARCH_INDEX_PREFIX = 'window.HEX_SEARCH_INDEX = '
+
+# 网格所在的UTM投影带（EPSG:32650，北半球）
+UTM_ZONE = 50
+
+# 紧凑编码中星级和最高等级各占半个字节
+PACKED_FIELD_MAX = 0x0F
+
+def lattice_params(grid):
+    """网格的解析参数，页面据此把经纬度直接换算到所在六边形"""
+    lattice = grid.lattice
+    return {
+        'min_x': float(lattice['min_x']),
+        'min_y': float(lattice['min_y']),
+        'hex_size': float(grid.hex_size_meters),
+        'num_rows': int(lattice['num_rows']),
+        'num_cols': int(lattice['num_cols']),
+        'utm_zone': UTM_ZONE
+    }
+
+def column_runs(grid):
+    """
+    行列到记录序号的索引，按列压缩为连续行段 [起始行, 结束行(不含), 起始序号, ...]
+    hex_id按列优先编号，同一列内连续的行对应连续的序号；页面加载时展开为稠密表
+    """
+    runs = []
+    for col in range(grid.lattice['num_cols']):
+        ids = grid.index_table[:, col]
+        rows = np.flatnonzero(ids >= 0)
+        col_runs = []
+        if len(rows):
+            # 行号或序号不连续处断开
+            breaks = np.flatnonzero((np.diff(rows) != 1) | (np.diff(ids[rows]) != 1)) + 1
+            for segment in np.split(rows, breaks):
+                col_runs.extend([int(segment[0]), int(segment[-1]) + 1, int(ids[segment[0]])])
+        runs.append(col_runs)
+    return runs
+
+def day_search_values(hex_gdf):
+    """提取某一天查询所需的统计值（按hex_id顺序）"""
+    return {
+        'star': hex_gdf['star_rating'].astype(int).tolist(),
+        'max_level': np.nan_to_num(hex_gdf['max_level'].to_numpy(dtype=np.float64), nan=0).astype(int).tolist(),
+        'count': hex_gdf['count'].astype(int).tolist()
+    }
+
+def encode_varints(values):
+    """无符号整数的LEB128变长编码（每字节7位，高位为续位标志）"""
+    out = bytearray()
+    for value in values:
+        value = int(value)
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return out
+
+def encode_day_compact(values):
+    """
+    将某一天的查询数据编码为紧凑的稀疏格式（base64）
+    只记录星级、最高等级或数量不为0的六边形，每条记录依次为：
+    与上一条记录的序号间隔（变长整数）、星级|最高等级<<4（1字节）、数量（变长整数）
+    星级和最高等级超出0-15时截断到该范围并记录警告
+    """
+    star = np.array(values['star'], dtype=np.int64)
+    max_level = np.array(values['max_level'], dtype=np.int64)
+    count = np.asarray(values['count'], dtype=np.int64)
+    for name, field in (('星级', star), ('最高等级', max_level)):
+        out_of_range = int(np.count_nonzero((field < 0) | (field > PACKED_FIELD_MAX)))
+        if out_of_range:
+            logger.warning(f"{out_of_range} 个六边形的{name}超出紧凑编码范围 0-{PACKED_FIELD_MAX}，已截断")
+            np.clip(field, 0, PACKED_FIELD_MAX, out=field)
+    packed = star | (max_level << 4)
+    records = np.flatnonzero((packed != 0) | (count != 0))
+    gaps = np.diff(records, prepend=-1) - 1
+
+    out = bytearray()
+    for gap, value, cnt in zip(gaps, packed[records], count[records]):
+        out += encode_varints([gap])
+        out.append(int(value))
+        out += encode_varints([cnt])
+    return base64.b64encode(bytes(out)).decode('ascii')
+
+def decode_day_compact(encoded, size):
+    """encode_day_compact的逆过程，返回与day_search_values相同结构的字典"""
+    data = base64.b64decode(encoded)
+    star = [0] * size
+    max_level = [0] * size
+    count = [0] * size
+
+    def read_varint(pos):
+        value, shift = 0, 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                return value, pos
+
+    pos, index = 0, -1
+    while pos < len(data):
+        gap, pos = read_varint(pos)
+        index += gap + 1
+        star[index] = data[pos] & 0x0F
+        max_level[index] = data[pos] >> 4
+        count[index], pos = read_varint(pos + 1)
+    return {'star': star, 'max_level': max_level, 'count': count}
+
+def load_search_index(output_dir):
+    """读取输出目录中已有的查询索引，不存在或损坏时返回None"""
+    path = os.path.join(output_dir, SEARCH_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+        return json.loads(content[len(SEARCH_INDEX_PREFIX):].rstrip(';'))
+    except Exception as e:
+        logger.warning(f"已有查询索引读取失败: {e}")
+        return None
+
+def write_search_index(output_dir, grid, day_values, keep_dates=(), encoding='compact'):
+    """
+    写入本次运行的查询索引：网格参数和行列索引只存一份，每天只存星级、最高等级和数量
+    encoding: compact（默认）不存六边形中心和行列（页面由网格参数推算），每天的数据为稀疏变长编码；
+              json 每个六边形的中心、行列和每天的统计值均为明文数组
+    day_values: {日期字符串: day_search_values结果}
+    keep_dates: 本次输入之外、仍保留在构建清单中的日期，其数据从已有索引中沿用
+    """
+    try:
+        index = {
+            'encoding': encoding,
+            'size': len(grid),
+            'lattice': lattice_params(grid),
+            'columns': column_runs(grid)
+        }
+        if encoding == 'compact':
+            encoded = {date_str: encode_day_compact(values) for date_str, values in day_values.items()}
+        else:
+            index['hexes'] = {
+                'lat': np.round(grid.centers[:, 1], 6).tolist(),
+                'lng': np.round(grid.centers[:, 0], 6).tolist(),
+                'row': grid.rows.tolist(),
+                'col': grid.cols.tolist()
+            }
+            encoded = dict(day_values)
+
+        # 网格和编码方式都不变时才沿用已有索引中的日期
+        days = {}
+        previous = load_search_index(output_dir) if keep_dates else None
+        if previous and all(previous.get(key) == index[key] for key in ('encoding', 'lattice', 'columns')):
+            for date_str in keep_dates:
+                if date_str in previous.get('days', {}) and date_str not in encoded:
+                    days[date_str] = previous['days'][date_str]
+        days.update(encoded)
+        index['days'] = {date_str: days[date_str] for date_str in sorted(days)}
+
+        safe_mkdir(output_dir)
+        path = os.path.join(output_dir, SEARCH_INDEX_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(SEARCH_INDEX_PREFIX + json.dumps(index, separators=(',', ':')) + ';\n')
+        os.replace(path + '.tmp', path)
+        logger.info(f"查询索引已保存到: {path}（{len(days)} 天）")
+        return path
+    except Exception as e:
+        logger.error(f"写入查询索引失败: {e}")
+        return None
@@ -0,0 +1,390 @@
+import os
+import json
+import math
+import base64
+import logging
+import numpy as np
+from .utils import safe_mkdir
+from .map_generator import search_panel_html
+from .boundary import load_boundary
+from .aggregation import roll_up_levels, CUBE_DTYPES
+
+logger = logging.getLogger(__name__)
+
+# 共享几何资源与每日数值文件（通过<script>标签加载，file://协议下fetch不可用）
+GEOMETRY_ASSET = 'hex_geometry.js'
+DAY_VALUES_DIR = 'days'
+
+LEAFLET_JS = 'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js'
+LEAFLET_CSS = 'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css'
+
+# 星级颜色（莫兰迪色系，与地图图例一致）
+STAR_COLORS = ['#E0E0E0', '#8CA6DB', '#E6C27A', '#D99058', '#D9534F']
+
+# 金字塔各层六边形在屏幕上的最小边长（像素）：每个缩放级别显示满足该条件的最细一层，
+# 视野内的六边形数量因此不超过屏幕面积与该尺寸六边形面积之比
+MIN_HEX_PIXELS = 8
+
+DISTRICT_COLORS = {
+    '海淀区': '#FF6B6B',
+    '朝阳区': '#4ECDC4',
+    '东城区': '#45B7D1',
+    '西城区': '#96CEB4',
+    '石景山区': '#FFEAA7',
+    '丰台区': '#DDA0DD'
+}
+
+def _write_if_changed(path, content):
+    """内容变化时才写入文件（保持未变化资源的修改时间，便于浏览器缓存）"""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+    return True
+
+def boundary_json(boundary_file, target_districts):
+    """
+    目标区域边界环的JSON（预先序列化），结构为 [{'district': 区名, 'rings': [[[lat, lng], ...], ...]}, ...]
+    没有边界时为空数组
+    """
+    boundary = load_boundary(boundary_file, target_districts) if target_districts else None
+    return boundary.leaflet_json if boundary else '[]'
+
+def level_min_zooms(hex_sizes, lat):
+    """
+    金字塔各层（由细到粗）开始显示的Leaflet缩放级别
+    每层从边长不小于MIN_HEX_PIXELS像素的缩放级别开始显示，最粗层从0级开始
+    """
+    # 0级时每像素对应的地面距离（Web墨卡托，随纬度缩小）
+    meters_per_pixel = 156543.03392 * math.cos(math.radians(lat))
+    zooms = [max(0, math.ceil(math.log2(meters_per_pixel * MIN_HEX_PIXELS / size))) for size in hex_sizes]
+    zooms[-1] = 0
+    return zooms
+
+def level_geometry(grid, min_zoom):
+    """一层网格的几何，顶点按hex_id顺序展平为 [lat, lng] * 6，与每日数值数组一一对应"""
+    # 交换为 [lat, lng]
+    rings = np.round(grid.vertices()[:, :, ::-1], 6)
+    centers = np.round(grid.centers[:, ::-1], 6)
+    return {
+        'hex_size': grid.hex_size_meters,
+        'min_zoom': min_zoom,
+        'hex_id': list(range(len(grid))),
+        'row': grid.rows.tolist(),
+        'col': grid.cols.tolist(),
+        'center': centers.ravel().tolist(),
+        'rings': rings.ravel().tolist()
+    }
+
+def write_geometry_asset(grid, output_dir, boundary_file=None, target_districts=None, pyramid=None):
+    """
+    将六边形几何写入共享的静态资源（与日期无关，只写一次）
+    提供金字塔时写入各层（由细到粗）的几何及其开始显示的缩放级别，否则只有grid一层
+    """
+    try:
+        grids = pyramid.grids if pyramid else [grid]
+        min_lng, min_lat, max_lng, max_lat = grid.bounds
+        zooms = level_min_zooms([g.hex_size_meters for g in grids], (min_lat + max_lat) / 2)
+        geometry = {
+            'levels': [level_geometry(g, zoom) for g, zoom in zip(grids, zooms)],
+            'bounds': [[float(min_lat), float(min_lng)], [float(max_lat), float(max_lng)]]
+        }
+        content = (f"window.HEX_GEOMETRY = {json.dumps(geometry, separators=(',', ':'))};\n"
+                   f"window.BOUNDARY = {boundary_json(boundary_file, target_districts)};\n")
+
+        safe_mkdir(output_dir)
+        path = os.path.join(output_dir, GEOMETRY_ASSET)
+        if _write_if_changed(path, content):
+            logger.info(f"六边形几何资源已保存到: {path}")
+        return GEOMETRY_ASSET
+    except Exception as e:
+        logger.error(f"写入六边形几何资源失败: {e}")
+        return None
+
+def encode_day_values(stars, counts):
+    """将当天的星级和数量编码为紧凑的二进制数组（base64），数量按最大值选择1/2/4字节"""
+    counts = np.asarray(counts)
+    max_count = int(counts.max()) if len(counts) else 0
+    count_bytes = 1 if max_count < 1 << 8 else 2 if max_count < 1 << 16 else 4
+    count_dtype = {1: '<u1', 2: '<u2', 4: '<u4'}[count_bytes]
+    return {
+        'stars': base64.b64encode(np.asarray(stars, dtype='<u1').tobytes()).decode('ascii'),
+        'counts': base64.b64encode(counts.astype(count_dtype).tobytes()).decode('ascii'),
+        'count_bytes': count_bytes
+    }
+
+def write_day_values(output_dir, date_str, hex_gdf, pyramid=None):
+    """
+    写入某一天的数值文件，返回相对输出目录的路径，失败时返回None
+    提供金字塔时各粗层的统计由hex_gdf（最细层）自下而上汇总
+    """
+    try:
+        if pyramid:
+            stats = {col: hex_gdf[col].to_numpy() for col in CUBE_DTYPES}
+            levels = roll_up_levels(stats, pyramid)
+        else:
+            levels = [{'star_rating': hex_gdf['star_rating'].to_numpy(), 'count': hex_gdf['count'].to_numpy()}]
+        values = {'levels': [encode_day_values(level['star_rating'], level['count']) for level in levels]}
+        relative = f"{DAY_VALUES_DIR}/hex_values_{date_str}.js"
+        safe_mkdir(os.path.join(output_dir, DAY_VALUES_DIR))
+        content = f"HEX_DAYS[{json.dumps(date_str)}] = {json.dumps(values, separators=(',', ':'))};\n"
+        _write_if_changed(os.path.join(output_dir, relative), content)
+        return relative
+    except Exception as e:
+        logger.error(f"写入日期 {date_str} 的数值文件失败: {e}")
+        return None
+
+def create_shared_slider_map(day_files, output_dir, amap_tiles, amap_attr='高德地图'):
+    """
+    创建单页时间滑块地图：几何只加载一次，拖动滑块时按当天数组重新着色
+    day_files: {日期字符串: 相对输出目录的数值文件路径}
+    """
+    try:
+        sorted_dates = sorted(day_files.keys())
+        day_scripts = '\n'.join(f'<script src="{day_files[d]}"></script>' for d in sorted_dates)
+        legend_items = ''.join(
+            f'<div><span style="display:inline-block;width:14px;height:14px;background:{color};'
+            f'margin-right:6px;vertical-align:middle;"></span>{star}星</div>'
+            for star, color in enumerate(STAR_COLORS)
+        )
+
+        html_content = f'''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>北京微博影响度时间轴</title>
+    <link rel="stylesheet" href="{LEAFLET_CSS}"/>
+    <script src="{LEAFLET_JS}"></script>
+    <style>
+        body,html{{margin:0;height:100%;overflow:hidden;}}
+        #map{{width:100%;height:100%;}}
+        #timeSlider{{position:fixed;bottom:20px;left:50%;transform:translateX(-50%);
+                     background:white;padding:15px;border-radius:5px;
+                     box-shadow:0 0 10px rgba(0,0,0,0.3);width:80%;max-width:600px;z-index:9999;}}
+        #legend,#gridInfo{{position:fixed;z-index:1000;background:white;padding:10px;border-radius:5px;
+                           box-shadow:0 0 5px rgba(0,0,0,0.3);}}
+        #legend{{bottom:160px;right:10px;}}
+        #gridInfo{{top:10px;right:10px;max-width:300px;}}
+        button{{padding:6px 12px;margin:0 5px;cursor:pointer}}
+        input[type=range]{{width:100%}}
+    </style>
+</head>
+<body>
+<div id="map"></div>
+
+{search_panel_html()}
+<div id="gridInfo">
+  <h4 style="margin:0 0 10px 0;">网格信息 - <span id="gridDate">{sorted_dates[0]}</span></h4>
+  <p>六边形数量: <span id="hexCount"></span></p>
+  <p>边长: <span id="hexSize"></span>米</p>
+  <p>排列方式: 蜂窝状错位</p>
+</div>
+
+<div id="legend">
+  <h4 style="margin:0 0 6px 0;">影响程度</h4>
+  {legend_items}
+</div>
+
+<div id="timeSlider">
+  <h4 style="margin:0 0 10px 0;text-align:center;">时间轴 - 选择日期查看影响分布</h4>
+  <div style="display:flex;align-items:center;justify-content:space-between;">
+    <button onclick="changeDate(-1)">前一天</button>
+    <div style="flex-grow:1;margin:0 15px;">
+      <input type="range" id="dateSlider" min="0" max="{len(sorted_dates)-1}" value="0" step="1"
+             oninput="updateDateDisplay()">
+      <div id="dateDisplay" style="text-align:center;font-weight:bold;">{sorted_dates[0]}</div>
+    </div>
+    <button onclick="changeDate(1)">后一天</button>
+  </div>
+  <div style="text-align:center;margin-top:10px;">
+    <button onclick="playAnimation()" style="background:#28a745;color:white;border:none;border-radius:4px;">播放动画</button>
+    <button onclick="stopAnimation()" style="background:#dc3545;color:white;border:none;border-radius:4px;">停止动画</button>
+  </div>
+</div>
+
+<script>window.HEX_DAYS = {{}};</script>
+<script src="{GEOMETRY_ASSET}"></script>
+{day_scripts}
+<script>
+const sortedDates = {json.dumps(sorted_dates)};
+const hexColors = {json.dumps(STAR_COLORS)};
+const districtColors = {json.dumps(DISTRICT_COLORS, ensure_ascii=False)};
+const geometry = window.HEX_GEOMETRY;
+let current = 0;
+let timer = null;
+
+function decodeArray(b64, bytes) {{
+    const binary = atob(b64);
+    const buffer = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) buffer[i] = binary.charCodeAt(i);
+    if (bytes === 2) return new Uint16Array(buffer.buffer);
+    if (bytes === 4) return new Uint32Array(buffer.buffer);
+    return buffer;
+}}
+
+// 每天每层的数组只解码一次，切换日期或缩放级别时直接使用
+const days = {{}};
+function dayValues(date, level) {{
+    const key = date + '/' + level;
+    if (!days[key]) {{
+        const raw = window.HEX_DAYS[date].levels[level];
+        days[key] = {{stars: decodeArray(raw.stars, 1), counts: decodeArray(raw.counts, raw.count_bytes)}};
+    }}
+    return days[key];
+}}
+
+const map = L.map('map', {{preferCanvas: true}}).fitBounds(geometry.bounds);
+L.tileLayer({json.dumps(amap_tiles)}, {{attribution: {json.dumps(amap_attr, ensure_ascii=False)}, maxZoom: 18}}).addTo(map);
+L.control.scale().addTo(map);
+
+window.BOUNDARY.forEach(function(item) {{
+    item.rings.forEach(function(ring) {{
+        L.polyline(ring, {{color: districtColors[item.district] || 'blue', weight: 3, opacity: 0.8}})
+            .bindTooltip('北京精准边界 - ' + item.district).addTo(map);
+    }});
+}});
+
+// 金字塔各层（由细到粗）：只绘制视野内的六边形，多边形在首次进入视野时创建，移出视野时从地图上移除
+// 每层从六边形不小于MIN_HEX_PIXELS像素的缩放级别开始显示，绘制数量因此受屏幕面积限制
+const layers = geometry.levels.map(function() {{ return null; }});
+let currentLevel = -1;
+function levelForZoom(zoom) {{
+    for (let level = 0; level < geometry.levels.length; level++) {{
+        if (zoom >= geometry.levels[level].min_zoom) return level;
+    }}
+    return geometry.levels.length - 1;
+}}
+function currentValues(level) {{
+    return dayValues(sortedDates[current], level);
+}}
+function buildLayer(level) {{
+    const g = geometry.levels[level];
+    const total = g.hex_id.length;
+    const group = L.featureGroup();
+    group.bindTooltip(function(layer) {{
+        return '影响等级: ' + currentValues(level).stars[layer.hexIndex] + '星';
+    }}, {{sticky: true}});
+    group.bindPopup(function(layer) {{
+        const i = layer.hexIndex;
+        const values = currentValues(level);
+        return '<div style="width:250px;"><h4>六边形区域 #' + g.hex_id[i] + '</h4><hr>' +
+            '<p><b>位置:</b> 行 ' + g.row[i] + ' 列 ' + g.col[i] + '</p>' +
+            '<p><b>影响分类等级:</b> ' + values.stars[i] + '星</p>' +
+            '<p><b>微博数量:</b> ' + values.counts[i] + '</p>' +
+            '<p><b>中心位置:</b> (' + g.center[2 * i].toFixed(6) + ', ' + g.center[2 * i + 1].toFixed(6) + ')</p></div>';
+    }}, {{maxWidth: 300}});
+    return {{group: group, polygons: new Array(total), visible: [], shownStars: new Int8Array(total).fill(-1)}};
+}}
+function makePolygon(g, i) {{
+    const ring = [];
+    for (let k = 0; k < 6; k++) {{
+        ring.push([g.rings[12 * i + 2 * k], g.rings[12 * i + 2 * k + 1]]);
+    }}
+    const polygon = L.polygon(ring, {{color: '#555555', weight: 1, fillOpacity: 0.7}});
+    polygon.hexIndex = i;
+    return polygon;
+}}
+
+function restyle() {{
+    const layer = layers[currentLevel];
+    const stars = currentValues(currentLevel).stars;
+    layer.visible.forEach(function(i) {{
+        if (layer.shownStars[i] !== stars[i]) {{
+            layer.shownStars[i] = stars[i];
+            layer.polygons[i].setStyle({{fillColor: hexColors[stars[i]]}});
+        }}
+    }});
+}}
+
+// 视野按一个六边形边长向外扩展，中心在视野外但边缘可见的六边形也会绘制
+function visibleHexes(level) {{
+    const g = geometry.levels[level];
+    const bounds = map.getBounds();
+    const padLat = g.hex_size / 111320;
+    const padLng = padLat / Math.cos(bounds.getCenter().lat * Math.PI / 180);
+    const south = bounds.getSouth() - padLat, north = bounds.getNorth() + padLat;
+    const west = bounds.getWest() - padLng, east = bounds.getEast() + padLng;
+    const indices = [];
+    for (let i = 0; i < g.hex_id.length; i++) {{
+        const lat = g.center[2 * i], lng = g.center[2 * i + 1];
+        if (lat >= south && lat <= north && lng >= west && lng <= east) indices.push(i);
+    }}
+    return indices;
+}}
+
+// 按缩放级别切换显示的层，并只保留视野内的六边形
+function showLevel() {{
+    const level = levelForZoom(map.getZoom());
+    if (level !== currentLevel) {{
+        if (currentLevel >= 0) map.removeLayer(layers[currentLevel].group);
+        layers[level] = layers[level] || buildLayer(level);
+        layers[level].group.addTo(map);
+        currentLevel = level;
+        document.getElementById('hexCount').textContent = geometry.levels[level].hex_id.length;
+        document.getElementById('hexSize').textContent = geometry.levels[level].hex_size;
+    }}
+    const layer = layers[level];
+    const g = geometry.levels[level];
+    const indices = visibleHexes(level);
+    const keep = new Uint8Array(g.hex_id.length);
+    indices.forEach(function(i) {{ keep[i] = 1; }});
+    layer.visible.forEach(function(i) {{
+        if (!keep[i]) layer.group.removeLayer(layer.polygons[i]);
+    }});
+    const shown = new Uint8Array(g.hex_id.length);
+    layer.visible.forEach(function(i) {{ shown[i] = 1; }});
+    indices.forEach(function(i) {{
+        if (shown[i]) return;
+        layer.polygons[i] = layer.polygons[i] || makePolygon(g, i);
+        layer.group.addLayer(layer.polygons[i]);
+    }});
+    layer.visible = indices;
+    restyle();
+}}
+map.on('moveend', showLevel);
+
+function updateMap() {{
+    restyle();
+    document.getElementById('dateDisplay').textContent = sortedDates[current];
+    document.getElementById('gridDate').textContent = sortedDates[current];
+    document.getElementById('dateSlider').value = current;
+    setSearchDate(sortedDates[current]);
+}}
+function changeDate(d) {{
+    current = Math.max(0, Math.min(sortedDates.length-1, current+d));
+    updateMap();
+}}
+function updateDateDisplay() {{
+    current = parseInt(document.getElementById('dateSlider').value);
+    updateMap();
+}}
+function playAnimation() {{
+    stopAnimation();
+    timer = setInterval(()=>{{
+        current = (current+1) % sortedDates.length;
+        updateMap();
+    }}, 2000);
+}}
+function stopAnimation() {{
+    if (timer) {{clearInterval(timer); timer=null;}}
+}}
+
+showLevel();
+updateMap();
+</script>
+</body>
+</html>'''
+
+        slider_file = os.path.join(output_dir, "beijing_time_slider_map.html")
+        with open(slider_file, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+
+        logger.info(f"时间滑块主页面已保存到: {slider_file}")
+        return slider_file
+
+    except Exception as e:
+        logger.error(f"生成时间滑块页面失败: {e}")
+        return None
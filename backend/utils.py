@@ -1,8 +1,11 @@
 import os
+import sys
 import logging
 import json
 import math
-from functools import partial
+import threading
+import numpy as np
+from functools import partial, lru_cache
 from shapely.ops import unary_union, transform
 import pyproj
 from shapely.geometry import Polygon, Point
@@ -25,6 +28,16 @@ def safe_mkdir(path):
         logging.warning(f"创建目录失败: {e}")
         return False
 
+def peak_rss_mb():
+    """返回当前进程的峰值常驻内存（MB），平台不支持时返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS返回字节，Linux返回KB
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
 def load_geojson(file_path):
     """加载GeoJSON文件"""
     try:
@@ -48,6 +61,22 @@ def create_pointy_top_hexagon(center_x, center_y, size_meters):
         points.append((x, y))
     return Polygon(points)
 
+# 六边形6个顶点相对中心的单位偏移（与create_pointy_top_hexagon一致）
+HEX_VERTEX_COS = np.array([math.cos(math.radians(60 * i)) for i in range(6)])
+HEX_VERTEX_SIN = np.array([math.sin(math.radians(60 * i)) for i in range(6)])
+
+def hexagon_vertices(center_x, center_y, size_meters):
+    """
+    批量计算六边形顶点（在投影坐标系中）
+    center_x, center_y: 中心坐标数组，长度为N
+    返回 (N, 6) 的顶点x、y数组
+    """
+    center_x = np.asarray(center_x, dtype=float)
+    center_y = np.asarray(center_y, dtype=float)
+    xs = center_x[:, None] + size_meters * HEX_VERTEX_COS[None, :]
+    ys = center_y[:, None] + size_meters * HEX_VERTEX_SIN[None, :]
+    return xs, ys
+
 def get_neighbors(row, col):
     """
     用立方体坐标求尖顶六边形 6 个邻居
@@ -68,10 +97,53 @@ def get_neighbors(row, col):
         neighbors.append((nrow, ncol))
     return [(r, c) for r, c in neighbors if r >= 0 and c >= 0]
 
-def create_transformer(from_crs, to_crs):
-    """创建坐标转换器"""
+# 每个线程缓存的坐标转换器数量上限
+TRANSFORMER_CACHE_SIZE = 16
+
+# pyproj.Transformer不能在线程间共享，每个线程各自持有一份LRU缓存
+_thread_local = threading.local()
+
+def _build_transformer(from_crs, to_crs):
     return pyproj.Transformer.from_crs(
         pyproj.CRS(from_crs), 
         pyproj.CRS(to_crs), 
         always_xy=True
-    ).transform
\ No newline at end of file
+    )
+
+def get_transformer(from_crs, to_crs):
+    """
+    返回当前线程缓存的pyproj.Transformer
+    同一线程内同一对坐标系只经PROJ数据库创建一次，各线程互不共享
+    """
+    factory = getattr(_thread_local, 'transformer', None)
+    if factory is None:
+        factory = _thread_local.transformer = lru_cache(maxsize=TRANSFORMER_CACHE_SIZE)(_build_transformer)
+    return factory(from_crs, to_crs)
+
+class CoordinateTransform:
+    """
+    坐标转换函数，可直接传给shapely.ops.transform
+    每次调用时取当前线程的缓存转换器，因此可以在线程间传递和共享
+    """
+    def __init__(self, from_crs, to_crs):
+        self.from_crs = from_crs
+        self.to_crs = to_crs
+
+    def __call__(self, x, y, *args):
+        return get_transformer(self.from_crs, self.to_crs).transform(x, y, *args)
+
+    def transform_point(self, x, y):
+        """转换单个点，返回 (x, y) 浮点数"""
+        x, y = get_transformer(self.from_crs, self.to_crs).transform(float(x), float(y))
+        return x, y
+
+    def transform_arrays(self, x, y):
+        """批量转换坐标数组，返回与输入形状相同的float64数组 (x, y)"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        tx, ty = get_transformer(self.from_crs, self.to_crs).transform(x.ravel(), y.ravel())
+        return np.asarray(tx).reshape(x.shape), np.asarray(ty).reshape(y.shape)
+
+def create_transformer(from_crs, to_crs):
+    """创建坐标转换器（x, y可以是标量或数组），底层转换器按线程缓存复用"""
+    return CoordinateTransform(from_crs, to_crs)
\ No newline at end of file
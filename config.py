@@ -6,6 +6,20 @@ DEFAULT_CONFIG = {
     'output_dir': os.path.join(os.getcwd(), 'output'),
     'boundary_file': os.path.join(os.getcwd(), 'data', 'beijing_districts.geojson'),
     'hex_size': 500,  # 六边形边长（米）
+    'cache_dir': None,  # 网格缓存目录，为None时使用输出目录下的.cache
+    'assign_method': 'lattice',  # 点分配方式: lattice（解析公式）或 sjoin（空间连接，用于校验）
+    'engine': 'cube',  # 统计引擎: cube（所有日期一次性汇总）或 daily（逐日计算）
+    'chunk_size': 200000,  # CSV/JSONL流式读取的每块行数
+    'lean': False,  # 精简加载模式：只保留必需列并使用紧凑类型
+    'extra_columns': [],  # 精简模式下额外保留的列
+    'post_store': None,  # 按天分区的数据存储目录，为None时直接读取输入文件
+    'hex_render': 'geojson',  # 六边形绘制方式: geojson（单个GeoJSON图层）或 polygons（每个六边形一个多边形）
+    'renderer': 'folium',  # 每日页面渲染方式: folium（folium对象树）或 template（按固定模板流式写入）
+    'output_mode': 'pages',  # 输出方式: pages（每天一个地图页面）或 shared（共享几何+每日数值数组的单页地图）
+    'pyramid_factors': [],  # 多分辨率金字塔各粗层相对hex_size的边长倍数（如[2, 4, 8]），为空时只有一层
+    'index_encoding': 'compact',  # 查询索引编码: compact（稀疏变长编码，中心由网格参数推算）或 json（明文数组）
+    'workers': 1,  # 并行处理日期及分块汇总数据的进程数，1为串行
+    'render_workers': 0,  # 渲染进程数，大于0时统计与渲染分阶段流水线执行（此时不使用workers）
     'target_districts': ['海淀区', '朝阳区', '东城区', '西城区', '石景山区', '丰台区'],
     'amap_tiles': 'http://webrd02.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=1&style=7&x={x}&y={y}&z={z}',
     'amap_attr': '高德地图'
@@ -23,5 +37,33 @@ def load_config(args):
         config['boundary_file'] = args.boundary_file
     if args.hex_size:
         config['hex_size'] = args.hex_size
+    if args.cache_dir:
+        config['cache_dir'] = args.cache_dir
+    if args.assign_method:
+        config['assign_method'] = args.assign_method
+    if args.engine:
+        config['engine'] = args.engine
+    if args.chunk_size:
+        config['chunk_size'] = args.chunk_size
+    if args.lean:
+        config['lean'] = True
+    if args.post_store:
+        config['post_store'] = args.post_store
+    if args.hex_render:
+        config['hex_render'] = args.hex_render
+    if args.renderer:
+        config['renderer'] = args.renderer
+    if args.output_mode:
+        config['output_mode'] = args.output_mode
+    if args.pyramid:
+        config['pyramid_factors'] = sorted({f for f in args.pyramid if f > 1})
+    if args.index_encoding:
+        config['index_encoding'] = args.index_encoding
+    if args.workers:
+        config['workers'] = max(1, args.workers)
+    if args.render_workers is not None:
+        config['render_workers'] = max(0, args.render_workers)
+    if config['cache_dir'] is None:
+        config['cache_dir'] = os.path.join(config['output_dir'], '.cache')
     
     return config
\ No newline at end of file
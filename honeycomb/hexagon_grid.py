@@ -3,14 +3,16 @@
 六边形网格处理模块
 """
 
+import os
+import math
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Polygon, Point
-from shapely.ops import unary_union
+from shapely.ops import unary_union, transform
 import matplotlib.pyplot as plt
 
-from utils import logger, create_pointy_top_hexagon, get_coordinate_transformers
+from utils import logger, load_district_rings, create_pointy_top_hexagon, get_coordinate_transformers
 from config import DEFAULT_CONFIG
 
 def get_neighbors(row, col):
@@ -31,6 +33,50 @@ def get_neighbors(row, col):
         neighbors.append((nrow, ncol))
     return [(r, c) for r, c in neighbors if r >= 0 and c >= 0]
 
+# 六个邻居的（行, 列）偏移，偶数列和奇数列不同（奇数列下移半格），与get_neighbors一致
+EVEN_COL_NEIGHBOR_OFFSETS = [(-1, 1), (0, 1), (1, 0), (0, -1), (-1, -1), (-1, 0)]
+ODD_COL_NEIGHBOR_OFFSETS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, 0)]
+
+def apply_neighbor_influence(hex_gdf):
+    """在稠密（行, 列）星级数组上应用邻居影响力提升规则，结果一次性写回"""
+    if len(hex_gdf) == 0:
+        return
+    rows = hex_gdf['row'].to_numpy()
+    cols = hex_gdf['col'].to_numpy()
+    stars = hex_gdf['star_rating'].to_numpy()
+
+    # 网格外的位置为-1，外围再补一圈-1便于平移
+    num_rows, num_cols = rows.max() + 1, cols.max() + 1
+    padded = np.full((num_rows + 2, num_cols + 2), -1, dtype=np.int64)
+    padded[rows + 1, cols + 1] = stars
+    odd_cols = np.arange(num_cols) % 2 == 1
+
+    def shifted(dr, dc):
+        return padded[1 + dr:1 + dr + num_rows, 1 + dc:1 + dc + num_cols]
+
+    has_4_neighbor = np.zeros((num_rows, num_cols), dtype=bool)
+    has_3_neighbor = np.zeros((num_rows, num_cols), dtype=bool)
+    for even_offset, odd_offset in zip(EVEN_COL_NEIGHBOR_OFFSETS, ODD_COL_NEIGHBOR_OFFSETS):
+        neighbor = np.where(odd_cols, shifted(*odd_offset), shifted(*even_offset))
+        has_4_neighbor |= neighbor == 4
+        has_3_neighbor |= neighbor == 3
+    has_4_neighbor = has_4_neighbor[rows, cols]
+    has_3_neighbor = has_3_neighbor[rows, cols]
+
+    # 四级邻居: 0/1星→2星，2星→3星；三级邻居: 0星→1星，1星→2星
+    new_stars = np.select(
+        [
+            (stars == 2) & has_4_neighbor,
+            ((stars == 0) | (stars == 1)) & has_4_neighbor,
+            (stars == 1) & has_3_neighbor,
+            (stars == 0) & has_3_neighbor
+        ],
+        [3, 2, 2, 1],
+        default=stars
+    )
+    hex_gdf['star_rating'] = new_stars
+    logger.info(f"已更新 {int((new_stars != stars).sum())} 个区域的星级（邻居提升）")
+
 def load_beijing_boundary(boundary_file, target_districts=None):
     """加载北京边界并创建多边形，可指定特定区域"""
     try:
@@ -38,28 +84,10 @@ def load_beijing_boundary(boundary_file, target_districts=None):
             logger.warning("边界文件不存在，跳过边界裁剪")
             return None
         
-        geo = load_json_file(boundary_file)
-        if not geo:
+        polygons = [Polygon(ring) for _, rings in load_district_rings(boundary_file, target_districts) for ring in rings]
+        if not polygons:
             return None
         
-        polygons = []
-        for feature in geo['features']:
-            if target_districts:
-                district_name = feature['properties'].get('name', '')
-                if district_name not in target_districts:
-                    continue
-            
-            geometry = feature['geometry']
-            if geometry['type'] == 'Polygon':
-                for ring in geometry['coordinates']:
-                    ring_points = [(lng, lat) for lng, lat in ring]
-                    polygons.append(Polygon(ring_points))
-            elif geometry['type'] == 'MultiPolygon':
-                for polygon in geometry['coordinates']:
-                    for ring in polygon:
-                        ring_points = [(lng, lat) for lng, lat in ring]
-                        polygons.append(Polygon(ring_points))
-        
         beijing_poly = unary_union(polygons)
         logger.info(f"成功加载北京边界，共 {len(polygons)} 个多边形")
         return beijing_poly
@@ -68,8 +96,11 @@ def load_beijing_boundary(boundary_file, target_districts=None):
         logger.error(f"加载边界文件失败: {e}")
         return None
 
-def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, target_districts=None):
-    """计算六边形网格影响力（使用投影坐标系确保正六边形）"""
+def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, target_districts=None, extent_df=None):
+    """
+    计算六边形网格影响力（使用投影坐标系确保正六边形）
+    没有边界时网格范围取自extent_df（默认为df）；逐日计算时传入全部数据，各天的网格才一致
+    """
     try:
         logger.info(f"开始创建北京区域蜂窝状六边形网格（边长={hex_size_meters}米）...")
         
@@ -95,8 +126,11 @@ def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, tar
             max_y += expand_margin
         else:
             # 如果没有边界，使用数据范围
+            beijing_utm = None
+            if extent_df is None:
+                extent_df = df
             min_x, min_y, max_x, max_y = float('inf'), float('inf'), float('-inf'), float('-inf')
-            for lng, lat in zip(df['经度'], df['纬度']):
+            for lng, lat in zip(extent_df['经度'], extent_df['纬度']):
                 x, y = transformer_to_utm(lng, lat)
                 min_x = min(min_x, x)
                 min_y = min(min_y, y)
@@ -198,50 +232,7 @@ def calculate_hexagon_influence(df, hex_size_meters=500, boundary_file=None, tar
             hex_gdf['star_rating'] = hex_gdf.apply(star_rating, axis=1)
             
             # 处理邻居关系
-            row_col_to_id = {}
-            for idx, row in hex_gdf.iterrows():
-                row_col_to_id[(row['row'], row['col'])] = row['hex_id']
-            
-            hex_info = {}
-            for idx, row in hex_gdf.iterrows():
-                hex_id = row['hex_id']
-                hex_info[hex_id] = {
-                    'star_rating': row['star_rating'],
-                    'row': row['row'],
-                    'col': row['col'],
-                    'neighbors': []
-                }
-            
-            for hex_id, info in hex_info.items():
-                neighbors = get_neighbors(info['row'], info['col'])
-                for nr, nc in neighbors:
-                    if (nr, nc) in row_col_to_id:
-                        neighbor_id = row_col_to_id[(nr, nc)]
-                        info['neighbors'].append(neighbor_id)
-            
-            # 邻居提升规则
-            updates = {}
-            for hex_id, info in hex_info.items():
-                star = info['star_rating']
-                for neighbor_id in info['neighbors']:
-                    nstar = hex_info[neighbor_id]['star_rating']
-                    if star == 4:
-                        if nstar == 0 or nstar == 1:
-                            if neighbor_id not in updates or updates[neighbor_id] < 2:
-                                updates[neighbor_id] = 2
-                        elif nstar == 2:
-                            updates[neighbor_id] = 3
-                    elif star == 3:
-                        if nstar == 0:
-                            if neighbor_id not in updates or updates[neighbor_id] < 1:
-                                updates[neighbor_id] = 1
-                        elif nstar == 1:
-                            if neighbor_id not in updates or updates[neighbor_id] < 2:
-                                updates[neighbor_id] = 2
-
-            for hex_id, new_star in updates.items():
-                hex_gdf.loc[hex_gdf['hex_id'] == hex_id, 'star_rating'] = new_star
-            logger.info(f"已更新 {len(updates)} 个区域的星级（邻居提升）")
+            apply_neighbor_influence(hex_gdf)
         else:
             # 如果没有数据，设置默认值
             for col in ['max_level', 'count', 'lv2_cnt', 'lv3_cnt', 'lv2_plus_lv3', 'star_rating']:
@@ -9,7 +9,7 @@ from datetime import datetime
 
 from data_loader import read_weibo_excel
 from hexagon_grid import calculate_hexagon_influence
-from map_visualization import create_influence_map
+from map_visualization import create_influence_map, day_search_values, write_search_index
 from time_slider import create_time_slider_map
 from utils import logger
 from config import DEFAULT_CONFIG
@@ -36,6 +36,8 @@ def main():
         
         # 为每天创建单独的地图
         daily_maps = {}
+        search_values = {}
+        index_hex_gdf = None
         
         for date in dates:
             date_str = date.strftime("%Y-%m-%d")
@@ -45,15 +47,20 @@ def main():
             day_df = df[df['日期'] == date]
             logger.info(f"日期 {date_str} 有 {len(day_df)} 条数据")
             
-            # 使用六边形网格计算影响
+            # 使用六边形网格计算影响（没有边界时按全部数据的范围建网格，各天共用同一网格和查询索引）
             hex_gdf = calculate_hexagon_influence(
                 day_df, 
                 hex_size_meters=config['hex_size_meters'],
                 boundary_file=config['boundary_file'],
-                target_districts=config['target_districts']
+                target_districts=config['target_districts'],
+                extent_df=df
             )
             
             if hex_gdf is not None:
+                # 收集当天的查询数据，所有日期处理完后写入一个共用的查询索引
+                search_values[date_str] = day_search_values(hex_gdf)
+                index_hex_gdf = hex_gdf
+                
                 # 生成当天地图
                 map_file = create_influence_map(
                     hex_gdf, 
@@ -68,6 +75,9 @@ def main():
             else:
                 logger.error(f"日期 {date_str} 的六边形网格计算失败")
         
+        if index_hex_gdf is not None:
+            write_search_index(config['output_dir'], index_hex_gdf, search_values)
+        
         # 创建带时间滑块的主地图
         if daily_maps:
             time_slider_map = create_time_slider_map(daily_maps, config['output_dir'], config['boundary_file'])
@@ -5,41 +5,63 @@
 
 import folium
 import branca.colormap as cm
-import glob
 import json
 import os
 
-from utils import logger, safe_mkdir, load_json_file, save_json_file
+from utils import logger, safe_mkdir, load_district_rings
 from config import DEFAULT_CONFIG
 
+# 所有日期页面共用的查询索引（通过<script>标签引用，每次运行只写一次）
+SEARCH_INDEX_FILE = 'search_index.js'
+
+def day_search_values(hex_gdf):
+    """提取某一天查询所需的统计值（按hex_id顺序）"""
+    return {
+        'star': hex_gdf['star_rating'].astype(int).tolist(),
+        'max_level': hex_gdf['max_level'].fillna(0).astype(int).tolist(),
+        'count': hex_gdf['count'].astype(int).tolist()
+    }
+
+def write_search_index(output_dir, hex_gdf, day_values):
+    """
+    写入查询索引：六边形中心和行列只存一份，每天只存星级、最高等级和数量
+    day_values: {日期字符串: day_search_values结果}
+    """
+    try:
+        index = {
+            'hexes': {
+                'lat': [round(float(v), 6) for v in hex_gdf['center_lat']],
+                'lng': [round(float(v), 6) for v in hex_gdf['center_lng']],
+                'row': hex_gdf['row'].astype(int).tolist(),
+                'col': hex_gdf['col'].astype(int).tolist()
+            },
+            'days': {date_str: day_values[date_str] for date_str in sorted(day_values)}
+        }
+        safe_mkdir(output_dir)
+        path = os.path.join(output_dir, SEARCH_INDEX_FILE)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('window.HEX_SEARCH_INDEX = ' + json.dumps(index, separators=(',', ':')) + ';\n')
+        logger.info(f"查询索引已保存到: {path}")
+        return path
+    except Exception as e:
+        logger.error(f"写入查询索引失败: {e}")
+        return None
+
 def read_beijing_boundary(boundary_file, target_districts=None):
-    """读取北京边界GeoJSON文件，返回经纬度点列表，可指定特定区域"""
+    """
+    读取北京边界，返回 [(区名, [[lat, lng], ...]), ...]，每个边界环一项，可指定特定区域
+    边界文件在每个进程内只解析一次
+    """
     try:
         if not boundary_file or not os.path.exists(boundary_file):
             logger.warning("边界文件不存在，跳过绘制")
             return []
             
-        geo = load_json_file(boundary_file)
-        if not geo:
-            return []
-            
-        boundary_points = []
-        for feature in geo['features']:
-            if target_districts:
-                district_name = feature['properties'].get('name', '')
-                if district_name not in target_districts:
-                    continue
-                    
-            geometry = feature['geometry']
-            if geometry['type'] == 'Polygon':
-                for ring in geometry['coordinates']:
-                    ring_points = [[lat, lng] for lng, lat in ring]
-                    boundary_points.append(ring_points)
-            elif geometry['type'] == 'MultiPolygon':
-                for polygon in geometry['coordinates']:
-                    for ring in polygon:
-                        ring_points = [[lat, lng] for lng, lat in ring]
-                        boundary_points.append(ring_points)
+        boundary_points = [
+            (district_name, [[lat, lng] for lng, lat in ring])
+            for district_name, rings in load_district_rings(boundary_file, target_districts)
+            for ring in rings
+        ]
         logger.info(f"成功读取边界文件，共 {len(boundary_points)} 个边界多边形")
         return boundary_points
     except Exception as e:
@@ -65,8 +87,9 @@ def add_boundary_to_map(m, boundary_file, target_districts=None):
         '丰台区': '#DDA0DD'
     }
     
-    for i, polygon_points in enumerate(boundary_polygons):
-        color = district_colors.get(target_districts[i] if i < len(target_districts) else '未知区域', 'blue')
+    # 颜色和提示按每个环所属的区确定
+    for district_name, polygon_points in boundary_polygons:
+        color = district_colors.get(district_name, 'blue')
             
         folium.PolyLine(
             polygon_points,
@@ -74,7 +97,7 @@ def add_boundary_to_map(m, boundary_file, target_districts=None):
             weight=3,
             opacity=0.8,
             fill=False,
-            tooltip=f'北京精准边界 - {target_districts[i] if i < len(target_districts) else "未知区域"}'
+            tooltip=f'北京精准边界 - {district_name}'
         ).add_to(m)
     
     logger.info("成功添加精准边界到地图")
@@ -89,57 +112,14 @@ def create_influence_map(hex_gdf, output_path, boundary_file=None, date_str=None
         grid_image_path = visualize_hexagon_grid(hex_gdf, config['hex_size_meters'])
         grid_image_url = f"file://{os.path.abspath(grid_image_path)}" if grid_image_path else ""
 
-        # 收集所有日期的hex_data
-        hex_data_dict = {}
-        output_dir = os.path.dirname(output_path) if os.path.isdir(output_path) else output_path
-        json_files = glob.glob(os.path.join(output_dir, "beijing_hexagon_honeycomb_map_*.json"))
-        for jf in json_files:
-            date_part = os.path.basename(jf).replace("beijing_hexagon_honeycomb_map_","").replace(".json","")
-            try:
-                hex_data_dict[date_part] = load_json_file(jf)
-            except Exception:
-                continue
-        
-        # 当前日期
-        hex_data = []
-        for _, row in hex_gdf.iterrows():
-            center = row['geometry'].centroid
-            hex_data.append({
-                'lat': center.y,
-                'lng': center.x,
-                'star': int(row['star_rating']),
-                'max_level': int(row['max_level']),
-                'count': int(row['count']),
-                'row': int(row['row']),
-                'col': int(row['col'])
-            })
-            
-        if date_str:
-            hex_data_dict[date_str] = hex_data
-            
-        if not hex_data_dict:
-            hex_data_dict[date_str if date_str else '当前'] = hex_data
-            
-        hex_data_dict_json = json.dumps(hex_data_dict, ensure_ascii=False)
-        
-        # 保存当前hex_data为json
-        if date_str:
-            try:
-                save_json_file(hex_data, os.path.join(output_dir, f"beijing_hexagon_honeycomb_map_{date_str}.json"))
-            except Exception:
-                pass
-
         # 日期显示
         date_display = f" - {date_str}" if date_str else ""
 
-        # 创建HTML内容，增加日期选择
-        date_options = ''.join([f'<option value="{d}">{d}</option>' for d in sorted(hex_data_dict.keys())])
+        # 创建HTML内容，日期选项和查询数据来自共用的查询索引
         search_html = f'''
         <div id="locationSearch" style="position: fixed; top: 10px; left: 10px; z-index: 1000; background: white; padding: 10px; border-radius: 5px; box-shadow: 0 0 5px rgba(0,0,0,0.3);">
             <h4 style="margin:0 0 10px 0;">区域影响查询</h4>
-            <select id="dateSelect" style="margin-bottom:5px; width: 140px;">
-                {date_options}
-            </select>
+            <select id="dateSelect" style="margin-bottom:5px; width: 140px;"></select>
             <input type="text" id="coordInput" placeholder="输入经纬度，如: 39.90, 116.40" style="width: 180px; padding: 5px; margin-right: 5px;">
             <button onclick="searchLocation()" style="padding: 5px 10px;">查询</button>
             <div id="resultPanel" style="margin-top: 10px; display: none; border-top: 1px solid #eee; padding-top: 10px;">
@@ -154,12 +134,20 @@ def create_influence_map(hex_gdf, output_path, boundary_file=None, date_str=None
             <p>排列方式: 蜂窝状错位</p>
             <img src="{grid_image_url}" alt="网格结构" style="width:100%; margin-top:10px; border:1px solid #eee;">
         </div>
+        <script src="{SEARCH_INDEX_FILE}"></script>
         <script>
-        const hexDataDict = {hex_data_dict_json};
-        let hexData = hexDataDict[Object.keys(hexDataDict)[0]];
-        document.getElementById('dateSelect').addEventListener('change', function() {{
-            const d = this.value;
-            hexData = hexDataDict[d] || [];
+        const searchIndex = window.HEX_SEARCH_INDEX || {{hexes: {{lat: [], lng: [], row: [], col: []}}, days: {{}}}};
+        const dateSelect = document.getElementById('dateSelect');
+        Object.keys(searchIndex.days).sort().forEach(function(d) {{
+            const option = document.createElement('option');
+            option.value = d;
+            option.textContent = d;
+            dateSelect.appendChild(option);
+        }});
+        let searchDate = searchIndex.days[{json.dumps(date_str)}] ? {json.dumps(date_str)} : dateSelect.value;
+        dateSelect.value = searchDate;
+        dateSelect.addEventListener('change', function() {{
+            searchDate = this.value;
         }});
         function haversineDistance(lat1, lng1, lat2, lng2) {{
             const R = 6371000;
@@ -172,16 +160,28 @@ def create_influence_map(hex_gdf, output_path, boundary_file=None, date_str=None
             return R * c;
         }}
         function findNearestHex(lat, lng) {{
+            const hexes = searchIndex.hexes;
+            const day = searchIndex.days[searchDate];
             let minDist = Number.MAX_VALUE;
-            let nearestHex = null;
-            for (const hex of hexData) {{
-                const dist = haversineDistance(lat, lng, hex.lat, hex.lng);
-                if (dist < minDist) {{
-                    minDist = dist;
-                    nearestHex = hex;
+            let nearest = -1;
+            if (day) {{
+                for (let i = 0; i < hexes.lat.length; i++) {{
+                    const dist = haversineDistance(lat, lng, hexes.lat[i], hexes.lng[i]);
+                    if (dist < minDist) {{
+                        minDist = dist;
+                        nearest = i;
+                    }}
                 }}
             }}
-            return {{hex: nearestHex, distance: minDist}};
+            if (nearest < 0) {{
+                return {{hex: null, distance: minDist}};
+            }}
+            const hex = {{
+                lat: hexes.lat[nearest], lng: hexes.lng[nearest],
+                row: hexes.row[nearest], col: hexes.col[nearest],
+                star: day.star[nearest], max_level: day.max_level[nearest], count: day.count[nearest]
+            }};
+            return {{hex: hex, distance: minDist}};
         }}
         const starDescriptions = {json.dumps(config['star_descriptions'], ensure_ascii=False)};
         const starColors = {json.dumps(config['star_colors'], ensure_ascii=False)};
@@ -7,9 +7,10 @@ import os
 import logging
 import json
 import math
+import threading
 import pyproj
 from shapely.ops import transform
-from functools import partial
+from functools import partial, lru_cache
 
 # 配置日志
 def setup_logger(name=__name__):
@@ -51,6 +52,37 @@ def save_json_file(data, file_path):
         logger.error(f"保存JSON文件失败: {e}")
         return False
 
+@lru_cache(maxsize=16)
+def _read_district_rings(path, mtime_ns):
+    """解析边界文件中每个区的边界环，按（路径, 修改时间）缓存，文件变化后自动重新读取"""
+    geo = load_json_file(path)
+    if not geo:
+        return ()
+    districts = {}
+    for feature in geo['features']:
+        district_name = feature['properties'].get('name', '')
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry['type'] == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            continue
+        rings = districts.setdefault(district_name, [])
+        rings.extend(tuple((lng, lat) for lng, lat in ring) for polygon in polygons for ring in polygon)
+    return tuple((name, tuple(rings)) for name, rings in districts.items())
+
+def load_district_rings(boundary_file, target_districts=None):
+    """
+    读取边界文件中目标区域的边界环，返回 [(区名, ((lng, lat), ...)的元组), ...]，保持文件中的顺序
+    同一进程内每个文件只解析一次；target_districts为空时返回所有区域
+    """
+    if not boundary_file or not os.path.exists(boundary_file):
+        return []
+    path = os.path.abspath(boundary_file)
+    return [(name, rings) for name, rings in _read_district_rings(path, os.stat(path).st_mtime_ns)
+            if not target_districts or name in target_districts]
+
 def create_pointy_top_hexagon(center_x, center_y, size_meters):
     """
     创建尖顶六边形（在投影坐标系中）
@@ -67,12 +99,32 @@ def create_pointy_top_hexagon(center_x, center_y, size_meters):
     
     return points
 
+# 每个线程缓存的转换器数量上限（与backend/utils.py保持一致）
+TRANSFORMER_CACHE_SIZE = 16
+
+# pyproj.Transformer不能在线程间共享，每个线程各自缓存
+_thread_local = threading.local()
+
+def _build_transformer(from_crs, to_crs):
+    return pyproj.Transformer.from_crs(pyproj.CRS(from_crs), pyproj.CRS(to_crs), always_xy=True)
+
+def get_transformer(from_crs, to_crs):
+    """返回当前线程缓存的坐标转换器（同一线程内同一对坐标系只创建一次）"""
+    factory = getattr(_thread_local, 'transformer', None)
+    if factory is None:
+        factory = _thread_local.transformer = lru_cache(maxsize=TRANSFORMER_CACHE_SIZE)(_build_transformer)
+    return factory(from_crs, to_crs)
+
+def _transform_function(from_crs, to_crs):
+    """坐标转换函数（x, y可以是标量或数组），每次调用取当前线程的缓存转换器，可在线程间共享"""
+    def transform_coords(x, y, *args):
+        return get_transformer(from_crs, to_crs).transform(x, y, *args)
+    return transform_coords
+
 def get_coordinate_transformers():
-    """获取坐标转换器"""
-    wgs84 = pyproj.CRS('EPSG:4326')  # WGS84 (经纬度)
-    utm50n = pyproj.CRS('EPSG:32650')  # UTM zone 50N (米)
-    transformer_to_utm = pyproj.Transformer.from_crs(wgs84, utm50n, always_xy=True).transform
-    transformer_to_wgs = pyproj.Transformer.from_crs(utm50n, wgs84, always_xy=True).transform
+    """获取坐标转换器 (WGS84 -> UTM 50N, UTM 50N -> WGS84)"""
+    transformer_to_utm = _transform_function('EPSG:4326', 'EPSG:32650')
+    transformer_to_wgs = _transform_function('EPSG:32650', 'EPSG:4326')
     
     return transformer_to_utm, transformer_to_wgs
 
@@ -4,32 +4,104 @@
 """
 
 import os
+import time
 import argparse
 import logging
 import webbrowser
 from datetime import datetime
 
-from backend.data_loader import read_weibo_excel, filter_data_by_date
-from backend.hexagon_grid import calculate_hexagon_influence
-from backend.map_generator import create_influence_map
+import pandas as pd
+
+from backend.data_loader import (
+    read_weibo_excel, iter_weibo_chunks, filter_data_by_date, compact_weibo_frame,
+    PIPELINE_COLUMNS, STREAMING_EXTENSIONS
+)
+from backend.post_store import build_post_store, read_post_store, iter_post_store, store_dates_in_range
+from backend.hexagon_grid import build_hexagon_grid, build_hex_pyramid
+from backend.boundary import load_boundary
+from backend.aggregation import aggregate_chunks, aggregate_daily_influence, cube_dates
+from backend.pipeline import run_dates
 from backend.time_slider import create_time_slider_map
-from backend.utils import setup_logging, safe_mkdir
+from backend.shared_map import write_geometry_asset, create_shared_slider_map
+from backend.search_index import write_search_index
+from backend.manifest import build_params, load_manifest, save_manifest
+from backend.utils import setup_logging, safe_mkdir, peak_rss_mb
 from config import load_config
 
 def parse_arguments():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='微博地理位置影响程度可视化工具')
-    parser.add_argument('-i', '--input-file', help='输入Excel文件路径')
+    parser.add_argument('-i', '--input-file', help='输入文件路径（Excel，或流式读取的CSV/JSONL）')
     parser.add_argument('-o', '--output-dir', help='输出目录路径')
     parser.add_argument('-b', '--boundary-file', help='边界GeoJSON文件路径')
     parser.add_argument('-s', '--hex-size', type=int, help='六边形边长（米）')
+    parser.add_argument('-c', '--cache-dir', help='网格缓存目录（默认为输出目录下的.cache）')
+    parser.add_argument('--assign-method', choices=['lattice', 'sjoin'],
+                        help='点分配到六边形的方式（lattice: 解析公式；sjoin: 空间连接校验模式）')
+    parser.add_argument('--engine', choices=['cube', 'daily'],
+                        help='统计引擎（cube: 所有日期一次性汇总；daily: 逐日计算）')
     parser.add_argument('-sd', '--start-date', help='开始日期（格式: YYYY-MM-DD）')
     parser.add_argument('-ed', '--end-date', help='结束日期（格式: YYYY-MM-DD）')
+    parser.add_argument('--chunk-size', type=int, help='CSV/JSONL流式读取的每块行数')
+    parser.add_argument('--post-store', help='按天分区的数据存储目录（指定后从中只读取日期范围内的分区）')
+    parser.add_argument('--build-store', action='store_true', help='先将输入文件导入分区存储（替换输入中出现的日期）')
+    parser.add_argument('--lean', action='store_true', help='精简加载模式（只保留必需列，使用紧凑数据类型）')
+    parser.add_argument('--no-data-cache', action='store_true', help='不使用输入文件旁的列式数据缓存')
+    parser.add_argument('--rebuild-data-cache', action='store_true', help='忽略已有数据缓存并重新生成')
+    parser.add_argument('--hex-render', choices=['geojson', 'polygons'],
+                        help='六边形绘制方式（geojson: 单个GeoJSON图层；polygons: 每个六边形一个多边形）')
+    parser.add_argument('--renderer', choices=['folium', 'template'],
+                        help='每日页面渲染方式（folium: 构建folium对象树；template: 按固定模板流式写入，更快且内存占用有界）')
+    parser.add_argument('--output-mode', choices=['pages', 'shared'],
+                        help='输出方式（pages: 每天一个地图页面；shared: 共享几何资源+每日数值数组的单页地图）')
+    parser.add_argument('--pyramid', type=int, nargs='+', metavar='FACTOR',
+                        help='共享几何模式下构建多分辨率金字塔，各粗层边长为六边形边长的倍数（如 2 4 8），地图按缩放级别切换')
+    parser.add_argument('--index-encoding', choices=['compact', 'json'],
+                        help='查询索引编码（compact: 稀疏变长编码；json: 明文数组）')
+    parser.add_argument('-w', '--workers', type=int, help='并行处理日期及分块汇总数据的进程数（默认1，即串行）')
+    parser.add_argument('--render-workers', type=int,
+                        help='渲染进程数（默认0；大于0时主进程计算统计、渲染进程生成页面，两者流水线并行）')
+    parser.add_argument('--full-rebuild', action='store_true', help='忽略构建清单中的指纹，重新生成输入中所有日期的地图')
     parser.add_argument('-d', '--debug', action='store_true', help='启用调试模式')
     parser.add_argument('-nw', '--no-web', action='store_true', help='不自动打开浏览器')
     
     return parser.parse_args()
 
+def stream_aggregate(chunks, grid, start_date=None, end_date=None, workers=1):
+    """
+    分块汇总流式输入（CSV/JSONL文件或分区存储）为稀疏的（日期, 六边形）部分汇总，
+    结束时报告吞吐量和峰值内存
+    """
+    logger = logging.getLogger(__name__)
+    start = time.perf_counter()
+    rows_read = 0
+    
+    def filtered_chunks():
+        nonlocal rows_read
+        for chunk in chunks:
+            rows_read += len(chunk)
+            if start_date or end_date:
+                chunk = filter_data_by_date(chunk, start_date, end_date)
+            logger.debug(f"已读取 {rows_read} 条有效数据")
+            yield chunk
+    
+    partial = aggregate_chunks(filtered_chunks(), grid, workers)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    
+    peak = peak_rss_mb()
+    peak_text = f"{peak:.1f} MB" if peak is not None else "未知"
+    logger.info(f"流式读取完成: {rows_read} 条有效数据，耗时 {elapsed:.2f} 秒"
+                f"（{rows_read / elapsed:.0f} 行/秒），峰值内存 {peak_text}")
+    logger.info(f"其中 {partial.rows_inside} 条落在网格内，涉及 {len(partial)} 个（日期, 六边形）单元")
+    return partial
+
+def coordinate_frame(chunks):
+    """只保留各分块的经纬度列并合并，用于没有边界文件时按数据范围确定流式输入的网格"""
+    frames = [chunk[['经度', '纬度']] for chunk in chunks]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
 def main():
     """主函数"""
     # 解析命令行参数
@@ -42,72 +114,170 @@ def main():
     # 加载配置
     config = load_config(args)
     
-    # 检查输入文件是否存在
-    if not os.path.exists(config['input_file']):
+    # 检查输入文件是否存在（直接读取分区存储时不需要输入文件）
+    post_store = config['post_store']
+    if (post_store is None or args.build_store) and not os.path.exists(config['input_file']):
         logger.error(f"输入文件不存在: {config['input_file']}")
         return
     
     # 创建输出目录
     safe_mkdir(config['output_dir'])
     
-    # 读取和处理数据
-    logger.info(f"开始处理文件: {config['input_file']}")
-    df = read_weibo_excel(config['input_file'])
+    # 读取和处理数据（CSV/JSONL输入在网格创建后分块流式汇总）
+    streaming = False
+    df = None
+    if post_store:
+        if args.build_store:
+            logger.info(f"开始将文件导入分区存储: {config['input_file']}")
+            if build_post_store(config['input_file'], post_store, config['chunk_size']) is None:
+                logger.error("导入分区存储失败")
+                return
+        
+        if not store_dates_in_range(post_store, args.start_date, args.end_date):
+            logger.error(f"分区存储中没有符合日期范围的数据: {post_store}")
+            logger.error("数据处理失败，无法生成地图")
+            return
+        
+        # 立方体引擎逐个分片汇总，不一次性读入（只打开日期范围内的分区）
+        streaming = config['engine'] == 'cube' and config['assign_method'] == 'lattice'
+        if not streaming:
+            df = read_post_store(post_store, args.start_date, args.end_date, columns=PIPELINE_COLUMNS)
+            if df is None:
+                logger.error("数据处理失败，无法生成地图")
+                return
+            if config['lean']:
+                df = compact_weibo_frame(df, report=True)
+    else:
+        logger.info(f"开始处理文件: {config['input_file']}")
+        streaming = os.path.splitext(config['input_file'])[1].lower() in STREAMING_EXTENSIONS
+        if streaming and (config['engine'] != 'cube' or config['assign_method'] != 'lattice'):
+            logger.warning("CSV/JSONL输入总是分块汇总并按解析公式分配，--engine 和 --assign-method 设置已忽略")
+    
+    if df is None and not streaming:
+        df = read_weibo_excel(
+            config['input_file'],
+            columns=PIPELINE_COLUMNS,
+            use_cache=not args.no_data_cache,
+            rebuild_cache=args.rebuild_data_cache,
+            lean=config['lean'],
+            extra_columns=config['extra_columns']
+        )
+        
+        if df is None:
+            logger.error("数据处理失败，无法生成地图")
+            return
+        
+        # 按日期过滤数据
+        if args.start_date or args.end_date:
+            df = filter_data_by_date(df, args.start_date, args.end_date)
+            logger.info(f"日期过滤后剩余 {len(df)} 条数据")
     
-    if df is None:
-        logger.error("数据处理失败，无法生成地图")
+    # 流式输入没有可用边界时，先单独读一遍经纬度确定数据范围
+    extent_df = df
+    if streaming and load_boundary(config['boundary_file'], config['target_districts']) is None:
+        logger.warning("没有可用的边界文件，先读取流式输入的经纬度以确定网格范围")
+        if post_store:
+            coords = iter_post_store(post_store, args.start_date, args.end_date, columns=['经度', '纬度'])
+        else:
+            coords = (filter_data_by_date(chunk, args.start_date, args.end_date)
+                      for chunk in iter_weibo_chunks(config['input_file'], config['chunk_size']))
+        try:
+            extent_df = coordinate_frame(coords)
+        except ValueError as e:
+            logger.error(f"读取输入文件失败: {e}")
+            logger.error("数据处理失败，无法生成地图")
+            return
+    
+    # 六边形网格与日期无关，只构建一次（优先读取磁盘缓存）
+    grid = build_hexagon_grid(
+        hex_size_meters=config['hex_size'],
+        boundary_file=config['boundary_file'],
+        target_districts=config['target_districts'],
+        df=extent_df,
+        cache_dir=config['cache_dir']
+    )
+    extent_df = None
+    if grid is None:
+        logger.error("六边形网格创建失败，无法生成地图")
         return
     
-    # 按日期过滤数据
-    if args.start_date or args.end_date:
-        df = filter_data_by_date(df, args.start_date, args.end_date)
-        logger.info(f"日期过滤后剩余 {len(df)} 条数据")
+    # 立方体引擎：所有日期只做一次分配和汇总（空间连接校验模式下逐日计算）
+    # 流式输入汇总为稀疏部分汇总，各日期的统计在处理该日期时才展开
+    if streaming:
+        use_cube = True
+        if post_store:
+            chunks = iter_post_store(post_store, args.start_date, args.end_date, columns=PIPELINE_COLUMNS)
+        else:
+            chunks = iter_weibo_chunks(config['input_file'], config['chunk_size'])
+        try:
+            cube = stream_aggregate(chunks, grid, args.start_date, args.end_date, config['workers'])
+        except ValueError as e:
+            logger.error(f"读取输入文件失败: {e}")
+            logger.error("数据处理失败，无法生成地图")
+            return
+    else:
+        use_cube = config['engine'] == 'cube' and config['assign_method'] == 'lattice'
+        if use_cube:
+            cube = aggregate_daily_influence(df, grid)
     
     # 获取所有日期
-    dates = sorted(df['日期'].unique())
+    dates = cube_dates(cube) if use_cube else sorted(df['日期'].unique())
     logger.info(f"数据包含以下日期: {[str(d) for d in dates]}")
     
-    # 为每天创建单独的地图
-    daily_maps = {}
-    
-    for date in dates:
-        date_str = date.strftime("%Y-%m-%d")
-        logger.info(f"处理日期 {date_str} 的数据...")
-        
-        # 筛选当天的数据
-        day_df = df[df['日期'] == date]
-        logger.info(f"日期 {date_str} 有 {len(day_df)} 条数据")
-        
-        # 使用六边形网格计算影响
-        hex_gdf = calculate_hexagon_influence(
-            day_df, 
-            hex_size_meters=config['hex_size'],
-            boundary_file=config['boundary_file'],
-            target_districts=config['target_districts']
-        )
-        
-        if hex_gdf is not None:
-            # 生成当天地图
-            map_filename = f"beijing_hexagon_honeycomb_map_{date_str}.html"
-            map_file = os.path.join(config['output_dir'], map_filename)
-            
-            map_file = create_influence_map(
-                hex_gdf, 
-                map_file,
-                boundary_file=config['boundary_file'],
-                date_str=date_str,
-                amap_tiles=config['amap_tiles']
-            )
-            
-            if map_file:
-                daily_maps[date_str] = f"file://{os.path.abspath(map_file)}"
-                logger.info(f"日期 {date_str} 的地图已生成")
+    # 多分辨率金字塔（只用于共享几何模式，粗层统计由最细层汇总）
+    pyramid = None
+    if config['pyramid_factors']:
+        if config['output_mode'] == 'shared':
+            pyramid = build_hex_pyramid(grid, config['pyramid_factors'])
         else:
-            logger.error(f"日期 {date_str} 的六边形网格计算失败")
+            logger.warning("多分辨率金字塔只用于共享几何输出模式（--output-mode shared），已忽略")
+    
+    # 读取上次的构建清单，内容未变化的日期直接复用已有地图
+    params = build_params(grid, config)
+    entries = load_manifest(config['output_dir'], params)
+    rebuilt = 0
+    
+    # 逐日计算并生成地图（多进程时网格等共享数据只在进程初始化时传递一次）
+    state = {
+        'grid': grid,
+        'cube': cube if use_cube else None,
+        'df': None if use_cube else df,
+        'config': config,
+        'entries': entries,
+        'full_rebuild': args.full_rebuild,
+        'pyramid': pyramid
+    }
+    search_values = {}
+    for date_str, entry, built, values in run_dates(dates, state, config['workers'], log_level,
+                                                    render_workers=config['render_workers']):
+        if entry is not None:
+            entries[date_str] = entry
+            search_values[date_str] = values
+            rebuilt += built
+    
+    # 清单中保留本次输入之外的历史日期，时间滑块包含所有已生成的地图
+    logger.info(f"本次重新生成 {rebuilt} 天的地图，共 {len(entries)} 天")
+    save_manifest(config['output_dir'], params, entries)
+    
+    # 所有页面共用一个查询索引，每次运行只写一次
+    write_search_index(config['output_dir'], grid, search_values, keep_dates=entries.keys(),
+                       encoding=config['index_encoding'])
     
     # 创建带时间滑块的主地图
-    if daily_maps:
-        time_slider_map = create_time_slider_map(daily_maps, config['output_dir'])
+    if entries:
+        if config['output_mode'] == 'shared':
+            # 几何与日期无关，只在变化时重写
+            write_geometry_asset(grid, config['output_dir'], config['boundary_file'], config['target_districts'],
+                                 pyramid=pyramid)
+            day_files = {date_str: entry['map_file'] for date_str, entry in entries.items()}
+            time_slider_map = create_shared_slider_map(day_files, config['output_dir'],
+                                                       config['amap_tiles'], config['amap_attr'])
+        else:
+            daily_maps = {
+                date_str: f"file://{os.path.abspath(os.path.join(config['output_dir'], entry['map_file']))}"
+                for date_str, entry in sorted(entries.items())
+            }
+            time_slider_map = create_time_slider_map(daily_maps, config['output_dir'])
         if time_slider_map and not args.no_web:
             logger.info(f"成功生成时间滑块地图，尝试在浏览器中打开...")
             try:
@@ -0,0 +1,33 @@
+"""测试共用的边界文件和数据构造函数"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# 测试边界：一个约4km x 4km的方形区域
+SQUARE = [[116.38, 39.89], [116.43, 39.89], [116.43, 39.93], [116.38, 39.93], [116.38, 39.89]]
+
+def write_square_boundary(test_dir, name='东城区'):
+    """在test_dir中写入只含一个方形区域的边界文件，返回文件路径"""
+    boundary_file = os.path.join(test_dir, 'boundary.geojson')
+    geo = {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'properties': {'name': name},
+            'geometry': {'type': 'MultiPolygon', 'coordinates': [[SQUARE]]}
+        }]
+    }
+    with open(boundary_file, 'w', encoding='utf-8') as f:
+        json.dump(geo, f)
+    return boundary_file
+
+def random_weibo_frame(seed, n, dates):
+    """随机生成分布在给定日期上的微博数据，坐标范围略大于方形边界，部分点落在网格外"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '经度': rng.uniform(116.37, 116.44, n),
+        '纬度': rng.uniform(39.88, 39.94, n),
+        '影响分类': rng.integers(1, 4, n).astype(float),
+        '日期': pd.to_datetime(rng.choice(dates, n)).date
+    })
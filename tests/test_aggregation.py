@@ -0,0 +1,102 @@
+import unittest
+import shutil
+import tempfile
+import numpy as np
+from backend.hexagon_grid import (
+    build_hexagon_grid, calculate_hexagon_influence, build_hex_pyramid, aggregate_hex_stats, grid_neighbor_influence
+)
+from backend.aggregation import (
+    StreamingHexAggregator, HexPartial, aggregate_chunks, aggregate_daily_influence, daily_hex_gdf, roll_up_levels,
+    cube_dates, CUBE_DTYPES
+)
+from tests.fixtures import write_square_boundary, random_weibo_frame
+
+class TestAggregation(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = write_square_boundary(self.test_dir)
+        self.grid = build_hexagon_grid(300, self.boundary_file, ['东城区'])
+        
+        # 随机生成三天的数据，部分落在网格外
+        self.df = random_weibo_frame(0, 3000, ['2023-01-01', '2023-01-02', '2023-01-03'])
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_cube_matches_daily(self):
+        cube = aggregate_daily_influence(self.df, self.grid)
+        self.assertEqual(len(cube['dates']), 3)
+        self.assertEqual(cube['count'].shape, (3, len(self.grid)))
+        for date in cube['dates']:
+            expected = calculate_hexagon_influence(self.df[self.df['日期'] == date], grid=self.grid)
+            hex_gdf = daily_hex_gdf(self.grid, cube, date)
+            for col in ['count', 'max_level', 'lv1_cnt', 'lv2_cnt', 'lv3_cnt', 'lv2_plus_lv3', 'star_rating']:
+                np.testing.assert_array_equal(hex_gdf[col].to_numpy(), expected[col].to_numpy())
+            self.assertEqual(list(hex_gdf['hex_id']), list(expected['hex_id']))
+
+    def test_pyramid_roll_up_matches_points(self):
+        cube = aggregate_daily_influence(self.df, self.grid)
+        pyramid = build_hex_pyramid(self.grid, [2, 4])
+        levels = roll_up_levels(cube, pyramid)
+        self.assertEqual(len(levels), 3)
+        
+        # 粗层统计等于把每条微博经最细层六边形映射到父六边形后直接汇总的结果
+        _, _, hex_ids = self.grid.assign_points_to_hexes(self.df['经度'].to_numpy(), self.df['纬度'].to_numpy())
+        inside = hex_ids >= 0
+        for grid, parent, rolled in zip(pyramid.grids[1:], pyramid.parents[1:], levels[1:]):
+            for day, date in enumerate(cube['dates']):
+                mask = inside & (self.df['日期'] == date).to_numpy()
+                expected = aggregate_hex_stats(parent[hex_ids[mask]], self.df['影响分类'].to_numpy()[mask], len(grid))
+                expected['star_rating'] = grid_neighbor_influence(grid, expected['star_rating'])
+                for col in CUBE_DTYPES:
+                    np.testing.assert_array_equal(rolled[col][day], expected[col], err_msg=col)
+        
+        # 单日汇总与整个立方体汇总一致
+        day_stats = {col: cube[col][1] for col in CUBE_DTYPES}
+        for rolled_day, rolled in zip(roll_up_levels(day_stats, pyramid), levels):
+            for col in CUBE_DTYPES:
+                np.testing.assert_array_equal(rolled_day[col], rolled[col][1])
+    
+    def test_streaming_matches_single_pass(self):
+        expected = aggregate_daily_influence(self.df, self.grid)
+        aggregator = StreamingHexAggregator(self.grid)
+        for start in range(0, len(self.df), 700):
+            aggregator.add(self.df.iloc[start:start + 700])
+        cube = aggregator.to_cube()
+        self.assertEqual(cube['dates'], expected['dates'])
+        self.assertEqual(aggregator.rows_seen, len(self.df))
+        for col in ['count', 'max_level', 'lv1_cnt', 'lv2_cnt', 'lv3_cnt', 'lv2_plus_lv3', 'star_rating']:
+            np.testing.assert_array_equal(cube[col], expected[col])
+
+    def test_partials_merge_in_any_order(self):
+        chunks = [self.df.iloc[start:start + 500] for start in range(0, len(self.df), 500)]
+        partials = [HexPartial.from_chunk(chunk, self.grid) for chunk in chunks]
+        # 两两合并与逆序一次合并结果相同，只保存有数据的单元
+        pairwise = HexPartial.merge([HexPartial.merge(partials[i:i + 2]) for i in range(0, len(partials), 2)])
+        reversed_order = HexPartial.merge(partials[::-1])
+        np.testing.assert_array_equal(pairwise.keys, reversed_order.keys)
+        for col in reversed_order.stats:
+            np.testing.assert_array_equal(pairwise.stats[col], reversed_order.stats[col])
+        self.assertEqual(pairwise.rows_seen, len(self.df))
+        self.assertEqual(int(pairwise.stats['count'].sum()), pairwise.rows_inside)
+        self.assertTrue(np.all(pairwise.stats['count'] > 0))
+
+        # 稀疏汇总逐日展开的结果与内存中逐日计算一致
+        self.assertEqual(cube_dates(pairwise), sorted(self.df['日期'].unique()))
+        for date in cube_dates(pairwise):
+            expected = calculate_hexagon_influence(self.df[self.df['日期'] == date], grid=self.grid)
+            hex_gdf = daily_hex_gdf(self.grid, pairwise, date)
+            for col in CUBE_DTYPES:
+                np.testing.assert_array_equal(hex_gdf[col].to_numpy(), expected[col].to_numpy())
+
+    def test_aggregate_chunks_in_processes(self):
+        chunks = [self.df.iloc[start:start + 400] for start in range(0, len(self.df), 400)]
+        serial = aggregate_chunks(chunks, self.grid)
+        parallel = aggregate_chunks(iter(chunks), self.grid, workers=2)
+        np.testing.assert_array_equal(parallel.keys, serial.keys)
+        for col in serial.stats:
+            np.testing.assert_array_equal(parallel.stats[col], serial.stats[col])
+        self.assertEqual(parallel.rows_inside, serial.rows_inside)
+
+if __name__ == '__main__':
+    unittest.main()
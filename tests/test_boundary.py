@@ -0,0 +1,75 @@
+import unittest
+import os
+import json
+import time
+import shutil
+import tempfile
+import folium
+import numpy as np
+from backend.boundary import load_boundary
+from backend.map_generator import add_boundary_to_map
+
+class TestBoundary(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = os.path.join(self.test_dir, 'boundary.geojson')
+        west = [[116.30, 39.89], [116.34, 39.89], [116.34, 39.93], [116.30, 39.93], [116.30, 39.89]]
+        island = [[116.35, 39.89], [116.36, 39.89], [116.36, 39.90], [116.35, 39.89]]
+        east = [[116.38, 39.89], [116.43, 39.89], [116.43, 39.93], [116.38, 39.93], [116.38, 39.89]]
+        self.write_boundary([
+            ('西城区', 'MultiPolygon', [[west], [island]]),
+            ('朝阳区', 'Polygon', [[[117.0, 40.0], [117.1, 40.0], [117.1, 40.1], [117.0, 40.0]]]),
+            ('东城区', 'Polygon', [east])
+        ])
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def write_boundary(self, districts):
+        geo = {
+            'type': 'FeatureCollection',
+            'features': [{
+                'type': 'Feature',
+                'properties': {'name': name},
+                'geometry': {'type': kind, 'coordinates': coordinates}
+            } for name, kind, coordinates in districts]
+        }
+        with open(self.boundary_file, 'w', encoding='utf-8') as f:
+            json.dump(geo, f)
+    
+    def test_parsed_once_per_file(self):
+        boundary = load_boundary(self.boundary_file, ['西城区', '东城区'])
+        self.assertIs(load_boundary(self.boundary_file, ['东城区', '西城区']), boundary)
+        self.assertEqual(boundary.districts, ['西城区', '东城区'])
+        self.assertEqual(len(boundary.district_rings['西城区']), 2)
+        self.assertIsNone(load_boundary(os.path.join(self.test_dir, 'missing.geojson')))
+        
+        # 文件修改后重新解析
+        time.sleep(0.01)
+        self.write_boundary([('东城区', 'Polygon', [[[116.38, 39.89], [116.43, 39.89], [116.43, 39.93], [116.38, 39.89]]])])
+        os.utime(self.boundary_file, ns=(time.time_ns() + 10 ** 9, time.time_ns() + 10 ** 9))
+        self.assertEqual(load_boundary(self.boundary_file, ['西城区', '东城区']).districts, ['东城区'])
+    
+    def test_geometries(self):
+        boundary = load_boundary(self.boundary_file, ['西城区', '东城区'])
+        self.assertAlmostEqual(boundary.union.area, sum(p.area for p in boundary.district_polygons.values()))
+        rings = {item['district']: item['rings'] for item in boundary.leaflet_rings}
+        self.assertEqual(rings['东城区'][0][0], [39.89, 116.38])
+        self.assertEqual(json.loads(boundary.leaflet_json), boundary.leaflet_rings)
+        
+        # UTM中的包含判断与WGS84几何一致
+        x, y = boundary.union_utm.centroid.x, boundary.union_utm.centroid.y
+        self.assertEqual(boundary.contains_utm(np.array([x, 0.0]), np.array([y, 0.0])).tolist(),
+                         [boundary.union_utm.contains(boundary.union_utm.centroid), False])
+    
+    def test_map_colors_follow_district(self):
+        # 西城区有两个环，东城区的颜色和提示不能错位
+        m = folium.Map(location=[39.9, 116.4])
+        add_boundary_to_map(m, self.boundary_file, ['西城区', '东城区'])
+        lines = [child for child in m._children.values() if isinstance(child, folium.PolyLine)]
+        self.assertEqual(len(lines), 3)
+        colors = [line.options['color'] for line in lines]
+        self.assertEqual(colors, ['#96CEB4', '#96CEB4', '#45B7D1'])
+
+if __name__ == '__main__':
+    unittest.main()
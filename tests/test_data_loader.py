@@ -1,7 +1,10 @@
 import unittest
 import pandas as pd
+import numpy as np
 import os
-from backend.data_loader import read_weibo_excel, filter_data_by_date
+from backend.data_loader import (
+    read_weibo_excel, iter_weibo_chunks, filter_data_by_date, ingest_cache_paths, PIPELINE_COLUMNS
+)
 
 class TestDataLoader(unittest.TestCase):
     def setUp(self):
@@ -18,8 +21,9 @@ class TestDataLoader(unittest.TestCase):
     
     def tearDown(self):
         # 清理测试文件
-        if os.path.exists(self.test_file):
-            os.remove(self.test_file)
+        for path in (self.test_file,) + ingest_cache_paths(self.test_file):
+            if os.path.exists(path):
+                os.remove(path)
     
     def test_read_weibo_excel(self):
         df = read_weibo_excel(self.test_file)
@@ -34,5 +38,67 @@ class TestDataLoader(unittest.TestCase):
         self.assertEqual(len(filtered_df), 1)
         self.assertEqual(filtered_df.iloc[0]['影响分类'], 2)
 
+    def test_ingest_cache(self):
+        df = read_weibo_excel(self.test_file)
+        data_path, meta_path = ingest_cache_paths(self.test_file)
+        self.assertTrue(os.path.exists(data_path))
+        self.assertTrue(os.path.exists(meta_path))
+        
+        cached = read_weibo_excel(self.test_file, columns=PIPELINE_COLUMNS)
+        self.assertEqual(list(cached.columns), PIPELINE_COLUMNS)
+        self.assertEqual(list(cached['日期']), list(df['日期']))
+        self.assertEqual(list(cached['影响分类']), list(df['影响分类']))
+        
+        # 源文件变化后缓存失效
+        self.df.iloc[:2].to_excel(self.test_file, index=False)
+        self.assertEqual(len(read_weibo_excel(self.test_file)), 2)
+        
+    def test_read_without_cache(self):
+        df = read_weibo_excel(self.test_file, use_cache=False)
+        self.assertEqual(len(df), 3)
+        self.assertFalse(os.path.exists(ingest_cache_paths(self.test_file)[0]))
+
+    def test_lean_mode(self):
+        df = read_weibo_excel(self.test_file, lean=True, extra_columns=['发布时间'])
+        self.assertEqual(list(df.columns), ['经度', '纬度', '影响分类', '日期', '小时', '发布时间'])
+        self.assertEqual(df['经度'].dtype, np.float32)
+        self.assertEqual(df['影响分类'].dtype, np.int8)
+        self.assertIsInstance(df['日期'].dtype, pd.CategoricalDtype)
+        
+        filtered_df = filter_data_by_date(df, '2023-01-02', '2023-01-03')
+        self.assertEqual(list(filtered_df['影响分类']), [2, 3])
+        self.assertEqual(str(sorted(filtered_df['日期'].unique())[0]), '2023-01-02')
+    
+    def test_iter_weibo_chunks(self):
+        csv_file = 'test_data.csv'
+        jsonl_file = 'test_data.jsonl'
+        data = self.df.copy()
+        data['经度'] = data['经度'].astype(object)
+        data.loc[1, '经度'] = 'invalid'
+        try:
+            data.to_csv(csv_file, index=False)
+            data.to_json(jsonl_file, orient='records', lines=True, force_ascii=False)
+            for path in (csv_file, jsonl_file):
+                chunks = list(iter_weibo_chunks(path, chunksize=2))
+                self.assertEqual(len(chunks), 2)
+                df = pd.concat(chunks)
+                self.assertEqual(list(df.columns), PIPELINE_COLUMNS)
+                self.assertEqual(list(df['影响分类']), [1, 3])
+                self.assertEqual([str(d) for d in df['日期']], ['2023-01-01', '2023-01-03'])
+        finally:
+            for path in (csv_file, jsonl_file):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def test_iter_weibo_chunks_missing_column(self):
+        csv_file = 'test_data.csv'
+        try:
+            self.df.drop(columns=['影响分类']).to_csv(csv_file, index=False)
+            with self.assertRaisesRegex(ValueError, '影响分类'):
+                list(iter_weibo_chunks(csv_file, chunksize=2))
+        finally:
+            if os.path.exists(csv_file):
+                os.remove(csv_file)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
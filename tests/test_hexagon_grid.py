@@ -0,0 +1,165 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from backend.hexagon_grid import (
+    build_hexagon_grid, calculate_hexagon_influence, aggregate_hex_stats, propagate_neighbor_influence,
+    build_hex_pyramid, pack_cell_keys, unpack_cell_keys
+)
+from tests.fixtures import write_square_boundary
+
+class TestHexagonGrid(unittest.TestCase):
+    def setUp(self):
+        # 创建测试边界（一个约4km x 4km的方形区域）
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = write_square_boundary(self.test_dir)
+        self.cache_dir = os.path.join(self.test_dir, 'cache')
+        self.df = pd.DataFrame({
+            '经度': [116.3974, 116.3975, 116.4200],
+            '纬度': [39.9093, 39.9094, 39.9000],
+            '影响分类': [1, 3, 2]
+        })
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_build_hexagon_grid_cache(self):
+        grid = build_hexagon_grid(500, self.boundary_file, ['东城区'], cache_dir=self.cache_dir)
+        self.assertIsNotNone(grid)
+        self.assertGreater(len(grid), 0)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        
+        cached = build_hexagon_grid(500, self.boundary_file, ['东城区'], cache_dir=self.cache_dir)
+        self.assertEqual(len(cached), len(grid))
+        self.assertEqual(list(cached.hex_gdf['hex_id']), list(grid.hex_gdf['hex_id']))
+        
+        # 参数变化时使用新的缓存键
+        build_hexagon_grid(400, self.boundary_file, ['东城区'], cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+    
+    def test_calculate_with_prebuilt_grid(self):
+        grid = build_hexagon_grid(500, self.boundary_file, ['东城区'])
+        hex_gdf = calculate_hexagon_influence(self.df, grid=grid)
+        direct = calculate_hexagon_influence(self.df, 500, self.boundary_file, ['东城区'])
+        self.assertEqual(int(hex_gdf['count'].sum()), 3)
+        self.assertEqual(list(hex_gdf['star_rating']), list(direct['star_rating']))
+        # 复用的网格本身不应被修改
+        self.assertNotIn('star_rating', grid.hex_gdf.columns)
+    
+    def test_assign_points_to_hexes(self):
+        grid = build_hexagon_grid(500, self.boundary_file, ['东城区'])
+        hex_gdf = grid.hex_gdf
+        rows, cols, hex_ids = grid.assign_points_to_hexes(hex_gdf['center_lng'], hex_gdf['center_lat'])
+        self.assertEqual(list(hex_ids), list(hex_gdf['hex_id']))
+        self.assertEqual(list(rows), list(hex_gdf['row']))
+        self.assertEqual(list(cols), list(hex_gdf['col']))
+        
+        # 网格外的点
+        _, _, outside = grid.assign_points_to_hexes([100.0], [20.0])
+        self.assertEqual(outside[0], -1)
+    
+    def test_hex_pyramid(self):
+        grid = build_hexagon_grid(200, self.boundary_file, ['东城区'])
+        pyramid = build_hex_pyramid(grid, [4, 2, 1])
+        self.assertEqual(pyramid.hex_sizes, [200, 400, 800])
+        self.assertEqual([len(g) for g in pyramid.grids], sorted((len(g) for g in pyramid.grids), reverse=True))
+        np.testing.assert_array_equal(pyramid.parents[0], grid.hex_gdf['hex_id'].to_numpy())
+        
+        x, y = grid.centers_utm()
+        for coarse, parent in zip(pyramid.grids[1:], pyramid.parents[1:]):
+            # 每个最细层六边形的中心落在其父六边形内，每个粗层六边形至少有一个子六边形
+            _, _, hex_ids = coarse.assign_utm_to_hexes(x, y)
+            np.testing.assert_array_equal(hex_ids, parent)
+            self.assertEqual(set(parent), set(range(len(coarse))))
+            # 粗层按列优先编号
+            order = coarse.hex_gdf['col'].to_numpy() * coarse.lattice['num_rows'] + coarse.hex_gdf['row'].to_numpy()
+            self.assertTrue(np.all(np.diff(order) > 0))
+    
+    def test_array_backed_grid(self):
+        grid = build_hexagon_grid(500, self.boundary_file, ['东城区'])
+        self.assertEqual(grid.centers.shape, (len(grid), 2))
+        self.assertEqual(grid.vertex_offsets.shape, (len(grid), 6, 2))
+        self.assertEqual(grid.vertex_offsets.dtype, np.float32)
+        self.assertEqual(grid.rows.dtype, np.int32)
+        np.testing.assert_array_equal(grid.index_table[grid.rows, grid.cols], np.arange(len(grid)))
+
+        # GeoDataFrame按需生成，几何与数组一致，且不随网格序列化
+        self.assertIsNone(grid._hex_gdf)
+        hex_gdf = grid.hex_gdf
+        self.assertIs(grid.hex_gdf, hex_gdf)
+        coords = np.stack([np.asarray(polygon.exterior.coords)[:6] for polygon in hex_gdf.geometry])
+        np.testing.assert_array_equal(coords, grid.vertices())
+        np.testing.assert_allclose(coords.mean(axis=1), grid.centers, atol=1e-9)
+        self.assertIsNone(pickle.loads(pickle.dumps(grid))._hex_gdf)
+        self.assertNotIn('geometry', grid.attribute_frame().columns)
+
+    def test_cell_keys_stable_across_extents(self):
+        grid = build_hexagon_grid(500, self.boundary_file, ['东城区'])
+        # 只用数据范围建网格，原点不同但同一位置的六边形单元键相同
+        by_data = build_hexagon_grid(500, df=self.df)
+        keys = grid.hex_gdf['cell_key'].to_numpy()
+        self.assertEqual(len(set(keys)), len(grid))
+        hex_ids = by_data.hex_ids_for_keys(keys)
+        self.assertTrue(np.all(hex_ids >= 0))
+        np.testing.assert_allclose(by_data.hex_gdf['center_lat'].to_numpy()[hex_ids], grid.hex_gdf['center_lat'], atol=1e-9)
+        np.testing.assert_allclose(by_data.hex_gdf['center_lng'].to_numpy()[hex_ids], grid.hex_gdf['center_lng'], atol=1e-9)
+        self.assertEqual(by_data.hex_ids_for_keys([pack_cell_keys(400, 0, 0)])[0], -1)
+
+        # 打包与解包互逆，边长不同的键不会冲突
+        size, q, r = unpack_cell_keys(keys)
+        self.assertTrue(np.all(size == 500))
+        np.testing.assert_array_equal(pack_cell_keys(500, q, r), keys)
+        np.testing.assert_array_equal(unpack_cell_keys(pack_cell_keys(7, [-3, 5], [2, -9]))[1:], [[-3, 5], [2, -9]])
+        with self.assertRaises(ValueError):
+            pack_cell_keys(500, [1 << 22], [0])
+
+        # 金字塔各层的单元键同样与网格范围无关
+        for coarse, other in zip(build_hex_pyramid(grid, [2, 4]).grids[1:], build_hex_pyramid(by_data, [2, 4]).grids[1:]):
+            coarse_keys = coarse.hex_gdf['cell_key'].to_numpy()
+            self.assertTrue(np.all(other.hex_ids_for_keys(coarse_keys) >= 0))
+
+    def test_lattice_matches_sjoin(self):
+        grid = build_hexagon_grid(500, self.boundary_file, ['东城区'])
+        lattice = calculate_hexagon_influence(self.df, grid=grid)
+        sjoin = calculate_hexagon_influence(self.df, grid=grid, assign_method='sjoin')
+        self.assertEqual(list(lattice['count']), list(sjoin['count']))
+        self.assertEqual(list(lattice['star_rating']), list(sjoin['star_rating']))
+
+    def test_aggregate_hex_stats(self):
+        hex_ids = [0, 0, 0, 2, 2, 2, 2, 2, 2, 3]
+        levels = [1, 3, 2, 2, 2, 3, 3, 2, 2, 1]
+        stats = aggregate_hex_stats(hex_ids, levels, 5)
+        self.assertEqual(list(stats['count']), [3, 0, 6, 1, 0])
+        self.assertEqual(list(stats['max_level']), [3, 0, 3, 1, 0])
+        self.assertEqual(list(stats['lv1_cnt']), [1, 0, 0, 1, 0])
+        self.assertEqual(list(stats['lv2_cnt']), [1, 0, 4, 0, 0])
+        self.assertEqual(list(stats['lv3_cnt']), [1, 0, 2, 0, 0])
+        self.assertEqual(list(stats['lv2_plus_lv3']), [2, 0, 6, 0, 0])
+        # 二级+三级超过5个为4星，否则取最高影响分类（最多3星）
+        self.assertEqual(list(stats['star_rating']), [3, 0, 4, 1, 0])
+        self.assertEqual(stats['star_rating'].dtype, np.int64)
+
+    def test_propagate_neighbor_influence(self):
+        # 偶数列(1, 0)的邻居: (0, 1) (1, 1) (2, 0) (0, 0)；奇数列(1, 1)的邻居包含(2, 0) (2, 2)
+        stars = np.array([
+            [0, 1, 2],
+            [4, 0, -1],
+            [2, 3, 0]
+        ])
+        result = propagate_neighbor_influence(stars)
+        expected = np.array([
+            [2, 2, 2],
+            [4, 2, -1],
+            [3, 3, 1]
+        ])
+        np.testing.assert_array_equal(result, expected)
+        # 前置维度（如日期）独立处理
+        batched = propagate_neighbor_influence(np.stack([stars, np.zeros_like(stars)]))
+        np.testing.assert_array_equal(batched[0], expected)
+        np.testing.assert_array_equal(batched[1], np.zeros_like(stars))
+
+if __name__ == '__main__':
+    unittest.main()
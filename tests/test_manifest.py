@@ -0,0 +1,57 @@
+import unittest
+import os
+import shutil
+import tempfile
+from backend.hexagon_grid import build_hexagon_grid, calculate_hexagon_influence
+from backend.aggregation import aggregate_daily_influence, daily_hex_gdf
+from backend.manifest import build_params, load_manifest, save_manifest, day_fingerprint
+from tests.fixtures import write_square_boundary, random_weibo_frame
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = write_square_boundary(self.test_dir)
+        self.grid = build_hexagon_grid(300, self.boundary_file, ['东城区'])
+        
+        self.df = random_weibo_frame(1, 2000, ['2023-01-01', '2023-01-02'])
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_fingerprint_independent_of_engine_and_order(self):
+        cube = aggregate_daily_influence(self.df, self.grid)
+        date = cube['dates'][0]
+        day_df = self.df[self.df['日期'] == date]
+        shuffled = day_df.sample(frac=1, random_state=0)
+        from_cube = day_fingerprint(daily_hex_gdf(self.grid, cube, date))
+        from_daily = day_fingerprint(calculate_hexagon_influence(shuffled, grid=self.grid))
+        self.assertEqual(from_cube, from_daily)
+        
+        # 修改一条数据的影响等级后指纹变化
+        changed = day_df.copy()
+        inside = changed.index[changed['经度'].between(116.39, 116.42) & changed['纬度'].between(39.90, 39.92)][0]
+        changed.loc[inside, '影响分类'] = 1.0 if changed.loc[inside, '影响分类'] == 3 else 3.0
+        self.assertNotEqual(from_daily, day_fingerprint(calculate_hexagon_influence(changed, grid=self.grid)))
+    
+    def test_manifest_roundtrip(self):
+        config = {'boundary_file': self.boundary_file, 'target_districts': ['东城区'], 'amap_tiles': 'tiles'}
+        params = build_params(self.grid, config)
+        with open(os.path.join(self.test_dir, 'a.html'), 'w') as f:
+            f.write('<html></html>')
+        entries = {
+            '2023-01-01': {'fingerprint': 'abc', 'map_file': 'a.html'},
+            '2023-01-02': {'fingerprint': 'def', 'map_file': 'missing.html'}
+        }
+        self.assertIsNotNone(save_manifest(self.test_dir, params, entries))
+        
+        # 地图文件缺失的日期需要重建
+        loaded = load_manifest(self.test_dir, build_params(self.grid, dict(config)))
+        self.assertEqual(loaded, {'2023-01-01': entries['2023-01-01']})
+        
+        # 渲染参数变化时全部重建
+        self.assertEqual(load_manifest(self.test_dir, build_params(self.grid, dict(config, amap_tiles='other'))), {})
+        self.assertEqual(load_manifest(self.test_dir, build_params(self.grid, dict(config, amap_attr='other'))), {})
+        self.assertEqual(load_manifest(self.test_dir, build_params(self.grid, dict(config, output_mode='shared'))), {})
+
+if __name__ == '__main__':
+    unittest.main()
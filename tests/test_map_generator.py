@@ -0,0 +1,40 @@
+import unittest
+import shutil
+import tempfile
+import numpy as np
+from backend.hexagon_grid import build_hexagon_grid
+from backend.map_generator import hexagon_feature_collection
+from tests.fixtures import write_square_boundary
+
+class TestMapGenerator(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = write_square_boundary(self.test_dir)
+        grid = build_hexagon_grid(300, self.boundary_file, ['东城区'])
+        self.hex_gdf = grid.hex_gdf.copy()
+        self.hex_gdf['star_rating'] = np.arange(len(self.hex_gdf)) % 5
+        self.hex_gdf['count'] = np.arange(len(self.hex_gdf))
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_feature_collection(self):
+        collection = hexagon_feature_collection(self.hex_gdf)
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual(len(collection['features']), len(self.hex_gdf))
+        
+        feature = collection['features'][7]
+        row = self.hex_gdf.iloc[7]
+        self.assertEqual(feature['properties']['hex_id'], row['hex_id'])
+        self.assertEqual(feature['properties']['star'], row['star_rating'])
+        self.assertEqual(feature['properties']['count'], row['count'])
+        self.assertEqual(feature['properties']['position'], f"行 {row['row']} 列 {row['col']}")
+        
+        # 闭合的六边形环，坐标与网格几何一致（保留6位小数）
+        ring = feature['geometry']['coordinates'][0]
+        self.assertEqual(len(ring), 7)
+        self.assertEqual(ring[0], ring[-1])
+        np.testing.assert_allclose(ring, np.asarray(row['geometry'].exterior.coords), atol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+from backend.hexagon_grid import build_hexagon_grid
+from backend.page_writer import write_influence_page
+from tests.fixtures import write_square_boundary
+
+class TestPageWriter(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = write_square_boundary(self.test_dir)
+        self.grid = build_hexagon_grid(300, self.boundary_file, ['东城区'])
+        self.hex_gdf = self.grid.hex_gdf.copy()
+        self.hex_gdf['star_rating'] = np.arange(len(self.hex_gdf)) % 5
+        self.hex_gdf['count'] = np.arange(len(self.hex_gdf))
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def read_hex_data(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        start = content.index('const hexData = ') + len('const hexData = ')
+        end = content.index('];', start) + 1
+        return content, json.loads(content[start:end])
+    
+    def test_page_content(self):
+        output = os.path.join(self.test_dir, 'map.html')
+        result = write_influence_page(self.hex_gdf, output, boundary_file=self.boundary_file,
+                                      date_str='2024-01-01', amap_tiles='http://tiles/{z}/{x}/{y}',
+                                      target_districts=['东城区'], chunk_size=7)
+        self.assertEqual(result, output)
+        self.assertFalse(os.path.exists(output + '.tmp'))
+        
+        content, rows = self.read_hex_data(output)
+        self.assertIn('"http://tiles/{z}/{x}/{y}"', content)
+        self.assertIn('"district":"东城区"', content)
+        self.assertIn('网格信息 - 2024-01-01', content)
+        
+        # 分块写入后每个六边形一行，顺序和数值与输入一致
+        self.assertEqual(len(rows), len(self.hex_gdf))
+        row = self.hex_gdf.iloc[9]
+        self.assertEqual(rows[9][:5], [row['hex_id'], row['row'], row['col'], row['star_rating'], row['count']])
+        np.testing.assert_allclose(rows[9][5:7], [row['center_lat'], row['center_lng']], atol=1e-6)
+        ring = np.asarray(row['geometry'].exterior.coords)[:6, ::-1]
+        np.testing.assert_allclose(np.reshape(rows[9][7:], (6, 2)), ring, atol=1e-6)
+    
+    def test_chunk_size_does_not_change_output(self):
+        first = os.path.join(self.test_dir, 'a.html')
+        second = os.path.join(self.test_dir, 'b.html')
+        write_influence_page(self.hex_gdf, first, boundary_file=self.boundary_file, chunk_size=3)
+        write_influence_page(self.hex_gdf, second, boundary_file=self.boundary_file, chunk_size=10000)
+        with open(first, 'rb') as f1, open(second, 'rb') as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+    def test_grid_arrays_match_geometry(self):
+        # 提供网格时可以只传属性表，页面与从几何提取时一致
+        first = os.path.join(self.test_dir, 'a.html')
+        second = os.path.join(self.test_dir, 'b.html')
+        write_influence_page(self.hex_gdf, first, boundary_file=self.boundary_file)
+        write_influence_page(self.hex_gdf.drop(columns='geometry'), second, boundary_file=self.boundary_file,
+                             grid=self.grid)
+        with open(first, 'rb') as f1, open(second, 'rb') as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import shutil
+import logging
+import tempfile
+import folium
+from backend.hexagon_grid import build_hexagon_grid
+from backend.aggregation import aggregate_daily_influence, daily_hex_gdf
+from backend.manifest import day_fingerprint
+from backend.map_generator import stable_element_ids
+from backend.pipeline import run_dates
+from tests.fixtures import write_square_boundary, random_weibo_frame
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = write_square_boundary(self.test_dir)
+        self.grid = build_hexagon_grid(300, self.boundary_file, ['东城区'])
+        
+        df = random_weibo_frame(2, 2000, ['2023-01-01', '2023-01-02', '2023-01-03'])
+        self.cube = aggregate_daily_influence(df, self.grid)
+        self.config = {
+            'output_dir': self.test_dir,
+            'boundary_file': self.boundary_file,
+            'hex_size': 300,
+            'target_districts': ['东城区'],
+            'assign_method': 'lattice',
+            'amap_tiles': None
+        }
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_parallel_matches_serial(self):
+        # 所有日期的指纹都与清单一致，只复用不渲染
+        entries = {}
+        for date in self.cube['dates']:
+            date_str = date.strftime('%Y-%m-%d')
+            fingerprint = day_fingerprint(daily_hex_gdf(self.grid, self.cube, date))
+            entries[date_str] = {'fingerprint': fingerprint, 'map_file': f'{date_str}.html'}
+        state = {
+            'grid': self.grid,
+            'cube': self.cube,
+            'df': None,
+            'config': self.config,
+            'entries': entries,
+            'full_rebuild': False
+        }
+        serial = list(run_dates(self.cube['dates'], state, workers=1))
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        root = logging.getLogger()
+        root.addHandler(handler)
+        level = root.level
+        root.setLevel(logging.INFO)
+        try:
+            parallel = list(run_dates(self.cube['dates'], state, workers=2))
+        finally:
+            root.removeHandler(handler)
+            root.setLevel(level)
+        self.assertEqual(serial, parallel)
+        self.assertEqual([r[0] for r in parallel], sorted(entries))
+        self.assertTrue(all(entry == entries[date_str] and not built for date_str, entry, built, _ in parallel))
+        self.assertEqual(parallel[0][3]['count'], self.cube['count'][0].tolist())
+        
+        # 工作进程的日志按日期顺序在主进程输出
+        processing = [message for message in messages if '处理日期' in message]
+        self.assertEqual(processing, [f'处理日期 {d} 的数据...' for d in sorted(entries)])
+    
+    def test_staged_render_matches_serial(self):
+        state = {
+            'grid': self.grid,
+            'cube': self.cube,
+            'df': None,
+            'config': self.config,
+            'entries': {},
+            'full_rebuild': True
+        }
+        serial = list(run_dates(self.cube['dates'], state, workers=1))
+        serial_pages = {}
+        for _, entry, _, _ in serial:
+            with open(os.path.join(self.test_dir, entry['map_file']), 'rb') as f:
+                serial_pages[entry['map_file']] = f.read()
+            os.remove(os.path.join(self.test_dir, entry['map_file']))
+        
+        # 渲染队列长度为1时，每计算一天都要等待上一天渲染完成
+        staged = list(run_dates(self.cube['dates'], state, render_workers=2, render_queue=1))
+        self.assertEqual(serial, staged)
+        self.assertTrue(all(built for _, _, built, _ in staged))
+        for map_file, content in serial_pages.items():
+            with open(os.path.join(self.test_dir, map_file), 'rb') as f:
+                self.assertEqual(f.read(), content)
+    
+    def test_stable_element_ids(self):
+        def render(seed):
+            with stable_element_ids(seed):
+                m = folium.Map(location=[39.9, 116.4], zoom_start=11)
+                folium.Polygon([[39.9, 116.4], [39.91, 116.41], [39.9, 116.42]], tooltip='a').add_to(m)
+                return m.get_root().render()
+        self.assertEqual(render('a.html'), render('a.html'))
+        self.assertNotEqual(render('a.html'), render('b.html'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import os
+import shutil
+import tempfile
+import pandas as pd
+from backend.data_loader import clean_weibo_frame
+from backend.post_store import PostStoreWriter, list_store_dates, read_post_store, iter_post_store
+
+class TestPostStore(unittest.TestCase):
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.df = clean_weibo_frame(pd.DataFrame({
+            '经度': [116.3974, 116.3975, 116.3976, 116.3977],
+            '纬度': [39.9093, 39.9094, 39.9095, 39.9096],
+            '影响分类': [1, 2, 3, 1],
+            '发布时间': ['2023-01-01 10:00:00', '2023-01-02 11:00:00', '2023-01-03 12:00:00', '2023-01-03 13:00:00']
+        }))
+    
+    def tearDown(self):
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+    
+    def test_write_and_read_window(self):
+        writer = PostStoreWriter(self.store_dir)
+        writer.write(self.df.iloc[:3])
+        writer.write(self.df.iloc[3:])
+        self.assertEqual(list_store_dates(self.store_dir), ['2023-01-01', '2023-01-02', '2023-01-03'])
+        self.assertEqual(len(os.listdir(os.path.join(self.store_dir, 'date=2023-01-03'))), 2)
+        
+        df = read_post_store(self.store_dir, '2023-01-02', '2023-01-03', columns=['经度', '影响分类', '日期'])
+        self.assertEqual(list(df.columns), ['经度', '影响分类', '日期'])
+        self.assertEqual(list(df['影响分类']), [2, 3, 1])
+        self.assertEqual([str(d) for d in df['日期']], ['2023-01-02', '2023-01-03', '2023-01-03'])
+        self.assertIsInstance(df['日期'].dtype, pd.CategoricalDtype)
+        
+        self.assertIsNone(read_post_store(self.store_dir, '2024-01-01'))
+        
+        # 逐分片读取：每个分片一块，日期列为该分片的日期
+        parts = list(iter_post_store(self.store_dir, '2023-01-02', columns=['影响分类', '日期']))
+        self.assertEqual([list(part['影响分类']) for part in parts], [[2], [3], [1]])
+        self.assertEqual([str(part['日期'].iloc[0]) for part in parts], ['2023-01-02', '2023-01-03', '2023-01-03'])
+    
+    def test_rewrite_replaces_partition(self):
+        PostStoreWriter(self.store_dir).write(self.df)
+        PostStoreWriter(self.store_dir).write(self.df.iloc[3:])
+        df = read_post_store(self.store_dir, '2023-01-03', '2023-01-03')
+        self.assertEqual(list(df['影响分类']), [1])
+        # 未出现在新输入中的日期保持不变
+        self.assertEqual(len(read_post_store(self.store_dir)), 3)
+
+if __name__ == '__main__':
+    unittest.main()
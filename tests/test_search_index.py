@@ -0,0 +1,83 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from backend.hexagon_grid import build_hexagon_grid
+from backend.search_index import (
+    day_search_values, write_search_index, load_search_index, encode_day_compact, decode_day_compact
+)
+from tests.fixtures import write_square_boundary
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = write_square_boundary(self.test_dir)
+        self.grid = build_hexagon_grid(300, self.boundary_file, ['东城区'])
+        self.output_dir = os.path.join(self.test_dir, 'output')
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def day_values(self, seed):
+        hex_gdf = self.grid.hex_gdf.copy()
+        rng = np.random.default_rng(seed)
+        hex_gdf['star_rating'] = rng.integers(0, 5, len(hex_gdf))
+        hex_gdf['count'] = rng.integers(0, 50, len(hex_gdf))
+        hex_gdf['max_level'] = np.where(hex_gdf['count'] > 0, 2.0, np.nan)
+        return day_search_values(hex_gdf)
+    
+    def test_index_roundtrip(self):
+        values = {'2023-01-02': self.day_values(0), '2023-01-01': self.day_values(1)}
+        self.assertIsNotNone(write_search_index(self.output_dir, self.grid, values, encoding='json'))
+        index = load_search_index(self.output_dir)
+        self.assertEqual(list(index['days']), ['2023-01-01', '2023-01-02'])
+        self.assertEqual(index['days']['2023-01-02'], values['2023-01-02'])
+        self.assertEqual(len(index['hexes']['lat']), len(self.grid))
+        self.assertEqual(index['hexes']['row'], self.grid.hex_gdf['row'].tolist())
+        # 没有数据的六边形最高等级记为0
+        self.assertIn(0, index['days']['2023-01-01']['max_level'])
+    
+    def test_compact_encoding(self):
+        values = self.day_values(3)
+        # 稀疏数据：大部分六边形为空，个别数量超过一个字节
+        for key in values:
+            values[key] = [v if i % 7 == 0 else 0 for i, v in enumerate(values[key])]
+        values['count'][0] = 100000
+        encoded = encode_day_compact(values)
+        self.assertEqual(decode_day_compact(encoded, len(self.grid)), values)
+        self.assertEqual(decode_day_compact(encode_day_compact(self.day_values(4)), len(self.grid)), self.day_values(4))
+        
+        write_search_index(self.output_dir, self.grid, {'2023-01-01': values})
+        index = load_search_index(self.output_dir)
+        self.assertEqual(index['encoding'], 'compact')
+        self.assertNotIn('hexes', index)
+        self.assertEqual(decode_day_compact(index['days']['2023-01-01'], index['size']), values)
+    
+    def test_compact_encoding_clips_out_of_range(self):
+        values = {'star': [2, 20, 0], 'max_level': [16, 3, 0], 'count': [1, 2, 0]}
+        with self.assertLogs('backend.search_index', level='WARNING') as logs:
+            encoded = encode_day_compact(values)
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(decode_day_compact(encoded, 3), {'star': [2, 15, 0], 'max_level': [15, 3, 0], 'count': [1, 2, 0]})
+    
+    def test_keep_dates_from_previous_index(self):
+        write_search_index(self.output_dir, self.grid, {'2023-01-01': self.day_values(0),
+                                                        '2023-01-02': self.day_values(1)})
+        update = {'2023-01-02': self.day_values(2)}
+        write_search_index(self.output_dir, self.grid, update, keep_dates=['2023-01-01', '2023-01-02'])
+        index = load_search_index(self.output_dir)
+        self.assertEqual(decode_day_compact(index['days']['2023-01-01'], len(self.grid)), self.day_values(0))
+        self.assertEqual(decode_day_compact(index['days']['2023-01-02'], len(self.grid)), update['2023-01-02'])
+        
+        # 编码方式变化时不沿用已有索引
+        write_search_index(self.output_dir, self.grid, update, keep_dates=['2023-01-01', '2023-01-02'],
+                           encoding='json')
+        self.assertEqual(list(load_search_index(self.output_dir)['days']), ['2023-01-02'])
+        
+        # 不在清单中的日期不再保留
+        write_search_index(self.output_dir, self.grid, update, keep_dates=['2023-01-02'])
+        self.assertEqual(list(load_search_index(self.output_dir)['days']), ['2023-01-02'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import json
+import base64
+import shutil
+import tempfile
+import numpy as np
+from backend.hexagon_grid import build_hexagon_grid, build_hex_pyramid
+from backend.shared_map import (
+    encode_day_values, write_geometry_asset, write_day_values, create_shared_slider_map, level_min_zooms,
+    GEOMETRY_ASSET
+)
+from tests.fixtures import write_square_boundary
+
+class TestSharedMap(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.boundary_file = write_square_boundary(self.test_dir)
+        self.grid = build_hexagon_grid(300, self.boundary_file, ['东城区'])
+        self.output_dir = os.path.join(self.test_dir, 'output')
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_encode_day_values(self):
+        stars = np.array([0, 4, 2, 3], dtype=np.int64)
+        for counts, count_bytes, dtype in [([0, 5, 255, 1], 1, '<u1'), ([0, 70000, 3, 1], 4, '<u4'),
+                                           ([0, 300, 3, 1], 2, '<u2')]:
+            values = encode_day_values(stars, np.array(counts))
+            self.assertEqual(values['count_bytes'], count_bytes)
+            self.assertEqual(np.frombuffer(base64.b64decode(values['stars']), '<u1').tolist(), stars.tolist())
+            self.assertEqual(np.frombuffer(base64.b64decode(values['counts']), dtype).tolist(), counts)
+    
+    def test_geometry_asset(self):
+        self.assertEqual(write_geometry_asset(self.grid, self.output_dir, self.boundary_file, ['东城区']), GEOMETRY_ASSET)
+        path = os.path.join(self.output_dir, GEOMETRY_ASSET)
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        geometry = json.loads(lines[0][len('window.HEX_GEOMETRY = '):-1])
+        boundary = json.loads(lines[1][len('window.BOUNDARY = '):-1])
+        self.assertEqual(len(geometry['levels']), 1)
+        self.assertEqual(geometry['levels'][0]['min_zoom'], 0)
+        self.assertEqual(len(geometry['levels'][0]['hex_id']), len(self.grid))
+        self.assertEqual(len(geometry['levels'][0]['rings']), len(self.grid) * 12)
+        self.assertEqual(boundary[0]['district'], '东城区')
+        self.assertEqual(boundary[0]['rings'][0][0], [39.89, 116.38])
+        
+        # 内容未变化时不重写
+        mtime = os.stat(path).st_mtime_ns
+        write_geometry_asset(self.grid, self.output_dir, self.boundary_file, ['东城区'])
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+    
+    def test_pyramid_levels(self):
+        pyramid = build_hex_pyramid(self.grid, [2, 4])
+        write_geometry_asset(self.grid, self.output_dir, self.boundary_file, ['东城区'], pyramid=pyramid)
+        with open(os.path.join(self.output_dir, GEOMETRY_ASSET), 'r', encoding='utf-8') as f:
+            geometry = json.loads(f.readline()[len('window.HEX_GEOMETRY = '):-2])
+        levels = geometry['levels']
+        self.assertEqual([level['hex_size'] for level in levels], [300, 600, 1200])
+        self.assertEqual([len(level['hex_id']) for level in levels], [len(g) for g in pyramid.grids])
+        # 越细的层从越大的缩放级别开始显示，最粗层从0级开始
+        zooms = [level['min_zoom'] for level in levels]
+        self.assertEqual(zooms[-1], 0)
+        self.assertTrue(zooms[0] > zooms[1] > 0)
+        self.assertEqual(level_min_zooms([500, 1000, 2000], 39.9), [11, 10, 0])
+        
+        # 每日数值文件包含各层的星级和数量，粗层数量由最细层汇总
+        hex_gdf = self.grid.hex_gdf.copy()
+        for col in ['max_level', 'lv1_cnt', 'lv2_cnt', 'lv3_cnt', 'lv2_plus_lv3', 'star_rating']:
+            hex_gdf[col] = 0
+        hex_gdf['count'] = 1
+        path = write_day_values(self.output_dir, '2023-01-01', hex_gdf, pyramid=pyramid)
+        with open(os.path.join(self.output_dir, path), 'r', encoding='utf-8') as f:
+            content = f.read()
+        values = json.loads(content[content.index('=') + 1:].strip().rstrip(';'))
+        for level, parent in zip(values['levels'], pyramid.parents):
+            counts = np.frombuffer(base64.b64decode(level['counts']), '<u%d' % level['count_bytes'])
+            np.testing.assert_array_equal(counts, np.bincount(parent))
+    
+    def test_slider_page_references_day_files(self):
+        hex_gdf = self.grid.hex_gdf.copy()
+        hex_gdf['star_rating'] = 1
+        hex_gdf['count'] = 2
+        day_files = {d: write_day_values(self.output_dir, d, hex_gdf) for d in ['2023-01-02', '2023-01-01']}
+        page = create_shared_slider_map(day_files, self.output_dir, 'http://tiles/{z}/{x}/{y}')
+        with open(page, 'r', encoding='utf-8') as f:
+            html = f.read()
+        self.assertIn(f'<script src="{GEOMETRY_ASSET}"></script>', html)
+        self.assertLess(html.index('days/hex_values_2023-01-01.js'), html.index('days/hex_values_2023-01-02.js'))
+
+if __name__ == '__main__':
+    unittest.main()
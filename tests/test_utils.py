@@ -0,0 +1,44 @@
+import unittest
+import threading
+import numpy as np
+import pyproj
+from backend.utils import create_pointy_top_hexagon, hexagon_vertices, create_transformer, get_transformer
+
+class TestUtils(unittest.TestCase):
+    def test_hexagon_vertices_match_polygon(self):
+        centers_x = np.array([440000.0, 440750.0])
+        centers_y = np.array([4420000.0, 4420433.0127])
+        xs, ys = hexagon_vertices(centers_x, centers_y, 500)
+        self.assertEqual(xs.shape, (2, 6))
+        for i in range(2):
+            polygon = create_pointy_top_hexagon(centers_x[i], centers_y[i], 500)
+            expected = np.array(polygon.exterior.coords[:-1])
+            np.testing.assert_array_equal(np.stack([xs[i], ys[i]], axis=-1), expected)
+
+    def test_transformer_cached_per_thread(self):
+        transformer = get_transformer('EPSG:4326', 'EPSG:32650')
+        self.assertIs(get_transformer('EPSG:4326', 'EPSG:32650'), transformer)
+        others = []
+        thread = threading.Thread(target=lambda: others.append(get_transformer('EPSG:4326', 'EPSG:32650')))
+        thread.start()
+        thread.join()
+        self.assertIsNot(others[0], transformer)
+
+    def test_transform_scalar_and_arrays(self):
+        to_utm = create_transformer('EPSG:4326', 'EPSG:32650')
+        expected = pyproj.Transformer.from_crs('EPSG:4326', 'EPSG:32650', always_xy=True)
+        lng = np.array([[116.38, 116.40], [116.42, 116.44]])
+        lat = np.array([[39.89, 39.90], [39.91, 39.92]])
+        x, y = to_utm.transform_arrays(lng, lat)
+        self.assertEqual(x.shape, (2, 2))
+        ex, ey = expected.transform(lng.ravel(), lat.ravel())
+        np.testing.assert_array_equal(x.ravel(), ex)
+        np.testing.assert_array_equal(y.ravel(), ey)
+
+        px, py = to_utm.transform_point(116.38, 39.89)
+        self.assertIsInstance(px, float)
+        self.assertEqual((px, py), expected.transform(116.38, 39.89))
+        self.assertEqual(to_utm(116.38, 39.89), (px, py))
+
+if __name__ == '__main__':
+    unittest.main()